@@ -3,6 +3,7 @@ from typing import Any, List
 from django.urls import path
 
 from apps.cmc_proxy.views import CmcKlinesView, CmcMarketDataView
+from apps.klines.views import get_klines
 from apps.price_oracle.views import get_price
 from apps.token_economics.views import TokenAllocationView
 from apps.token_holdings.views import token_holdings_api
@@ -15,4 +16,5 @@ urlpatterns: List[Any] = [
     path(r'cmc/klines', CmcKlinesView.as_view(), name='cmc_klines'),
     path(r'cmc/holdings', token_holdings_api, name='cmc_token_holdings'),
     path(r'ccxt/price', get_price, name='ccxt_price'),
+    path(r'ccxt/klines', get_klines, name='ccxt_klines'),
 ]
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+法币汇率读取。
+
+update_exchange_rates 写入 ExchangeRate 后调用 publish_rate，把汇率写入Redis哈希并递增版本号。
+各进程在内存中缓存汇率，TTL 到期后只读取一次版本号，版本变化时才重新加载整个哈希；
+Redis中没有数据时才查询一次数据库并回填。持久化循环里的汇率读取因此不访问数据库。
+
+都取不到时回退到 DEFAULT_USD_CNY_RATE，并通过 FxRate.stale 明确标记；
+默认值只缓存一个TTL，之后每个TTL重新查询一次数据库，直到取到真实汇率。
+"""
+
+import json
+import threading
+import time
+from dataclasses import dataclass
+from decimal import Decimal
+from typing import Dict, Optional
+
+from django.conf import settings
+
+from apps.backoffice.models import ExchangeRate
+from common.helpers import getLogger
+from common.redis_client import local_redis
+
+logger = getLogger(__name__)
+
+# 进程内缓存的有效期（秒），汇率更新后各进程最多延迟这么久
+FX_RATE_CACHE_TTL = getattr(settings, 'FX_RATE_CACHE_TTL', 60)
+# 汇率超过这个时间（秒）未更新视为过期；Frankfurter 周末不更新，默认留出三天
+FX_RATE_MAX_AGE = getattr(settings, 'FX_RATE_MAX_AGE', 3 * 24 * 3600)
+
+RATES_KEY = "fx:rates"
+VERSION_KEY = "fx:rates:version"
+
+
+@dataclass
+class FxRate:
+    rate: Decimal
+    updated_at: Optional[float]  # 汇率本身的更新时间，默认值为None
+    source: str  # redis / db / default
+    stale: bool
+
+
+def _pair(base: str, quote: str) -> str:
+    return f"{base.upper()}/{quote.upper()}"
+
+
+def _default_rate(base: str, quote: str) -> Optional[Decimal]:
+    if _pair(base, quote) == 'USD/CNY':
+        return Decimal(str(settings.DEFAULT_USD_CNY_RATE))
+    return None
+
+
+class FxRateProvider:
+    """带TTL和版本号的汇率缓存，全局实例 fx_rate_provider"""
+
+    def __init__(self, ttl: Optional[float] = None, max_age: Optional[float] = None):
+        self.ttl = ttl if ttl is not None else FX_RATE_CACHE_TTL
+        self.max_age = max_age if max_age is not None else FX_RATE_MAX_AGE
+        self._rates: Dict[str, FxRate] = {}
+        self._version: Optional[int] = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def _is_stale(self, updated_at: Optional[float], now: float) -> bool:
+        return updated_at is None or now - updated_at > self.max_age
+
+    def _refresh(self, now: float) -> None:
+        """TTL到期后检查Redis版本号，变化时重新加载全部汇率"""
+        redis = local_redis()
+        raw_version = redis.get(VERSION_KEY)
+        version = int(raw_version) if raw_version else 0
+        if version == self._version and self._rates:
+            return
+
+        rates = {}
+        for field, value in redis.hgetall(RATES_KEY).items():
+            data = json.loads(value)
+            pair = field.decode() if isinstance(field, bytes) else field
+            rates[pair] = FxRate(
+                rate=Decimal(data['rate']),
+                updated_at=data['updated_at'],
+                source='redis',
+                stale=self._is_stale(data['updated_at'], now),
+            )
+        self._rates = rates
+        self._version = version
+        logger.info(f"汇率缓存已加载 (版本 {version}): {', '.join(f'{k}={v.rate}' for k, v in rates.items())}")
+
+    def _load_from_db(self, base: str, quote: str, now: float) -> Optional[FxRate]:
+        """Redis中没有该汇率时查询一次数据库，并回填到Redis"""
+        rate_obj = ExchangeRate.objects.filter(base_currency=base, quote_currency=quote).first()
+        if rate_obj is None:
+            return None
+        updated_at = rate_obj.last_updated.timestamp() if rate_obj.last_updated else None
+        publish_rate(base, quote, rate_obj.rate, updated_at)
+        return FxRate(rate=rate_obj.rate, updated_at=updated_at, source='db', stale=self._is_stale(updated_at, now))
+
+    def get(self, base: str = 'USD', quote: str = 'CNY') -> FxRate:
+        """
+        获取汇率
+
+        Returns:
+            FxRate，无法获取任何汇率时 rate 为默认值且 stale=True；没有默认值的币种对抛出 LookupError
+        """
+        base, quote = base.upper(), quote.upper()
+        pair = _pair(base, quote)
+        now = time.time()
+        cached = self._rates.get(pair)
+        if cached and now - self._checked_at < self.ttl:
+            return cached
+
+        with self._lock:
+            expired = now - self._checked_at >= self.ttl
+            if expired:
+                try:
+                    self._refresh(now)
+                except Exception as e:
+                    # Redis不可用时继续使用内存中的汇率，直到下一个TTL再尝试
+                    logger.warning(f"刷新汇率缓存失败: {e}")
+                self._checked_at = now
+
+            cached = self._rates.get(pair)
+            # 默认值只在一个TTL内有效，到期后重新查询数据库
+            if cached is None or (expired and cached.source == 'default'):
+                cached = None
+                try:
+                    cached = self._load_from_db(base, quote, now)
+                except Exception as e:
+                    logger.error(f"从数据库读取汇率 {pair} 失败: {e}")
+                if cached is None:
+                    default = _default_rate(base, quote)
+                    if default is None:
+                        raise LookupError(f"没有 {pair} 汇率")
+                    logger.warning(f"没有 {pair} 汇率，使用默认值 {default}")
+                    cached = FxRate(rate=default, updated_at=None, source='default', stale=True)
+                self._rates[pair] = cached
+            elif cached.stale != self._is_stale(cached.updated_at, now):
+                cached = FxRate(cached.rate, cached.updated_at, cached.source, self._is_stale(cached.updated_at, now))
+                self._rates[pair] = cached
+
+            if cached.stale:
+                logger.warning(f"{pair} 汇率已过期: {cached.rate} (来源 {cached.source})")
+            return cached
+
+    def invalidate(self) -> None:
+        """下一次读取时重新检查Redis"""
+        self._checked_at = 0.0
+        self._version = None
+
+
+# 全局实例
+fx_rate_provider = FxRateProvider()
+
+
+def publish_rate(base: str, quote: str, rate: Decimal, updated_at: Optional[float] = None) -> None:
+    """
+    把汇率写入Redis并递增版本号，供 update_exchange_rates 在写库之后调用
+
+    失败只记录日志，各进程会在下次TTL到期且Redis中没有数据时回退到数据库。
+    """
+    payload = json.dumps({'rate': str(rate), 'updated_at': updated_at if updated_at is not None else time.time()})
+    try:
+        pipe = local_redis().pipeline()
+        pipe.hset(RATES_KEY, _pair(base, quote), payload)
+        pipe.incr(VERSION_KEY)
+        pipe.execute()
+    except Exception as e:
+        logger.warning(f"发布汇率 {_pair(base, quote)} 到Redis失败: {e}")
@@ -5,6 +5,7 @@ import requests
 from django.conf import settings
 from django.core.management.base import BaseCommand
 
+from apps.backoffice.fx_rates import publish_rate
 from apps.backoffice.models import ExchangeRate
 
 logger = logging.getLogger(__name__)
@@ -34,6 +35,8 @@ class Command(BaseCommand):
                         defaults={'rate': fetched_rate}
                     )
 
+                    publish_rate('USD', 'CNY', rate_obj.rate, rate_obj.last_updated.timestamp())
+
                     action = "created" if created else "updated"
                     success_msg = f"Successfully {action} USD/CNY exchange rate to {fetched_rate}"
                     self.stdout.write(self.style.SUCCESS(success_msg))
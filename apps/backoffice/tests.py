@@ -1 +1,73 @@
-# Create your tests here.
+from decimal import Decimal
+from types import SimpleNamespace
+from unittest import mock
+
+from django.test import SimpleTestCase, override_settings
+
+from apps.backoffice.fx_rates import FxRateProvider
+
+
+class FakeRedis:
+    """只实现 FxRateProvider 用到的读取接口，publish_rate 写入失败时只记录日志"""
+
+    def get(self, key):
+        return None
+
+    def hgetall(self, key):
+        return {}
+
+
+@override_settings(DEFAULT_USD_CNY_RATE='7.29')
+class FxRateProviderTests(SimpleTestCase):
+
+    def setUp(self):
+        self.now = 1_700_000_000.0
+        patches = [
+            mock.patch('apps.backoffice.fx_rates.local_redis', return_value=FakeRedis()),
+            mock.patch('apps.backoffice.fx_rates.publish_rate'),
+            mock.patch('apps.backoffice.fx_rates.time.time', side_effect=lambda: self.now),
+            mock.patch('apps.backoffice.fx_rates.ExchangeRate'),
+        ]
+        mocks = []
+        for patcher in patches:
+            mocks.append(patcher.start())
+            self.addCleanup(patcher.stop)
+        self.exchange_rate_filter = mocks[-1].objects.filter
+        self.provider = FxRateProvider(ttl=60, max_age=3600)
+
+    def db_returns(self, rate):
+        row = SimpleNamespace(rate=Decimal(rate), last_updated=None)
+        self.exchange_rate_filter.return_value.first.return_value = row
+        self.exchange_rate_filter.side_effect = None
+
+    def db_fails(self):
+        self.exchange_rate_filter.side_effect = Exception("database unavailable")
+
+    def test_default_rate_is_retried_after_ttl(self):
+        self.db_fails()
+        fx = self.provider.get('USD', 'CNY')
+        self.assertEqual((fx.rate, fx.source, fx.stale), (Decimal('7.29'), 'default', True))
+
+        # 同一个TTL内使用缓存的默认值，不再查询数据库
+        self.db_returns('7.10')
+        self.now += 30
+        self.assertEqual(self.provider.get('USD', 'CNY').source, 'default')
+        self.assertEqual(self.exchange_rate_filter.call_count, 1)
+
+        self.now += 31
+        fx = self.provider.get('USD', 'CNY')
+        self.assertEqual((fx.rate, fx.source), (Decimal('7.10'), 'db'))
+        self.assertEqual(self.exchange_rate_filter.call_count, 2)
+
+    def test_db_rate_is_not_requeried(self):
+        self.db_returns('7.10')
+        self.provider.get('USD', 'CNY')
+        self.now += 120
+        self.assertEqual(self.provider.get('USD', 'CNY').rate, Decimal('7.10'))
+        self.assertEqual(self.exchange_rate_filter.call_count, 1)
+
+    def test_pair_without_default_raises(self):
+        self.db_returns('7.10')
+        self.exchange_rate_filter.return_value.first.return_value = None
+        with self.assertRaises(LookupError):
+            self.provider.get('USD', 'JPY')
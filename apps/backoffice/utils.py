@@ -2,9 +2,7 @@ import logging
 from decimal import Decimal
 from typing import Optional, Tuple
 
-from django.conf import settings
-
-from apps.backoffice.models import ExchangeRate
+from apps.backoffice.fx_rates import fx_rate_provider
 from apps.exchange.cache_ops import get_history_orderbook, get_history_merged_orderbook
 from apps.exchange.exceptions import OrderbookNotFound
 from apps.exchange.models import TradingPair, Exchange
@@ -14,27 +12,16 @@ logger = logging.getLogger(__name__)
 
 
 def get_usd_cny_rate() -> Decimal:
-    """Fetches the USD/CNY exchange rate from the database, with fallback to settings.
+    """Returns the USD/CNY exchange rate from the in-process FX cache.
+
+    The cache is refreshed from Redis (populated by update_exchange_rates) and only
+    falls back to the database or settings.DEFAULT_USD_CNY_RATE when no rate is published.
+    Use fx_rate_provider.get() directly when the staleness flag matters.
 
     Returns:
         Decimal: The USD/CNY exchange rate
     """
-    default_rate = Decimal(settings.DEFAULT_USD_CNY_RATE)
-    try:
-        # Try fetching from DB first
-        rate_obj = ExchangeRate.objects.get(base_currency='USD', quote_currency='CNY')
-        usd_cny_rate = rate_obj.rate
-        logger.debug(f"Using USD/CNY rate from database: {usd_cny_rate}")
-        return usd_cny_rate
-    except ExchangeRate.DoesNotExist:
-        logger.warning(f"USD/CNY exchange rate not found in database. Using default rate from settings: {default_rate}")
-        return default_rate
-    except Exception as e:
-        logger.error(
-            f"Error fetching USD/CNY rate from database: {e}. Falling back to default rate: {default_rate}",
-            exc_info=True
-        )
-        return default_rate  # Return default as fallback
+    return fx_rate_provider.get('USD', 'CNY').rate
 
 
 def get_prices_from_orderbook(symbol: TradingPair, exchange: Optional[Exchange] = None) -> Optional[
@@ -5,10 +5,11 @@ import json
 import time
 from itertools import groupby
 from operator import attrgetter
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, Dict, List, Optional, Tuple, Union
 
 from asgiref.sync import sync_to_async
 from django.conf import settings
+from django.db.models import Count, Max, Q
 
 from common.helpers import dec, getLogger
 from common.redis_client import global_redis, local_redis
@@ -22,7 +23,8 @@ from apps.exchange.consts import (
     EXCHANGE_BLOCKING
 )
 from apps.exchange.exceptions import OrderbookNotFound
-from apps.exchange.models import TradingPair
+from apps.exchange.fixed_point import FixedOrderbook, FixedPointScale
+from apps.exchange.models import Market, TradingPair
 from apps.exchange.types import Orderbook, OrderEntry
 
 logger = getLogger(__name__)
@@ -130,7 +132,8 @@ def get_history_24ticker(
         return None
 
 
-def get_orderbook(exchange_name: str, symbol_name: str) -> Orderbook:
+def get_orderbook_json(exchange_name: str, symbol_name: str) -> Dict[str, Any]:
+    """读取缓存中的原始订单簿数据，不做Decimal解析"""
     key = NRDS_EXCHANGE_ORDERBOOKS_KEY % (exchange_name, symbol_name)
     # key = EXCHANGE_ORDERBOOKS_KEY % (exchange_name, symbol_name)
     # data = global_redis().get(key)
@@ -143,26 +146,92 @@ def get_orderbook(exchange_name: str, symbol_name: str) -> Orderbook:
         raise OrderbookNotFound(f"{exchange_name} {symbol_name}")
     p = json.loads(data[-1].decode())
     p.setdefault("exchange", exchange_name)
-    return Orderbook.from_json(p)
+    return p
+
+
+def get_orderbook(exchange_name: str, symbol_name: str) -> Orderbook:
+    return Orderbook.from_json(get_orderbook_json(exchange_name, symbol_name))
+
+
+# 订单簿历史查询脚本：在Redis内按时间倒序扫描窗口，完成分桶降采样和offset/limit，
+# 只把调用方需要的快照传回客户端。快照原样返回：cjson 重新编码只保留14位有效数字，档位截断在Python端完成。
+# KEYS[1]: 历史zset；ARGV: score_start, score_end, offset, limit, bucket(秒)
+HISTORY_QUERY_LUA = """
+local rows = redis.call('ZREVRANGEBYSCORE', KEYS[1], ARGV[2], ARGV[1], 'WITHSCORES')
+local offset, limit, bucket = tonumber(ARGV[3]), tonumber(ARGV[4]), tonumber(ARGV[5])
+local out, skipped, last_bucket = {}, 0, nil
+for i = 1, #rows, 2 do
+    local keep = true
+    if bucket > 0 then
+        local b = math.floor(tonumber(rows[i + 1]) / bucket)
+        if b == last_bucket then keep = false else last_bucket = b end
+    end
+    if keep then
+        if skipped < offset then
+            skipped = skipped + 1
+        else
+            out[#out + 1] = rows[i]
+            if limit > 0 and #out >= limit then break end
+        end
+    end
+end
+return out
+"""
+HISTORY_QUERY_SCRIPT = local_redis().register_script(HISTORY_QUERY_LUA)
+HISTORY_WINDOW = 1200
+
+
+def query_history_orderbooks(
+        exchange_name: str, symbol: str, start: Optional[int] = None, end: Optional[int] = None,
+        offset: int = 0, limit: int = 0, bucket: int = 0, depth: int = 0
+) -> List[Orderbook]:
+    """
+    查询单个交易所的历史订单簿快照。
+
+    Args:
+        start/end: 时间窗口（秒），默认最近 HISTORY_WINDOW 秒
+        offset/limit: 从最新快照开始跳过 offset 个，最多返回 limit 个（0表示不限）
+        bucket: 降采样间隔（秒），每个区间只保留最新的一个快照（0表示不降采样）
+        depth: 每个快照的买卖盘最多保留的档位数（0表示不截断）
+
+    Returns:
+        按时间从旧到新排列的订单簿列表
+    """
+    key = NRDS_EXCHANGE_ORDERBOOKS_KEY % (exchange_name, symbol)
+    score_end = end or int(time.time())
+    score_start = start if start is not None else score_end - HISTORY_WINDOW
+    if not bucket:
+        # 不需要分桶时直接用 ZREVRANGEBYSCORE ... LIMIT
+        data = local_redis().zrevrangebyscore(key, score_end, score_start, start=offset, num=limit or -1)
+    else:
+        data = HISTORY_QUERY_SCRIPT(keys=[key], args=[score_start, score_end, offset, limit, bucket])
+    if not data:
+        raise OrderbookNotFound(f"{exchange_name}.{symbol}")
+
+    def data2ob(_data) -> Orderbook:
+        p = json.loads(_data.decode() if isinstance(_data, bytes) else _data)
+        if depth:
+            # 解析后在Python端截断，价格和数量保持原始精度
+            for side in ('bids', 'asks'):
+                p[side] = p[side][:depth]
+        p['exchange'] = exchange_name
+        return Orderbook.from_json(p)
+
+    return [data2ob(item) for item in reversed(data)]
 
 
 def get_history_orderbook(
         exchange_name: str, symbol: str, timestamp: int = 0
 ) -> Orderbook:
-    return get_history_orderbook_lst(exchange_name, symbol, timestamp)[-1]
+    return query_history_orderbooks(
+        exchange_name, symbol, start=(timestamp or int(time.time())) - HISTORY_WINDOW, limit=1
+    )[-1]
 
 
 def get_history_orderbook_lst(
         exchange_name: str, symbol: str, timestamp: Optional[int] = None
 ) -> List[Orderbook]:
-    key = NRDS_EXCHANGE_ORDERBOOKS_KEY % (exchange_name, symbol)
-    score_start = (timestamp or int(time.time())) - 1200
-    score_end = int(time.time())
-    data = local_redis().zrangebyscore(key, score_start, score_end)
-    if not data:
-        raise OrderbookNotFound(f"{exchange_name}.{symbol}")
-    data2ob = lambda _data: Orderbook.from_json(dict(exchange=exchange_name, **json.loads(_data.decode())))
-    return list(map(data2ob, data))
+    return query_history_orderbooks(exchange_name, symbol, start=(timestamp or int(time.time())) - HISTORY_WINDOW)
 
 
 class OrderbookDelayError(Exception):
@@ -216,17 +285,18 @@ def get_merged_orderbook(symbol_name: str) -> Orderbook:
     return Orderbook.from_json(data)
 
 
-def set_merged_orderbook(symbol_name: str, orderbook: Orderbook) -> None:
+def set_merged_orderbook(symbol_name: str, orderbook: Union[Orderbook, FixedOrderbook]) -> None:
     logger.info(f"set_merged_orderbook: {symbol_name}")
     key = SYMBOL_MERGE_ORDERBOOKS_KEY % symbol_name
-    global_redis().set(key, json.dumps(orderbook.as_json()))
+    orderbook_json = json.dumps(orderbook.as_json())
+    global_redis().set(key, orderbook_json)
     zkey = NRDS_SYMBOL_MERGE_ORDERBOOKS_KEY % symbol_name
     if orderbook.timestamp is None:
         tsmp = int(time.time())
     else:
         tsmp = int(int(orderbook.timestamp) / 1000)
     assert int(time.time()) - 300 < tsmp < int(time.time()) + 300, f"incorrect tsmp {tsmp}"
-    merged_orderbook_map = {json.dumps(orderbook.as_json()): tsmp}
+    merged_orderbook_map = {orderbook_json: tsmp}
     logger.debug(f"merged_orderbook_map: {merged_orderbook_map}")
     local_redis().zadd(zkey, merged_orderbook_map)
     local_redis().zremrangebyscore(zkey, 0, tsmp - 1200)  # remove expired data
@@ -235,11 +305,12 @@ def set_merged_orderbook(symbol_name: str, orderbook: Orderbook) -> None:
 def get_history_merged_orderbook(symbol_name: str, timestamp: int = 0) -> Orderbook:
     zkey = NRDS_SYMBOL_MERGE_ORDERBOOKS_KEY % symbol_name
     score_end = timestamp or int(time.time())
-    score_start = score_end - 1200
-    dbdata = local_redis().zrevrangebyscore(zkey, score_end, score_start)
+    score_start = score_end - HISTORY_WINDOW
+    # 窗口内最早的一个快照，只取一条
+    dbdata = local_redis().zrangebyscore(zkey, score_start, score_end, start=0, num=1)
     if len(dbdata) == 0:
         raise OrderbookNotFound(f"merged {symbol_name}")
-    data: Dict[str, Any] = json.loads(dbdata[-1].decode())
+    data: Dict[str, Any] = json.loads(dbdata[0].decode())
     return Orderbook.from_json(data)
 
 
@@ -268,23 +339,40 @@ def merge_order_list(old: List[OrderEntry], new: List[OrderEntry], reverse=False
     return sorted(output, key=attrgetter("price"), reverse=reverse)
 
 
-def save_merged_ob(symbol, orderbook, messages):
-    toggle = True
-    bids, asks = orderbook.bids, orderbook.asks
+SYMBOL_SCALE: Dict[str, Tuple[FixedPointScale, int]] = {}
+
+
+def get_symbol_scale(symbol: TradingPair) -> FixedPointScale:
+    """
+    合并订单簿使用的定点精度：取该交易对所有市场中最大的价格/数量小数位数，
+    任一市场精度未知时该项回退到与dec()相同的18位，避免截断该市场的价位。
+    与SPOT_EXG一样按SPOT_EXG_UPDATE_INTERVAL缓存。
+    """
+    cached = SYMBOL_SCALE.get(symbol.symbol_display)
+    if cached and cached[1] + SPOT_EXG_UPDATE_INTERVAL >= time.time():
+        return cached[0]
+    agg = Market.objects.filter(trading_pair=symbol).aggregate(
+        price_digits=Max('precision_price'), amount_digits=Max('precision_amount'),
+        unknown_price=Count('id', filter=Q(precision_price__isnull=True)),
+        unknown_amount=Count('id', filter=Q(precision_amount__isnull=True)),
+    )
+    scale = FixedPointScale(
+        None if agg['unknown_price'] else agg['price_digits'],
+        None if agg['unknown_amount'] else agg['amount_digits'],
+    )
+    SYMBOL_SCALE[symbol.symbol_display] = scale, int(time.time())
+    return scale
+
+
+def save_merged_ob(symbol, orderbook: FixedOrderbook, messages):
     # 交叉盘/锁定盘处理。正常的单一交易所订单簿中，最高买价 应该永远低于 最低卖价
-    while bids and asks and bids[0].price >= asks[0].price:
-        bids, asks = (bids[1:], asks[:]) if toggle else (bids[:], asks[1:])
-        toggle = not toggle
-    bids_hidden = len(orderbook.bids) - len(bids)
+    bids_hidden, asks_hidden = orderbook.uncross()
     if bids_hidden:
         logger.warning(f"{symbol.symbol_display}.{symbol.exchanges.name}: {bids_hidden} layers are hidden from bid-side merged orderbook.")
         messages['bids_hidden'] = bids_hidden
-        orderbook.bids = bids
-    asks_hidden = len(orderbook.asks) - len(asks)
     if asks_hidden:
         logger.warning(f"{symbol.symbol_display}.{symbol.exchanges.name}: {asks_hidden} layers are hidden from ask-side merged orderbook.")
         messages['asks_hidden'] = asks_hidden
-        orderbook.asks = asks
     # if bids_hidden or asks_hidden:
     #     logger.warning(messages)
     # else:
@@ -292,41 +380,49 @@ def save_merged_ob(symbol, orderbook, messages):
     set_merged_orderbook(symbol.symbol_display, orderbook)
 
 
-def merge_usds_orderbooks(symbol: TradingPair):
-    orderbook = Orderbook()
+def _merge_group(orderbook: FixedOrderbook, groups: List[Dict[str, Any]], symbol_name: str,
+                 data: Dict[str, Any]) -> None:
+    groups.append({
+        'symbol': symbol_name,
+        'timestamp': data.get('timestamp'),
+        'source': data.get('source'),
+        'exchange': data.get('exchange'),
+        'detail': data,
+    })
+    orderbook.merge(FixedOrderbook.from_json(data, orderbook.scale))
+
+
+def _merge_messages(orderbook: FixedOrderbook, groups: List[Dict[str, Any]]) -> Dict[str, Any]:
+    return {
+        'groups': groups,
+        'bids': orderbook.levels_as_json(orderbook.bids),
+        'asks': orderbook.levels_as_json(orderbook.asks),
+        'asks_hidden': 0,
+        'bids_hidden': 0,
+    }
+
+
+def merge_usds_orderbooks(symbol: TradingPair, scale: FixedPointScale):
+    orderbook = FixedOrderbook(scale)
     symbols_dict = settings.EXCHANGE_FUTURES_SYMBOLS[symbol.quote_asset.name]
 
     # TODO: what if symbols_dict is empty
     groups = []
     for exchange_name, symbols in symbols_dict.items():
         try:
-            ob = get_orderbook(exchange_name, symbols[0])
+            data = get_orderbook_json(exchange_name, symbols[0])
         except OrderbookNotFound:
             continue
-        groups.append({
-            'symbol': symbols[0],
-            'timestamp': ob.timestamp,
-            'source': ob.source,
-            'exchange': ob.exchange,
-            'detail': ob.as_json()
-        })
-        orderbook.bids = merge_order_list(orderbook.bids, ob.bids, reverse=True)
-        orderbook.asks = merge_order_list(orderbook.asks, ob.asks)
-    messages = {
-        'groups': groups,
-        'bids': [bid.as_json() for bid in orderbook.bids],
-        'asks': [ask.as_json() for ask in orderbook.asks],
-        'asks_hidden': 0,
-        'bids_hidden': 0,
-    }
-    return orderbook, messages
+        _merge_group(orderbook, groups, symbols[0], data)
+    return orderbook, _merge_messages(orderbook, groups)
 
 
 async def merge_orderbooks(symbol: TradingPair):
+    scale = await sync_to_async(get_symbol_scale)(symbol)
     if symbol.symbol_display in ['BTC/USDS', 'ETH/USDS']:
-        orderbook, messages = merge_usds_orderbooks(symbol)
+        orderbook, messages = merge_usds_orderbooks(symbol, scale)
     else:
-        orderbook, messages = await merge_usdt_orderbooks(symbol)
+        orderbook, messages = await merge_usdt_orderbooks(symbol, scale)
     save_merged_ob(symbol, orderbook, messages)
 
 
@@ -334,7 +430,7 @@ SPOT_EXG: Dict[str, Tuple[List, int]] = {}
 SPOT_EXG_UPDATE_INTERVAL = 60
 
 
-async def merge_usdt_orderbooks(symbol: TradingPair):
+async def merge_usdt_orderbooks(symbol: TradingPair, scale: Optional[FixedPointScale] = None):
     global SPOT_EXG, SPOT_EXG_UPDATE_INTERVAL
 
     @sync_to_async
@@ -347,7 +443,7 @@ async def merge_usdt_orderbooks(symbol: TradingPair):
         SPOT_EXG[symbol.symbol_display] = exchanges, last_update
 
     groups = []
-    orderbook = Orderbook()
+    orderbook = FixedOrderbook(scale or FixedPointScale())
 
     try:
         exchange_names = list(settings.MERGE_SYMBOL_CONFIG[symbol.symbol_display].keys())
@@ -362,29 +458,14 @@ async def merge_usdt_orderbooks(symbol: TradingPair):
     filtered_exchanges = await get_filtered_exchanges(symbol, exchange_names)
     for exchange in filtered_exchanges:
         try:
-            ob = get_orderbook(exchange.name, symbol.symbol_display)
+            data = get_orderbook_json(exchange.name, symbol.symbol_display)
         except OrderbookNotFound:
             logger.warning(f"Orderbook not found for {exchange.name} {symbol.symbol_display}. Skipping.")
             continue
 
         if symbol.category == "Spot":
-            groups.append({
-                'symbol': symbol.symbol_display,
-                'timestamp': ob.timestamp,
-                'source': ob.source,
-                'exchange': ob.exchange,
-                'detail': ob.as_json()
-            })
-            orderbook.bids = merge_order_list(orderbook.bids, ob.bids, reverse=True)
-            orderbook.asks = merge_order_list(orderbook.asks, ob.asks)
-    messages = {
-        'groups': groups,
-        'bids': [bid.as_json() for bid in orderbook.bids],
-        'asks': [ask.as_json() for ask in orderbook.asks],
-        'asks_hidden': 0,
-        'bids_hidden': 0,
-    }
-    return orderbook, messages
+            _merge_group(orderbook, groups, symbol.symbol_display, data)
+    return orderbook, _merge_messages(orderbook, groups)
 
 
 def set_ohlcv(exchange_name, symbol_name, timeframe, data: list) -> None:
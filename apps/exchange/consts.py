@@ -32,6 +32,12 @@ SLEEP_CONFIG = {
 
 SLEEP_CONFIG.update(settings.CRAWLER_SLEEP_CONFIG)
 
+# 爬虫并发抓取配置
+CRAWLER_MAX_CONCURRENCY = 20  # 单个交易所的最大并发请求数（实际值由ccxt rateLimit推算）
+CRAWLER_CIRCUIT_FAILURE_THRESHOLD = 5  # 单个交易对连续失败多少次后熔断
+CRAWLER_CIRCUIT_RECOVERY_TIMEOUT = 60  # 熔断后多少秒重新探测（秒）
+ORDERBOOK_BULK_BATCH_SIZE = 100  # fetchOrderBooks 单次请求的交易对数量
+
 EXCHANGE_FUNDING_RATE_KEY = 'crawler:funding_rate:%s'
 
 # 稳定币监控相关常量
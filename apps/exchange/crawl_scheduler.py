@@ -0,0 +1,141 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import asyncio
+import math
+import time
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional
+
+from common.helpers import getLogger
+from apps.exchange.consts import (
+    CRAWLER_CIRCUIT_FAILURE_THRESHOLD,
+    CRAWLER_CIRCUIT_RECOVERY_TIMEOUT,
+    CRAWLER_MAX_CONCURRENCY,
+)
+
+logger = getLogger(__name__)
+
+
+class CircuitBreaker:
+    """
+    单个交易对的熔断器。
+
+    连续失败达到阈值后进入 open 状态，在恢复时间内直接跳过该交易对；
+    恢复时间过后进入 half_open 状态放行一次请求，成功则关闭熔断，失败则重新打开。
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold: int = CRAWLER_CIRCUIT_FAILURE_THRESHOLD,
+                 recovery_timeout: float = CRAWLER_CIRCUIT_RECOVERY_TIMEOUT):
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.state = self.CLOSED
+
+    def allow_request(self) -> bool:
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.OPEN and time.time() - self.opened_at >= self.recovery_timeout:
+            self.state = self.HALF_OPEN
+            return True
+        # half_open 状态下同一周期只放行一次探测请求
+        return False
+
+    def record_success(self) -> None:
+        self.consecutive_failures = 0
+        self.state = self.CLOSED
+
+    def record_failure(self) -> None:
+        self.consecutive_failures += 1
+        if self.state == self.HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+            self.state = self.OPEN
+            self.opened_at = time.time()
+
+
+def concurrency_from_rate_limit(rate_limit: Optional[float], max_concurrency: int = CRAWLER_MAX_CONCURRENCY) -> int:
+    """
+    根据ccxt的rateLimit（两次请求之间的最小毫秒数）推算每个交易所允许的并发请求数。
+
+    rateLimit=50ms 约等于每秒20个请求，对应并发上限20；rateLimit越大并发越小，最少为1。
+    """
+    if not rate_limit or rate_limit <= 0:
+        return max_concurrency
+    return max(1, min(max_concurrency, math.ceil(1000 / rate_limit)))
+
+
+class CrawlScheduler:
+    """
+    有界并发的按交易对抓取调度器。
+
+    每个交易所一个实例，所有交易对的请求在同一个信号量下并发执行，
+    单个交易对的失败只会触发它自己的熔断器，不会影响其他交易对或整个进程。
+    """
+
+    def __init__(self, exchange_slug: str, rate_limit: Optional[float] = None,
+                 max_concurrency: int = CRAWLER_MAX_CONCURRENCY):
+        self.exchange_slug = exchange_slug
+        self.concurrency = concurrency_from_rate_limit(rate_limit, max_concurrency)
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self.logger = getLogger(f'crawler.scheduler.{exchange_slug}')
+        self.logger.info(f"CrawlScheduler for {exchange_slug}: rateLimit={rate_limit}, concurrency={self.concurrency}")
+
+    def get_breaker(self, key: str) -> CircuitBreaker:
+        breaker = self._breakers.get(key)
+        if breaker is None:
+            breaker = CircuitBreaker()
+            self._breakers[key] = breaker
+        return breaker
+
+    async def _run_one(self, key: str, job: Callable[[], Awaitable[Any]]) -> Optional[bool]:
+        breaker = self.get_breaker(key)
+        if not breaker.allow_request():
+            self.logger.debug(f"{self.exchange_slug} {key}: circuit open, skipped")
+            return None
+        async with self._semaphore:
+            try:
+                await job()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                breaker.record_failure()
+                self.logger.error(
+                    f"{self.exchange_slug} {key}: crawl failed "
+                    f"({breaker.consecutive_failures} consecutive, circuit {breaker.state})",
+                    exc_info=True
+                )
+                return False
+        breaker.record_success()
+        return True
+
+    async def run(self, items: Iterable[Any], key_func: Callable[[Any], str],
+                  job_factory: Callable[[Any], Awaitable[Any]]) -> Dict[str, int]:
+        """
+        并发执行一个抓取周期。
+
+        Args:
+            items: 要抓取的对象（通常是TradingPair）
+            key_func: 从对象得到熔断器key（通常是symbol_display）
+            job_factory: 根据对象生成要执行的协程
+
+        Returns:
+            本周期的统计: {'succeeded': n, 'failed': n, 'skipped': n}
+        """
+        items = list(items)
+        start_time = time.time()
+        results = await asyncio.gather(*[
+            self._run_one(key_func(item), lambda item=item: job_factory(item)) for item in items
+        ])
+        stats = {
+            'succeeded': sum(1 for r in results if r is True),
+            'failed': sum(1 for r in results if r is False),
+            'skipped': sum(1 for r in results if r is None),
+        }
+        self.logger.debug(
+            f"{self.exchange_slug} crawl cycle: {len(items)} symbols in {time.time() - start_time:.2f}s, {stats}"
+        )
+        return stats
@@ -2,13 +2,16 @@ import json
 import time
 from datetime import datetime, timezone as dt_timezone
 from decimal import Decimal
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
 
 import redis.asyncio as aioredis
 from asgiref.sync import sync_to_async
 from django.conf import settings  # Added for REDIS_URL
+from django.db import connection, transaction
 
-from apps.backoffice.models import MgObPersistence, ExchangeRate
+from apps.backoffice.fx_rates import fx_rate_provider
+from apps.backoffice.models import MgObPersistence
+from common.change_filter import PriceChangeFilter
 from common.helpers import getLogger
 from common.redis_client import get_async_redis_client
 from apps.exchange.consts import (
@@ -31,6 +34,8 @@ class RedisDataPersistor:
         self.redis_url = redis_url or getattr(settings, 'REDIS_URL', 'redis://localhost:6379/0')
         logger.info(f"RedisDataPersistor: 初始化，使用Redis URL: {self.redis_url}")
         self._redis_client = None
+        # 只写入变化超过阈值或超过心跳时间的价格
+        self.change_filter = PriceChangeFilter('RedisDataPersistor')
 
     async def _get_redis_client(self) -> Optional[aioredis.Redis]:
         """获取Redis客户端，如果未连接则创建新连接"""
@@ -64,6 +69,7 @@ class RedisDataPersistor:
 
         pipeline = client.pipeline()
         redis_update_count = 0
+        written_keys = []
 
         try:
             # 处理价格更新
@@ -71,6 +77,9 @@ class RedisDataPersistor:
                 for price_info in ex_updates:
                     pair_def = price_info.pair_def
                     redis_key = STABLECOIN_PRICE_KEY % pair_def.raw_pair_string
+                    if not self.change_filter.should_publish(redis_key, price_info.price):
+                        continue
+                    written_keys.append(redis_key)
 
                     data_to_store = {
                         'price': price_info.price,
@@ -102,10 +111,13 @@ class RedisDataPersistor:
                 await pipeline.execute()
 
             logger.info(
-                f"RedisDataPersistor: 成功更新{redis_update_count}个价格键和{len(updates_by_exchange)}个交易所最后更新时间")
+                f"RedisDataPersistor: 成功更新{redis_update_count}/{len(price_updates)}个价格键"
+                f"和{len(updates_by_exchange)}个交易所最后更新时间")
 
         except Exception as e:
             logger.error(f"RedisDataPersistor: Redis批量更新出错: {e}", exc_info=True)
+            for redis_key in written_keys:
+                self.change_filter.forget(redis_key)
 
     async def get_price(self, pair_string: str) -> Optional[dict]:
         """从Redis获取价格数据"""
@@ -165,6 +177,59 @@ class RedisDataPersistor:
                 logger.error(f"RedisDataPersistor: 关闭Redis客户端时出错: {e}", exc_info=True)
 
 
+# 单条 UPDATE ... FROM (VALUES ...) 语句包含的行数
+MGOB_UPDATE_CHUNK_SIZE = getattr(settings, 'MGOB_UPDATE_CHUNK_SIZE', 1000)
+
+# 与 DecField 相同的精度，避免未舍入的新值与已存储的值比较时总是不相等
+MGOB_NUMERIC = 'numeric(65,30)'
+MGOB_VALUES_ROW = f"(%s::bigint, %s::{MGOB_NUMERIC}, %s::{MGOB_NUMERIC}, %s::{MGOB_NUMERIC})"
+
+# 价格、USD价格、CNY价格一次写入；usd/cny 为NULL表示保持原值；只更新值有变化的行
+MGOB_BULK_UPDATE_SQL = """
+UPDATE backoffice_mgobpersistence AS m
+SET avg_price = v.price,
+    buy_price = v.price,
+    sell_price = v.price,
+    usd_price = COALESCE(v.usd_price, m.usd_price),
+    cny_price = COALESCE(v.cny_price, m.cny_price),
+    updated_at = NOW()
+FROM (VALUES {values}) AS v(id, price, usd_price, cny_price)
+WHERE m.id = v.id
+  AND (m.avg_price, m.buy_price, m.sell_price, m.usd_price, m.cny_price)
+      IS DISTINCT FROM
+      (v.price, v.price, v.price, COALESCE(v.usd_price, m.usd_price), COALESCE(v.cny_price, m.cny_price))
+"""
+
+
+def bulk_update_mgob_prices(updates: List[dict], chunk_size: Optional[int] = None) -> Tuple[int, int]:
+    """
+    批量更新MgObPersistence价格
+
+    Args:
+        updates: [{'id', 'avg_price', 'usd_price', 'cny_price'}, ...]，usd_price/cny_price 为None时不修改；
+            同一id出现多次时只保留最后一条
+        chunk_size: 每条SQL包含的行数
+
+    Returns:
+        (实际变化的行数, 执行的SQL条数)
+    """
+    chunk_size = chunk_size or MGOB_UPDATE_CHUNK_SIZE
+    # UPDATE ... FROM 中同一行匹配多条VALUES时写入哪一条不确定，先按id去重
+    updates = list({update['id']: update for update in updates}.values())
+    changed = 0
+    statements = 0
+    with connection.cursor() as cursor:
+        for i in range(0, len(updates), chunk_size):
+            chunk = updates[i:i + chunk_size]
+            params = []
+            for update in chunk:
+                params.extend([update['id'], update['avg_price'], update['usd_price'], update['cny_price']])
+            cursor.execute(MGOB_BULK_UPDATE_SQL.format(values=', '.join([MGOB_VALUES_ROW] * len(chunk))), params)
+            changed += cursor.rowcount
+            statements += 1
+    return changed, statements
+
+
 class DatabasePersistor:
     """数据库持久化类，负责将价格数据更新到数据库"""
 
@@ -196,21 +261,13 @@ class DatabasePersistor:
         start_time = time.time()
         logger.info(f"DatabasePersistor: 正在更新{len(price_updates)}条价格记录到MgObPersistence表")
 
-        # 1. 获取CNY汇率
+        # 1. 获取CNY汇率（进程内缓存，通常不访问数据库）
         @sync_to_async
         def get_cny_rate():
-            try:
-                # 获取最新的CNY汇率
-                rate = ExchangeRate.objects.filter(base_currency='USD', quote_currency='CNY').order_by(
-                    '-updated_at').first()
-                if rate:
-                    return rate.rate
-                else:
-                    logger.warning("无法获取CNY汇率，将使用默认值7.0")
-                    return Decimal('7.0')  # 默认汇率，如果无法获取
-            except Exception as e:
-                logger.error(f"获取CNY汇率时出错: {e}")
-                return Decimal('7.0')  # 默认汇率
+            fx_rate = fx_rate_provider.get('USD', 'CNY')
+            if fx_rate.stale:
+                logger.warning(f"CNY汇率已过期或使用默认值: {fx_rate.rate} (来源 {fx_rate.source})")
+            return fx_rate.rate
 
         cny_rate = await get_cny_rate()
         logger.info(f"当前CNY汇率: {cny_rate}")
@@ -448,40 +505,12 @@ class DatabasePersistor:
                 except Exception as e:
                     logger.error(f"批量创建MgObPersistence记录失败: {e}")
 
-            # 批量更新记录
+            # 批量更新记录：每个分块一条 UPDATE ... FROM (VALUES ...)
             if all_mgob_updates:
                 try:
-                    from django.db import connection
-
-                    with connection.cursor() as cursor:
-                        cursor.execute("BEGIN")
-                        try:
-                            for update in all_mgob_updates:
-                                cursor.execute(
-                                    "UPDATE backoffice_mgobpersistence SET avg_price = %s, buy_price = %s, sell_price = %s, updated_at = NOW() WHERE id = %s",
-                                    [update['avg_price'], update['buy_price'], update['sell_price'], update['id']]
-                                )
-
-                                # 更新USD价格
-                                if update.get('usd_price') is not None:
-                                    cursor.execute(
-                                        "UPDATE backoffice_mgobpersistence SET usd_price = %s WHERE id = %s",
-                                        [update['usd_price'], update['id']]
-                                    )
-
-                                    # 同时更新CNY价格 - 使用USD价格乘以汇率
-                                    cursor.execute(
-                                        "UPDATE backoffice_mgobpersistence SET cny_price = %s WHERE id = %s",
-                                        [Decimal(str(update['usd_price'])) * cny_rate if update[
-                                                                                             'usd_price'] is not None else None,
-                                         update['id']]
-                                    )
-                            cursor.execute("COMMIT")
-                            logger.info(f"更新{len(all_mgob_updates)}条价格记录")
-                        except Exception as e:
-                            cursor.execute("ROLLBACK")
-                            raise e
-
+                    with transaction.atomic():
+                        changed, statements = bulk_update_mgob_prices(all_mgob_updates)
+                    logger.info(f"更新{len(all_mgob_updates)}条价格记录，实际变化{changed}条，{statements}条SQL")
                     successful += len(all_mgob_updates)
                 except Exception as e:
                     logger.error(f"批量更新MgObPersistence记录失败: {e}")
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+订单簿定点数表示。
+
+价格和数量按市场精度放大为整数（price * 10**digits），
+在合并和交叉盘清理这些热点路径中只做整数运算，
+仅在写入Redis/API/数据库的边界处转换为字符串、float或Decimal。
+
+这里用的是Python的任意精度整数，不限于64位：市场精度已知时（通常不超过10位小数）
+常见价格放大后小于 2**63；精度未知时按18位放大，价格大于约9.22时就会超出64位，
+结果依然精确，只是整数运算变慢。
+"""
+
+import time
+from decimal import Decimal, InvalidOperation, ROUND_FLOOR
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+# 精度未知（Market.precision_price / precision_amount 为空）时使用的小数位数，与 dec() 的18位一致
+DEFAULT_PRICE_DIGITS = 18
+DEFAULT_AMOUNT_DIGITS = 18
+# 输出价格字符串的小数位数，与原 OrderEntry.price_str（'{:f}'.format(dec(x))）的格式保持一致
+OUTPUT_PRICE_DIGITS = 18
+
+Level = Tuple[int, int]  # (price, amount)，均为放大后的整数
+
+
+def to_fixed(value: Any, digits: int) -> int:
+    """
+    将价格/数量转换为放大后的整数，超出精度的部分截断（与dec()的向下取整一致）。
+
+    常见的float和十进制字符串直接按字符串拆分处理，不构造Decimal；
+    科学计数法等少见格式回退到Decimal。None或无法解析的值与dec()一样按0处理。
+    """
+    if isinstance(value, int):
+        return value * 10 ** digits
+    if value is None:
+        return 0
+    s = value if isinstance(value, str) else repr(value) if isinstance(value, float) else str(value)
+    try:
+        if 'e' in s or 'E' in s:
+            return int(Decimal(s).scaleb(digits).to_integral_value(rounding=ROUND_FLOOR))
+        negative = s.startswith('-')
+        if negative:
+            s = s[1:]
+        int_part, _, frac_part = s.partition('.')
+        frac_part = (frac_part + '0' * digits)[:digits]
+        fixed = int(int_part or '0') * 10 ** digits + int(frac_part or '0')
+    except (InvalidOperation, ValueError):
+        return 0
+    return -fixed if negative else fixed
+
+
+def fixed_to_str(value: int, digits: int, width: Optional[int] = None) -> str:
+    """
+    整数转回小数字符串，例如 (5000012, 2) -> '50000.12'
+
+    width 大于 digits 时小数部分补零到 width 位，使不同精度的市场输出相同的格式。
+    """
+    width = max(digits, width or 0)
+    if width == 0:
+        return str(value)
+    sign = '-' if value < 0 else ''
+    int_part, frac_part = divmod(abs(value), 10 ** digits)
+    if digits == 0:
+        return f"{sign}{int_part}.{'0' * width}"
+    return f"{sign}{int_part}.{frac_part:0{digits}d}{'0' * (width - digits)}"
+
+
+def fixed_to_decimal(value: int, digits: int) -> Decimal:
+    return Decimal(value).scaleb(-digits)
+
+
+def fixed_to_float(value: int, digits: int) -> float:
+    return value / 10 ** digits
+
+
+class FixedPointScale:
+    """一个市场（或合并订单簿）的价格/数量精度"""
+
+    __slots__ = ('price_digits', 'amount_digits')
+
+    def __init__(self, price_digits: Optional[int] = None, amount_digits: Optional[int] = None):
+        self.price_digits = DEFAULT_PRICE_DIGITS if price_digits is None else price_digits
+        self.amount_digits = DEFAULT_AMOUNT_DIGITS if amount_digits is None else amount_digits
+
+    @classmethod
+    def from_market(cls, market) -> 'FixedPointScale':
+        return cls(market.precision_price, market.precision_amount)
+
+    @classmethod
+    def widest(cls, scales: Iterable['FixedPointScale']) -> 'FixedPointScale':
+        """合并多个市场时取最大精度，保证任何一个市场的价位都不会被截断"""
+        scales = list(scales)
+        if not scales:
+            return cls()
+        return cls(max(s.price_digits for s in scales), max(s.amount_digits for s in scales))
+
+    def parse_levels(self, levels: Iterable[List[Any]]) -> List[Level]:
+        pd, ad = self.price_digits, self.amount_digits
+        return [(to_fixed(level[0], pd), to_fixed(level[1], ad)) for level in levels]
+
+    def __repr__(self):
+        return f"FixedPointScale(price_digits={self.price_digits}, amount_digits={self.amount_digits})"
+
+
+def merge_levels(old: List[Level], new: List[Level], reverse: bool = False) -> List[Level]:
+    """按价位合并两组档位，数量相加；reverse=True 时价格从高到低（买盘）"""
+    merged: Dict[int, int] = {}
+    for price, amount in old:
+        merged[price] = merged.get(price, 0) + amount
+    for price, amount in new:
+        merged[price] = merged.get(price, 0) + amount
+    return sorted(merged.items(), reverse=reverse)
+
+
+def uncross_levels(bids: List[Level], asks: List[Level]) -> Tuple[List[Level], List[Level]]:
+    """
+    交叉盘/锁定盘处理：最高买价 >= 最低卖价时，交替丢弃买一、卖一，直到盘口不再交叉。
+    """
+    bid_start, ask_start = 0, 0
+    toggle = True
+    while bid_start < len(bids) and ask_start < len(asks) and bids[bid_start][0] >= asks[ask_start][0]:
+        if toggle:
+            bid_start += 1
+        else:
+            ask_start += 1
+        toggle = not toggle
+    return bids[bid_start:], asks[ask_start:]
+
+
+class FixedOrderbook:
+    """以整数档位表示的订单簿，用于合并等热点计算"""
+
+    __slots__ = ('scale', 'bids', 'asks', 'timestamp')
+
+    def __init__(self, scale: FixedPointScale, timestamp: Optional[float] = None):
+        self.scale = scale
+        self.bids: List[Level] = []
+        self.asks: List[Level] = []
+        self.timestamp = time.time() * 1000 if timestamp is None else timestamp
+
+    @classmethod
+    def from_json(cls, data: Dict[str, Any], scale: FixedPointScale) -> 'FixedOrderbook':
+        ob = cls(scale, data.get('timestamp'))
+        ob.bids = scale.parse_levels(data['bids'])
+        ob.asks = scale.parse_levels(data['asks'])
+        return ob
+
+    def merge(self, other: 'FixedOrderbook') -> None:
+        self.bids = merge_levels(self.bids, other.bids, reverse=True)
+        self.asks = merge_levels(self.asks, other.asks)
+
+    def uncross(self) -> Tuple[int, int]:
+        """清理交叉盘，返回被隐藏的 (买盘档数, 卖盘档数)"""
+        bids, asks = uncross_levels(self.bids, self.asks)
+        hidden = (len(self.bids) - len(bids), len(self.asks) - len(asks))
+        self.bids, self.asks = bids, asks
+        return hidden
+
+    def levels_as_json(self, levels: List[Level]) -> List[List[Any]]:
+        pd, ad = self.scale.price_digits, self.scale.amount_digits
+        return [[fixed_to_str(price, pd, OUTPUT_PRICE_DIGITS), fixed_to_float(amount, ad)] for price, amount in levels]
+
+    def as_json(self) -> Dict[str, Any]:
+        """与 Orderbook.as_json 相同的格式: 价格为字符串，数量为float"""
+        return {
+            'timestamp': self.timestamp,
+            'bids': self.levels_as_json(self.bids),
+            'asks': self.levels_as_json(self.asks),
+        }
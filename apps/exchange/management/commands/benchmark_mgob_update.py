@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import random
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from apps.backoffice.models import MgObPersistence
+from apps.exchange.data_persistor import bulk_update_mgob_prices
+
+
+def update_row_by_row(updates):
+    """原来的实现：每行一条价格UPDATE，USD报价的交易对再各加一条usd_price、cny_price的UPDATE"""
+    with connection.cursor() as cursor:
+        for update in updates:
+            cursor.execute(
+                "UPDATE backoffice_mgobpersistence SET avg_price = %s, buy_price = %s, sell_price = %s, updated_at = NOW() WHERE id = %s",
+                [update['avg_price'], update['avg_price'], update['avg_price'], update['id']]
+            )
+            if update['usd_price'] is not None:
+                cursor.execute(
+                    "UPDATE backoffice_mgobpersistence SET usd_price = %s WHERE id = %s",
+                    [update['usd_price'], update['id']]
+                )
+                cursor.execute(
+                    "UPDATE backoffice_mgobpersistence SET cny_price = %s WHERE id = %s",
+                    [update['cny_price'], update['id']]
+                )
+
+
+class Command(BaseCommand):
+    help = '对比逐行UPDATE与 UPDATE ... FROM (VALUES ...) 批量更新MgObPersistence价格的SQL条数和耗时（在回滚的事务中执行）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=5000, help='参与测试的已有MgObPersistence记录数')
+        parser.add_argument(
+            '--chunk-sizes', type=str, default='500,1000,2000',
+            help='逗号分隔的分块大小列表',
+        )
+        parser.add_argument('--cny-rate', type=str, default='7.2', help='计算cny_price使用的汇率')
+
+    def handle(self, *args, **options):
+        rows = list(MgObPersistence.objects.order_by('id').values('id', 'avg_price')[:options['rows']])
+        if not rows:
+            self.stdout.write(self.style.WARNING("没有MgObPersistence记录，先运行一次价格持久化"))
+            return
+
+        rnd = random.Random(42)
+        cny_rate = Decimal(options['cny_rate'])
+        updates = []
+        for row in rows:
+            price = (row['avg_price'] or Decimal('1')) * Decimal(str(round(rnd.uniform(0.99, 1.01), 6)))
+            is_usd = rnd.random() < 0.7
+            updates.append({
+                'id': row['id'],
+                'avg_price': price,
+                'usd_price': price if is_usd else None,
+                'cny_price': price * cny_rate if is_usd else None,
+            })
+        chunk_sizes = [int(size) for size in options['chunk_sizes'].split(',') if size.strip()]
+
+        self.stdout.write(f"📦 {len(updates)} 行, 其中 {sum(u['usd_price'] is not None for u in updates)} 行为USD报价")
+        statements, cost = self.measure(lambda: update_row_by_row(updates))
+        self.stdout.write(f"  逐行UPDATE:           {statements:>6} 条SQL, {cost * 1000:.1f} ms")
+
+        results = []
+        for chunk_size in chunk_sizes:
+            statements, cost = self.measure(lambda: bulk_update_mgob_prices(updates, chunk_size=chunk_size))
+            # 同样的值再写一次，IS DISTINCT FROM 过滤掉未变化的行
+            _, repeat_cost = self.measure(lambda: bulk_update_mgob_prices(updates, chunk_size=chunk_size), repeat=True)
+            results.append((chunk_size, cost))
+            self.stdout.write(
+                f"  VALUES chunk={chunk_size:>6}: {statements:>6} 条SQL, {cost * 1000:.1f} ms, "
+                f"值未变化时 {repeat_cost * 1000:.1f} ms"
+            )
+
+        best = min(results, key=lambda r: r[1])
+        self.stdout.write(self.style.SUCCESS(f"✅ 建议 MGOB_UPDATE_CHUNK_SIZE = {best[0]}"))
+
+    @staticmethod
+    def measure(run, repeat=False):
+        """在回滚的事务中执行一次，返回 (SQL条数, 耗时)；repeat=True 时先写一遍，只测量第二遍"""
+        with transaction.atomic():
+            if repeat:
+                run()
+            with CaptureQueriesContext(connection) as queries:
+                start = time.perf_counter()
+                run()
+                cost = time.perf_counter() - start
+            transaction.set_rollback(True)
+        return len(queries), cost
@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.exchange.cache_ops import merge_order_list
+from apps.exchange.fixed_point import FixedOrderbook, FixedPointScale
+from apps.exchange.types import Orderbook
+
+
+def generate_orderbook(mid: float, depth: int, price_digits: int, amount_digits: int, rnd: random.Random):
+    tick = 10 ** -price_digits
+    bids, asks = [], []
+    for i in range(depth):
+        bids.append([round(mid - (i + 1) * tick * rnd.randint(1, 5), price_digits),
+                     round(rnd.uniform(0.001, 50), amount_digits)])
+        asks.append([round(mid + (i + 1) * tick * rnd.randint(1, 5), price_digits),
+                     round(rnd.uniform(0.001, 50), amount_digits)])
+    bids.sort(reverse=True)
+    asks.sort()
+    return {'timestamp': int(time.time() * 1000), 'bids': bids, 'asks': asks}
+
+
+class Command(BaseCommand):
+    help = '对比Decimal与定点整数两种订单簿合并实现的耗时（解析、合并、交叉盘清理、序列化）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--exchanges', type=int, default=8, help='参与合并的交易所数量')
+        parser.add_argument('--depth', type=int, default=100, help='每个订单簿的档位数')
+        parser.add_argument('--rounds', type=int, default=200, help='重复合并的轮数')
+        parser.add_argument('--price-digits', type=int, default=2)
+        parser.add_argument('--amount-digits', type=int, default=6)
+
+    def handle(self, *args, **options):
+        rnd = random.Random(42)
+        price_digits, amount_digits = options['price_digits'], options['amount_digits']
+        books = [
+            generate_orderbook(50000.0, options['depth'], price_digits, amount_digits, rnd)
+            for _ in range(options['exchanges'])
+        ]
+        rounds = options['rounds']
+
+        decimal_cost = self.run_decimal(books, rounds)
+        fixed_cost = self.run_fixed(books, rounds, FixedPointScale(price_digits, amount_digits))
+
+        self.stdout.write(
+            f"{options['exchanges']} exchanges x {options['depth']} levels, {rounds} rounds"
+        )
+        self.stdout.write(f"Decimal:     {decimal_cost * 1000 / rounds:.3f} ms/merge")
+        self.stdout.write(f"Fixed-point: {fixed_cost * 1000 / rounds:.3f} ms/merge")
+        self.stdout.write(self.style.SUCCESS(f"Speedup: {decimal_cost / fixed_cost:.2f}x"))
+
+    @staticmethod
+    def run_decimal(books, rounds):
+        start = time.perf_counter()
+        for _ in range(rounds):
+            orderbook = Orderbook()
+            for data in books:
+                ob = Orderbook.from_json(data)
+                orderbook.bids = merge_order_list(orderbook.bids, ob.bids, reverse=True)
+                orderbook.asks = merge_order_list(orderbook.asks, ob.asks)
+            toggle = True
+            bids, asks = orderbook.bids, orderbook.asks
+            while bids and asks and bids[0].price >= asks[0].price:
+                bids, asks = (bids[1:], asks[:]) if toggle else (bids[:], asks[1:])
+                toggle = not toggle
+            orderbook.bids, orderbook.asks = bids, asks
+            orderbook.as_json()
+        return time.perf_counter() - start
+
+    @staticmethod
+    def run_fixed(books, rounds, scale):
+        start = time.perf_counter()
+        for _ in range(rounds):
+            orderbook = FixedOrderbook(scale)
+            for data in books:
+                orderbook.merge(FixedOrderbook.from_json(data, scale))
+            orderbook.uncross()
+            orderbook.as_json()
+        return time.perf_counter() - start
@@ -0,0 +1,219 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import asyncio
+import time
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple
+
+import ccxt.async_support as async_ccxt_module
+import ccxt.pro as ccxt_pro_module
+
+from common.helpers import getLogger, search_limit
+from apps.exchange.ccxt_client import get_client
+from apps.exchange.consts import ORDERBOOK_BULK_BATCH_SIZE, SLEEP_CONFIG
+from apps.exchange.models import TradingPair
+from apps.exchange.utils import get_exchange_capability_support
+
+if TYPE_CHECKING:
+    from apps.exchange.service import CrawlerService
+
+logger = getLogger(__name__)
+
+# 按成本从低到高排列的订单簿获取方式
+METHOD_WS_MULTI = 'watchOrderBookForSymbols'
+METHOD_REST_MULTI = 'fetchOrderBooks'
+METHOD_REST_SINGLE = 'fetchOrderBook'
+
+# 需要单独传参数的交易对（永续合约），只能走单交易对REST
+PER_SYMBOL_ONLY = ['BTC-USD', 'ETH-USD']
+
+# WebSocket订阅每隔这么久（秒）交还给主循环一次，用于重新检查交易所是否仍处于激活状态
+WS_ACTIVE_CHECK_INTERVAL = 60
+# WebSocket连续失败这么多次后才永久降级为REST，期间按指数退避重连
+WS_MAX_FAILURES = 5
+WS_MAX_BACKOFF = 60
+
+
+class OrderbookAcquirer:
+    """
+    订单簿获取层，为每个交易所挑选开销最小的获取方式：
+    1. ccxt.pro watchOrderBookForSymbols 多交易对WebSocket推送；
+    2. fetchOrderBooks 多交易对REST请求；
+    3. fetchOrderBook 单交易对REST请求（经CrawlScheduler并发）。
+
+    所有方式获取到的数据都经过CrawlerService.store_orderbook统一转换为Orderbook并写入缓存。
+    """
+
+    def __init__(self, crawler: 'CrawlerService'):
+        self.crawler = crawler
+        self.exchange_slug = crawler.exchange_slug
+        self.method: Optional[str] = None
+        self.pro_client = None
+        self._last_stored: Dict[str, float] = {}
+        self._ws_failures = 0
+        self.logger = getLogger(f'crawler.orderbook.{self.exchange_slug}')
+
+    async def select_method(self) -> str:
+        """检测交易所能力并确定获取方式，只在首次调用时检测"""
+        if self.method:
+            return self.method
+
+        self.method = METHOD_REST_SINGLE
+        for capability, module in ((METHOD_WS_MULTI, ccxt_pro_module), (METHOD_REST_MULTI, async_ccxt_module)):
+            try:
+                support = await get_exchange_capability_support(module, capability, [self.exchange_slug])
+            except Exception as e:
+                self.logger.warning(f"{self.exchange_slug}: checking {capability} support failed: {e}")
+                continue
+            # 模拟实现(emulated)内部仍是逐个请求，不比单交易对REST更省
+            if self.exchange_slug in support['natively_supported']:
+                self.method = capability
+                break
+
+        self.logger.info(f"{self.exchange_slug}: orderbook acquisition method is {self.method}")
+        return self.method
+
+    def _split_symbols(self) -> Tuple[List[TradingPair], List[TradingPair]]:
+        multi, single = [], []
+        for symbol in self.crawler.symbols:
+            (single if symbol.symbol_display in PER_SYMBOL_ONLY else multi).append(symbol)
+        return multi, single
+
+    def _downgrade(self, reason: Exception) -> None:
+        next_method = METHOD_REST_MULTI if self.method == METHOD_WS_MULTI else METHOD_REST_SINGLE
+        self.logger.error(f"{self.exchange_slug}: {self.method} failed ({reason}), downgrade to {next_method}",
+                          exc_info=True)
+        self.method = next_method
+
+    async def fetch_once(self, limit: int) -> None:
+        """执行一个REST抓取周期"""
+        multi, single = self._split_symbols()
+        if self.method == METHOD_REST_MULTI and multi:
+            try:
+                await self._fetch_order_books(multi, limit)
+            except Exception as e:
+                self._downgrade(e)
+                single = single + multi
+        else:
+            single = single + multi
+        if single:
+            await self.crawler.fetch_symbols_orderbooks(limit, symbols=single)
+
+    async def _fetch_order_books(self, symbols: List[TradingPair], limit: int) -> None:
+        slimit = search_limit(limit)
+        names = [symbol.symbol_display for symbol in symbols]
+        for i in range(0, len(names), ORDERBOOK_BULK_BATCH_SIZE):
+            batch = names[i:i + ORDERBOOK_BULK_BATCH_SIZE]
+            data = await self.crawler.exchange_client.fetch_order_books(batch, limit=slimit)
+            for symbol_name in batch:
+                if symbol_name not in data:
+                    self.logger.warning(f"{self.exchange_slug}: {symbol_name} missing from fetchOrderBooks response")
+                    continue
+                self._store(symbol_name, data[symbol_name], limit)
+
+    def _store(self, symbol_name: str, data: Dict[str, Any], limit: int) -> None:
+        try:
+            self.crawler.store_orderbook(symbol_name, data, limit)
+        except Exception:
+            self.logger.error(f"{self.exchange_slug}: store orderbook {symbol_name} failed", exc_info=True)
+
+    def _get_pro_client(self):
+        if self.pro_client is None:
+            self.pro_client = get_client(self.exchange_slug, "async", client_type="pro")
+            if self.pro_client and self.crawler.proxy:
+                self.pro_client.aiohttp_proxy = f"http://{self.crawler.proxy}"
+        return self.pro_client
+
+    async def watch(self, limit: int, duration: float = WS_ACTIVE_CHECK_INTERVAL) -> None:
+        """
+        订阅多交易对订单簿推送，duration 秒后返回（订阅保持，下次调用继续使用），连接出错时抛出异常。
+
+        推送频率通常远高于REST轮询，同一交易对在crawler_fetch_orderbooks间隔内只写入一次缓存。
+        """
+        multi, _ = self._split_symbols()
+        client = self._get_pro_client()
+        if not client:
+            raise RuntimeError(f"ccxt.pro client for {self.exchange_slug} is not available")
+        names = [symbol.symbol_display for symbol in multi]
+        min_interval = SLEEP_CONFIG['crawler_fetch_orderbooks']
+        slimit = search_limit(limit)
+        deadline = time.monotonic() + duration
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            try:
+                # 推送停顿时也要按时返回
+                data = await asyncio.wait_for(client.watch_order_book_for_symbols(names, slimit), remaining)
+            except asyncio.TimeoutError:
+                return
+            symbol_name = data.get('symbol')
+            now = time.time()
+            if not symbol_name or now - self._last_stored.get(symbol_name, 0) < min_interval:
+                continue
+            self._last_stored[symbol_name] = now
+            self._store(symbol_name, data, limit)
+
+    async def run(self, limit: int) -> None:
+        """订单簿抓取主循环，按选定方式获取，出错后自动降级"""
+        await self.select_method()
+        cnt = 0
+        while True:
+            cnt += 1
+            if cnt >= 10:
+                self.crawler.exchange.refresh_from_db()
+                cnt = 0
+            if not self.crawler.exchange.is_active:
+                self.logger.error('exchange %s is not active', self.exchange_slug)
+                await asyncio.sleep(SLEEP_CONFIG['crawler_fetch_orderbooks'])
+                continue
+
+            if self.method == METHOD_WS_MULTI:
+                # 永续合约等特殊交易对仍按REST轮询
+                _, single = self._split_symbols()
+                poll_task = asyncio.create_task(self._poll_single(single, limit)) if single else None
+                try:
+                    await self.watch(limit)
+                    self._ws_failures = 0
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    await self.close_pro_client()
+                    await self._on_ws_failure(e)
+                finally:
+                    if poll_task:
+                        poll_task.cancel()
+                # 每次从订阅返回都重新读取交易所状态
+                self.crawler.exchange.refresh_from_db()
+                cnt = 0
+                if not self.crawler.exchange.is_active:
+                    await self.close_pro_client()
+                continue
+
+            await self.fetch_once(limit)
+            await asyncio.sleep(SLEEP_CONFIG['crawler_fetch_orderbooks'])
+
+    async def _on_ws_failure(self, reason: Exception) -> None:
+        """WebSocket出错后按指数退避重连，连续失败 WS_MAX_FAILURES 次才降级为REST"""
+        self._ws_failures += 1
+        if self._ws_failures >= WS_MAX_FAILURES:
+            self._ws_failures = 0
+            self._downgrade(reason)
+            return
+        backoff = min(2 ** self._ws_failures, WS_MAX_BACKOFF)
+        self.logger.warning(f"{self.exchange_slug}: {self.method} failed ({reason}), "
+                            f"retry {self._ws_failures}/{WS_MAX_FAILURES} in {backoff}s")
+        await asyncio.sleep(backoff)
+
+    async def _poll_single(self, symbols: List[TradingPair], limit: int) -> None:
+        while True:
+            await self.crawler.fetch_symbols_orderbooks(limit, symbols=symbols)
+            await asyncio.sleep(SLEEP_CONFIG['crawler_fetch_orderbooks'])
+
+    async def close_pro_client(self) -> None:
+        if self.pro_client:
+            try:
+                await self.pro_client.close()
+            except Exception:
+                pass
+            self.pro_client = None
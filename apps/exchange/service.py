@@ -3,9 +3,8 @@
 
 import asyncio
 import socket
-import sys
 import time
-from typing import Iterable, Optional, Set, List
+from typing import Any, Dict, Iterable, Optional, Set, List
 
 from django.conf import settings
 
@@ -13,7 +12,9 @@ from common.decorators import retry_on
 from common.helpers import search_limit, getLogger
 from apps.exchange.consts import SLEEP_CONFIG
 from apps.exchange.cache_ops import merge_orderbooks, set_24ticker, set_orderbook
+from apps.exchange.crawl_scheduler import CrawlScheduler
 from apps.exchange.models import Exchange, TradingPair
+from apps.exchange.orderbook_acquirer import OrderbookAcquirer
 from apps.exchange.types import Orderbook
 from apps.exchange.ccxt_client import get_client
 
@@ -27,6 +28,7 @@ class CrawlerService(object):
     exchange_name: str
     exchange_slug: str
     exchange_client: Optional[object]
+    scheduler: CrawlScheduler
 
     def __init__(self, exchange_obj: Exchange, proxy=None, testnet=False):
         self.exchange_name = exchange_obj.name
@@ -36,6 +38,7 @@ class CrawlerService(object):
         self.testnet = testnet
         self.exchange_client = None
         self._initialize_client()
+        self.scheduler = CrawlScheduler(self.exchange_slug, getattr(self.exchange_client, 'rateLimit', None))
         self.logger = getLogger(f'crawler.service.{self.exchange_slug}')
         self.symbols: List[TradingPair] = []
         self.symbol_names: Set[str] = set()
@@ -111,11 +114,14 @@ class CrawlerService(object):
             slimit = search_limit(limit)
             assert slimit >= limit, f'slimit {slimit} must be greater than limit {limit}'
             data = await self.exchange_client.fetch_order_book(symbol.symbol_display, limit=slimit)
+        self.store_orderbook(symbol.symbol_display, data, limit)
+
+    def store_orderbook(self, symbol_name: str, data: Dict[str, Any], limit: int) -> None:
         ob = Orderbook.from_json(data)
         ob.bids = ob.bids[:limit]
         ob.asks = ob.asks[:limit]
-        ob.source = "crawler@{HOSTNAME}"
-        set_orderbook(self.exchange_slug, symbol.symbol_display, ob.as_json())
+        ob.source = f"crawler@{HOSTNAME}"
+        set_orderbook(self.exchange_slug, symbol_name, ob.as_json())
 
     @retry_on()
     async def fetch_markets(self):
@@ -141,12 +147,7 @@ class CrawlerService(object):
             return
         while True:
             self.logger.debug(f"Starting new ticker fetch cycle for symbols: {self.symbol_names}")
-            for symbol in self.symbols:
-                self.logger.debug(f"Processing symbol: {symbol.symbol_display}")
-                try:
-                    await self.fetch_24ticker(symbol)
-                except Exception as e:
-                    self.logger.error(f'Error processing symbol {symbol.symbol_display} in main loop.', exc_info=True)
+            await self.scheduler.run(self.symbols, lambda symbol: f'ticker:{symbol.symbol_display}', self.fetch_24ticker)
             try:
                 sleep_time = SLEEP_CONFIG['crawler_fetch_24tickers']
             except KeyError:
@@ -156,34 +157,18 @@ class CrawlerService(object):
             await asyncio.sleep(sleep_time)
 
     async def crawler_fetch_orderbooks(self, limit: int = 15):
-        cnt = 0
-        while True:
-            cnt += 1
-            if cnt >= 10:
-                self.exchange.refresh_from_db()
-                cnt = 0
-            if self.exchange.is_active:
-                await self.fetch_symbols_orderbooks(limit)
-            else:
-                self.logger.error('exchange %s is not active', self.exchange_slug)
-            await asyncio.sleep(SLEEP_CONFIG['crawler_fetch_orderbooks'])
-
-    async def fetch_symbols_orderbooks(self, limit: int):
-        for symbol in self.symbols:
-            try:
-                await self.fetch_orderbook(symbol, limit)
-                self.logger.debug(
-                    'Crawler %s %s fetch orderbooks succeed',
-                    self.exchange_slug,
-                    symbol.symbol_display
-                )
-            except Exception as e:
-                self.logger.error(
-                    'Crawler %s %s fetch orderbooks fail',
-                    self.exchange_slug,
-                    symbol.symbol_display, exc_info=True
-                )
-                sys.exit(1)
+        await OrderbookAcquirer(self).run(limit)
+
+    async def fetch_symbols_orderbooks(self, limit: int, symbols: Optional[Iterable[TradingPair]] = None):
+        stats = await self.scheduler.run(
+            self.symbols if symbols is None else symbols,
+            lambda symbol: f'orderbook:{symbol.symbol_display}',
+            lambda symbol: self.fetch_orderbook(symbol, limit)
+        )
+        if stats['failed'] or stats['skipped']:
+            self.logger.warning('Crawler %s fetch orderbooks: %s', self.exchange_slug, stats)
+        else:
+            self.logger.debug('Crawler %s fetch orderbooks succeed: %s', self.exchange_slug, stats)
 
     async def merge_orderbooks(self, symbol: TradingPair):
         await merge_orderbooks(symbol)
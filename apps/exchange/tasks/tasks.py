@@ -4,6 +4,7 @@ import time
 from decimal import Decimal
 
 import aiohttp
+from ccxt.base.decimal_to_precision import DECIMAL_PLACES, SIGNIFICANT_DIGITS
 from celery import shared_task
 from django.utils import timezone
 from django.core.management import call_command
@@ -63,6 +64,9 @@ def process_exchange(self, exchange_slug):
     try:
         # 使用asyncio.run运行异步任务
         result = asyncio.run(handle_exchange_async(exchange_slug))
+        # 交易所/资产/交易对目录可能已变化，让gRPC参考数据快照重建
+        from services.snapshots import invalidate_reference_snapshots
+        invalidate_reference_snapshots()
         elapsed = time.time() - start_time
         logger.info(f"交易所 {exchange_slug} 处理完成，耗时: {elapsed:.2f}秒")
         return {'status': 'success', 'exchange': exchange_slug, 'elapsed': f"{elapsed:.2f}秒"}
@@ -153,6 +157,22 @@ async def handle_exchange_async(exchange_slug):
             except:
                 return None
 
+        # ccxt 的 precision.price 在 TICK_SIZE 模式下是最小价格变动（如 0.01），
+        # 在 DECIMAL_PLACES 模式下直接是小数位数；有效数字模式无法换算成小数位数，留空
+        precision_mode = getattr(client, 'precisionMode', None)
+
+        def get_price_precision_digits(value):
+            if value is None:
+                return None
+            if precision_mode == DECIMAL_PLACES:
+                try:
+                    return int(value)
+                except (TypeError, ValueError):
+                    return None
+            if precision_mode == SIGNIFICANT_DIGITS:
+                return None
+            return get_precision_digits(value)
+
         for market_data in markets_to_iterate:
             try:
                 if not isinstance(market_data, dict):
@@ -236,6 +256,7 @@ async def handle_exchange_async(exchange_slug):
                 precision = market_data.get('precision', {})
                 limits = market_data.get('limits', {})
 
+                precision_price = get_price_precision_digits(precision.get('price'))
                 precision_amount = get_precision_digits(precision.get('amount'))
                 min_trade_size_base = limits.get('amount', {}).get('min')
                 min_trade_size_quote = limits.get('cost', {}).get('min')
@@ -254,6 +275,7 @@ async def handle_exchange_async(exchange_slug):
                     'market_url': market_url,
                     'meta_data': meta_data if meta_data else None,
                     'last_synced_at': timezone.now(),
+                    'precision_price': precision_price,
                     'precision_amount': precision_amount,
                     'min_trade_size_base': min_trade_size_base,
                     'min_trade_size_quote': min_trade_size_quote,
@@ -323,6 +345,7 @@ async def handle_exchange_async(exchange_slug):
                             'market_url': market_info['market_url'],
                             'meta_data': market_info['meta_data'],
                             'last_synced_at': market_info['last_synced_at'],
+                            'precision_price': market_info['precision_price'],
                             'precision_amount': market_info['precision_amount'],
                             'min_trade_size_base': market_info['min_trade_size_base'],
                             'min_trade_size_quote': market_info['min_trade_size_quote'],
@@ -86,7 +86,7 @@ class TickerTask:
             # 数据库更新将由专门的命令处理
             await self.persistor.update_redis_prices(price_update_infos)
             
-            logger.info(f"{log_prefix}: 已将{len(price_update_infos)}个价格更新到Redis")
+            logger.info(f"{log_prefix}: 已提交{len(price_update_infos)}个价格到Redis（未变化的价格不重复写入）")
             return True
 
         except Exception as e:
@@ -0,0 +1,60 @@
+from decimal import Decimal
+
+from django.test import SimpleTestCase
+
+from apps.exchange.fixed_point import (
+    DEFAULT_PRICE_DIGITS, FixedOrderbook, FixedPointScale, fixed_to_decimal, fixed_to_str, to_fixed,
+)
+from apps.exchange.types import Orderbook
+
+
+class ToFixedTests(SimpleTestCase):
+
+    def test_round_trip(self):
+        for value, digits in [('50000.12', 2), ('0.00000123', 8), ('1', 0), ('-3.5', 4), ('0.000000000000000001', 18)]:
+            fixed = to_fixed(value, digits)
+            self.assertEqual(fixed_to_decimal(fixed, digits), Decimal(value))
+            self.assertEqual(Decimal(fixed_to_str(fixed, digits)), Decimal(value))
+
+    def test_float_and_scientific_notation(self):
+        self.assertEqual(to_fixed(0.1, 8), 10000000)
+        self.assertEqual(to_fixed(1e-05, 8), 1000)
+        self.assertEqual(to_fixed('1.5E-7', 8), 15)
+
+    def test_truncates_extra_digits(self):
+        self.assertEqual(to_fixed('1.239', 2), 123)
+        self.assertEqual(to_fixed('0.000000001234', 8), 0)
+        # 默认精度与 dec() 一致，不截断 1e-8 以下的价格
+        self.assertEqual(to_fixed('0.000000001234', DEFAULT_PRICE_DIGITS), 1234000000)
+
+    def test_none_and_invalid_are_zero(self):
+        self.assertEqual(to_fixed(None, 8), 0)
+        self.assertEqual(to_fixed('abc', 8), 0)
+
+    def test_fixed_to_str_pads_to_width(self):
+        self.assertEqual(fixed_to_str(5000012, 2), '50000.12')
+        self.assertEqual(fixed_to_str(5000012, 2, 4), '50000.1200')
+        self.assertEqual(fixed_to_str(5, 0, 2), '5.00')
+
+
+class FixedOrderbookTests(SimpleTestCase):
+
+    def test_as_json_matches_decimal_orderbook(self):
+        data = {
+            'timestamp': 1700000000000,
+            'bids': [['50000.12', 1.5], ['49999.9', 0.25]],
+            'asks': [['50000.5', 2.0], ['50001', 0.1]],
+        }
+        expected = Orderbook.from_json(data).as_json()
+        for scale in (FixedPointScale(), FixedPointScale(2, 6)):
+            actual = FixedOrderbook.from_json(data, scale).as_json()
+            self.assertEqual(actual['bids'], expected['bids'])
+            self.assertEqual(actual['asks'], expected['asks'])
+
+    def test_merge_and_uncross(self):
+        scale = FixedPointScale(2, 4)
+        orderbook = FixedOrderbook.from_json({'bids': [['100.00', 1]], 'asks': [['101.00', 1]]}, scale)
+        orderbook.merge(FixedOrderbook.from_json({'bids': [['100.00', 2], ['101.50', 1]], 'asks': [['102', 3]]}, scale))
+        self.assertEqual(orderbook.bids, [(10150, 10000), (10000, 30000)])
+        self.assertEqual(orderbook.uncross(), (1, 0))
+        self.assertEqual(orderbook.bids, [(10000, 30000)])
@@ -0,0 +1,74 @@
+import json
+import time
+import uuid
+
+from django.test import SimpleTestCase
+
+from apps.exchange.cache_ops import query_history_orderbooks
+from apps.exchange.consts import NRDS_EXCHANGE_ORDERBOOKS_KEY
+from common.redis_client import local_redis
+
+EXCHANGE = 'history_test'
+BUCKET = 10
+
+
+def snapshot(ts: int, levels: int = 5) -> dict:
+    # 超过14位有效数字的价格和数量，cjson 重新编码时会被舍入
+    return {
+        'timestamp': ts * 1000,
+        'source': 'test',
+        'bids': [[0.12345678901234568 - i * 1e-9, 1234.5678901234567 + i] for i in range(levels)],
+        'asks': [[0.12345678901234569 + i * 1e-9, 9876.5432109876543 + i] for i in range(levels)],
+    }
+
+
+def as_json(orderbooks):
+    return [(ob.timestamp, ob.as_json()['bids'], ob.as_json()['asks']) for ob in orderbooks]
+
+
+class HistoryOrderbookQueryTests(SimpleTestCase):
+    """分桶、截断档位的脚本路径与直接 ZREVRANGEBYSCORE 的结果一致，需要可用的Redis"""
+
+    def setUp(self):
+        try:
+            local_redis().ping()
+        except Exception as e:
+            self.skipTest(f"Redis不可用: {e}")
+        self.symbol = f"T{uuid.uuid4().hex[:8]}/USDT"
+        self.key = NRDS_EXCHANGE_ORDERBOOKS_KEY % (EXCHANGE, self.symbol)
+        self.addCleanup(local_redis().delete, self.key)
+
+        # 对齐到桶边界，每个桶里放两个快照
+        self.base = int(time.time()) // BUCKET * BUCKET - 10 * BUCKET
+        self.scores = [self.base + offset for offset in (0, 3, 10, 17, 20, 29, 40, 41)]
+        local_redis().zadd(self.key, {json.dumps(snapshot(score)): score for score in self.scores})
+
+    def query(self, **kwargs):
+        return query_history_orderbooks(EXCHANGE, self.symbol, start=self.base, end=self.base + 100, **kwargs)
+
+    def test_depth_keeps_full_precision(self):
+        full = self.query()
+        truncated = self.query(bucket=BUCKET, depth=2)
+        self.assertTrue(all(len(ob.bids) == 2 and len(ob.asks) == 2 for ob in truncated))
+        expected = {ob.timestamp: (ob.bids[:2], ob.asks[:2]) for ob in full}
+        for ob in truncated:
+            bids, asks = expected[ob.timestamp]
+            self.assertEqual([(e.price, e.amount) for e in ob.bids], [(e.price, e.amount) for e in bids])
+            self.assertEqual([(e.price, e.amount) for e in ob.asks], [(e.price, e.amount) for e in asks])
+
+    def test_bucket_keeps_latest_snapshot_per_bucket(self):
+        latest = {}
+        for score in self.scores:
+            latest[score // BUCKET] = score
+        expected = [score * 1000 for score in sorted(latest.values())]
+
+        self.assertEqual([ob.timestamp for ob in self.query(bucket=BUCKET)], expected)
+        self.assertEqual([ob.timestamp for ob in self.query(bucket=BUCKET, offset=1, limit=2)], expected[-3:-1])
+
+    def test_depth_without_bucket_matches_plain_range(self):
+        full = self.query(offset=1, limit=3)
+        truncated = self.query(offset=1, limit=3, depth=3)
+        self.assertEqual(
+            as_json(truncated),
+            [(ts, bids[:3], asks[:3]) for ts, bids, asks in as_json(full)],
+        )
@@ -3,11 +3,10 @@ from datetime import datetime
 from decimal import Decimal
 from typing import Any, Dict, List, Optional, Union
 
-import ntplib
 from dateutil.parser import parse
-from django.conf import settings
 from pytz import timezone
 
+from common.clock import now_ms
 from common.helpers import dec, decstr, d2
 from apps.exchange.models import Asset
 
@@ -113,11 +112,7 @@ class Orderbook:
 
         ob.timestamp = data['timestamp']
         if not ob.timestamp:
-            try:
-                ntp_time = ntplib.NTPClient().request(settings.NTP_TIME_SERVER).tx_time
-                ob.timestamp = int(ntp_time * 1000)  # ms
-            except Exception:
-                ob.timestamp = time.time() * 1000
+            ob.timestamp = now_ms()
         return ob
 
     @classmethod
@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand
+
+from apps.klines.partitions import archive_old_partitions, ensure_brin_indexes, ensure_future_partitions
+
+
+class Command(BaseCommand):
+    help = ('Runs the klines partition lifecycle: pre-creates future partitions, archives 1m data past '
+            'KLINES_1M_RETENTION_DAYS and adds BRIN indexes on historical partitions.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--months', type=int, help='Future months to pre-create (default: KLINES_PARTITION_HORIZON_MONTHS)')
+        parser.add_argument('--retention-days', type=int, help='Keep 1m klines for N days (default: KLINES_1M_RETENTION_DAYS)')
+        parser.add_argument('--archive-dir', type=str, help='Directory for gzip CSV archives (default: KLINES_ARCHIVE_DIR)')
+        parser.add_argument('--tablespace', type=str, help='Cold tablespace for detached 1m partitions (default: KLINES_COLD_TABLESPACE)')
+        parser.add_argument('--skip-create', action='store_true', help='Do not pre-create future partitions')
+        parser.add_argument('--skip-archive', action='store_true', help='Do not archive old 1m data')
+        parser.add_argument('--skip-brin', action='store_true', help='Do not create BRIN indexes')
+        parser.add_argument('--dry-run', action='store_true', help='Only report what would be archived or indexed')
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+
+        if not options['skip_create'] and not dry_run:
+            months = ensure_future_partitions(options['months'])
+            self.stdout.write(self.style.SUCCESS(f"Partitions ensured for: {', '.join(months)}"))
+
+        if not options['skip_archive']:
+            archived = archive_old_partitions(
+                retention_days=options['retention_days'],
+                archive_dir=options['archive_dir'],
+                tablespace=options['tablespace'],
+                dry_run=dry_run,
+            )
+            self.stdout.write(self.style.SUCCESS(
+                f"{'Would archive' if dry_run else 'Archived'} {len(archived)} partitions: {', '.join(archived) or '-'}"))
+
+        if not options['skip_brin']:
+            created = ensure_brin_indexes(dry_run=dry_run)
+            self.stdout.write(self.style.SUCCESS(
+                f"{'Would create' if dry_run else 'Created'} {len(created)} BRIN indexes: {', '.join(created) or '-'}"))
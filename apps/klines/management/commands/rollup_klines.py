@@ -0,0 +1,39 @@
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from apps.exchange.models import Market
+from apps.klines.rollup import BASE_INTERVAL, rollup_klines
+from apps.klines.watermark import watermark_store
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds rolled-up kline intervals (30m ~ 12mo) from stored 1m klines.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--market', type=str, help='Only rebuild this market_identifier')
+        parser.add_argument('--exchange', type=str, help='Only rebuild markets of this exchange slug')
+        parser.add_argument('--days', type=int, default=30, help='Rebuild the last N days (default: 30)')
+
+    def handle(self, *args, **options):
+        markets = Market.objects.filter(status='Trading')
+        if options['market']:
+            markets = markets.filter(market_identifier=options['market'])
+        if options['exchange']:
+            markets = markets.filter(exchange__slug=options['exchange'])
+
+        end = timezone.now()
+        start = end - timedelta(days=options['days'])
+        total = 0
+        for market_identifier in markets.values_list('market_identifier', flat=True).iterator():
+            # 只聚合基础K线完整覆盖的桶
+            coverage_start = watermark_store.coverage_start(market_identifier, BASE_INTERVAL)
+            if coverage_start is None:
+                continue
+            coverage = datetime.fromtimestamp(coverage_start / 1000, tz=dt_timezone.utc)
+            result = rollup_klines(market_identifier, start, end, coverage)
+            total += sum(result.values())
+            self.stdout.write(f"{market_identifier}: {result}")
+
+        self.stdout.write(self.style.SUCCESS(f"Rollup finished, {total} rows inserted or updated."))
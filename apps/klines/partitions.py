@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+klines 分区生命周期管理。
+
+- 按滚动窗口提前创建未来月份的分区（由数据库函数 create_klines_partitions_for_month 完成）
+- 超过保留期的 1m 数据归档：只含 1m 的分区整体 DETACH 后导出为 gzip 文件或移到冷表空间，
+  混合周期的分区则只导出并删除其中的 1m 行；更粗的周期永久保留。
+  归档文件名带导出时间且不覆盖已有文件，已没有 1m 行的混合分区不再重复导出
+- 已结束的历史分区在 open_time 上建 BRIN 索引，代替随数据增长膨胀的 B-tree 扫描
+
+分区结构通过 pg_inherits 从数据库读取，不依赖分区命名规则。
+"""
+
+import gzip
+import os
+import re
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from typing import List, Optional
+
+from dateutil.relativedelta import relativedelta
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from common.helpers import getLogger
+
+logger = getLogger(__name__)
+
+KLINES_TABLE = 'klines'
+ARCHIVE_INTERVAL = '1m'
+
+DEFAULT_HORIZON_MONTHS = 3
+DEFAULT_1M_RETENTION_DAYS = 90
+
+# 递归列出 klines 的所有分区及其分区边界
+PARTITIONS_SQL = """
+WITH RECURSIVE tree AS (
+    SELECT c.oid, c.relname, p.relname AS parent, pg_get_expr(c.relpartbound, c.oid) AS bound, 1 AS depth
+    FROM pg_inherits i
+    JOIN pg_class c ON c.oid = i.inhrelid
+    JOIN pg_class p ON p.oid = i.inhparent
+    WHERE p.relname = %s
+    UNION ALL
+    SELECT c.oid, c.relname, t.relname, pg_get_expr(c.relpartbound, c.oid), t.depth + 1
+    FROM pg_inherits i
+    JOIN pg_class c ON c.oid = i.inhrelid
+    JOIN tree t ON t.oid = i.inhparent
+)
+SELECT t.relname, t.parent, t.bound,
+       NOT EXISTS (SELECT 1 FROM pg_inherits i WHERE i.inhparent = t.oid) AS is_leaf
+FROM tree t
+ORDER BY t.depth, t.relname
+"""
+
+RANGE_BOUND_RE = re.compile(r"FROM \('([^']+)'\) TO \('([^']+)'\)")
+LIST_BOUND_RE = re.compile(r"IN \(([^)]*)\)")
+
+
+@dataclass
+class Partition:
+    name: str
+    parent: str
+    is_leaf: bool
+    intervals: Optional[List[str]] = None  # 列表分区的周期值，None 表示不按周期分区（混合周期）
+    range_start: Optional[datetime] = None
+    range_end: Optional[datetime] = None
+
+    @property
+    def only_archive_interval(self) -> bool:
+        return self.intervals == [ARCHIVE_INTERVAL]
+
+
+def _parse_time(value: str) -> Optional[datetime]:
+    if value in ('MINVALUE', 'MAXVALUE'):
+        return None
+    parsed = datetime.fromisoformat(value.replace(' ', 'T'))
+    return parsed if timezone.is_aware(parsed) else parsed.replace(tzinfo=dt_timezone.utc)
+
+
+def list_partitions() -> List[Partition]:
+    """读取 klines 的分区树，子分区继承上层分区的周期和时间范围"""
+    with connection.cursor() as cursor:
+        cursor.execute(PARTITIONS_SQL, [KLINES_TABLE])
+        rows = cursor.fetchall()
+
+    partitions = {}
+    for name, parent, bound, is_leaf in rows:
+        inherited = partitions.get(parent)
+        partition = Partition(
+            name=name,
+            parent=parent,
+            is_leaf=is_leaf,
+            intervals=inherited.intervals if inherited else None,
+            range_start=inherited.range_start if inherited else None,
+            range_end=inherited.range_end if inherited else None,
+        )
+        range_match = RANGE_BOUND_RE.search(bound or '')
+        list_match = LIST_BOUND_RE.search(bound or '')
+        if range_match:
+            partition.range_start = _parse_time(range_match.group(1))
+            partition.range_end = _parse_time(range_match.group(2))
+        elif list_match:
+            partition.intervals = [v.strip().strip("'") for v in list_match.group(1).split(',')]
+        partitions[name] = partition
+    return list(partitions.values())
+
+
+def ensure_future_partitions(months: Optional[int] = None) -> List[str]:
+    """
+    确保当前月份及之后 months-1 个月的分区存在
+
+    Returns:
+        处理过的月份列表，形如 ['2025-05', ...]
+    """
+    months = months or getattr(settings, 'KLINES_PARTITION_HORIZON_MONTHS', DEFAULT_HORIZON_MONTHS)
+    processed = []
+    current = date.today().replace(day=1)
+    for i in range(months):
+        target = current + relativedelta(months=i)
+        # 数据库函数内部处理"已存在"的情况
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT create_klines_partitions_for_month(%s, %s);", [target.year, target.month])
+        processed.append(f"{target.year}-{target.month:02d}")
+    logger.info(f"klines 分区已覆盖: {', '.join(processed)}")
+    return processed
+
+
+def _archive_path(archive_dir: str, stem: str) -> str:
+    """归档文件路径，带导出时间，同一分区多次导出不会互相覆盖"""
+    return os.path.join(archive_dir, f"{stem}_{timezone.now():%Y%m%dT%H%M%S}.csv.gz")
+
+
+def _has_archive_rows(partition: Partition) -> bool:
+    """混合周期分区中是否还有未归档的 1m 行"""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT 1 FROM {connection.ops.quote_name(partition.name)} WHERE \"interval\" = %s LIMIT 1",
+            [ARCHIVE_INTERVAL],
+        )
+        return cursor.fetchone() is not None
+
+
+def _copy_to_gzip(cursor, query: str, path: str) -> None:
+    """把 COPY ... TO STDOUT 的结果写入 gzip 文件，文件已存在时抛出 FileExistsError，不覆盖已有归档"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with gzip.open(path, 'xb') as f, cursor.copy(f"COPY ({query}) TO STDOUT WITH (FORMAT csv, HEADER)") as copy:
+        for chunk in copy:
+            f.write(chunk)
+
+
+def archive_old_partitions(retention_days: Optional[int] = None, archive_dir: Optional[str] = None,
+                           tablespace: Optional[str] = None, dry_run: bool = False) -> List[str]:
+    """
+    归档超过保留期的 1m K线
+
+    只含 1m 的分区：DETACH 后移到冷表空间（设置了 tablespace 时），否则导出到 archive_dir 并删除。
+    混合周期的分区：把其中的 1m 行导出到 archive_dir 后删除，分区本身保留；已没有 1m 行时跳过。
+    其余周期不受影响。
+
+    Returns:
+        处理过的分区名列表
+    """
+    retention_days = retention_days or getattr(settings, 'KLINES_1M_RETENTION_DAYS', DEFAULT_1M_RETENTION_DAYS)
+    archive_dir = archive_dir or getattr(settings, 'KLINES_ARCHIVE_DIR', None)
+    tablespace = tablespace or getattr(settings, 'KLINES_COLD_TABLESPACE', None)
+    cutoff = timezone.now() - timedelta(days=retention_days)
+
+    archived = []
+    for partition in list_partitions():
+        if not partition.is_leaf or partition.range_end is None or partition.range_end > cutoff:
+            continue
+        if partition.intervals is not None and ARCHIVE_INTERVAL not in partition.intervals:
+            continue  # 更粗周期的分区永久保留
+        if not partition.only_archive_interval and not _has_archive_rows(partition):
+            continue  # 混合分区的 1m 行已在之前的运行中归档
+
+        if partition.only_archive_interval and tablespace:
+            action = f"DETACH 并移到表空间 {tablespace}"
+        elif archive_dir:
+            action = f"导出到 {archive_dir}"
+        else:
+            logger.warning(f"{partition.name} 已超过保留期，但未配置 KLINES_ARCHIVE_DIR 或 KLINES_COLD_TABLESPACE，跳过")
+            continue
+
+        logger.info(f"归档分区 {partition.name} ({partition.range_start} ~ {partition.range_end}): {action}")
+        archived.append(partition.name)
+        if dry_run:
+            continue
+
+        name = connection.ops.quote_name(partition.name)
+        parent = connection.ops.quote_name(partition.parent)
+        with transaction.atomic(), connection.cursor() as cursor:
+            if partition.only_archive_interval:
+                cursor.execute(f"ALTER TABLE {parent} DETACH PARTITION {name}")
+                if tablespace:
+                    cursor.execute(f"ALTER TABLE {name} SET TABLESPACE {connection.ops.quote_name(tablespace)}")
+                else:
+                    _copy_to_gzip(cursor, f"SELECT * FROM {name}", _archive_path(archive_dir, partition.name))
+                    cursor.execute(f"DROP TABLE {name}")
+            else:
+                _copy_to_gzip(
+                    cursor,
+                    f"SELECT * FROM {name} WHERE \"interval\" = '{ARCHIVE_INTERVAL}'",
+                    _archive_path(archive_dir, f"{partition.name}_{ARCHIVE_INTERVAL}"),
+                )
+                cursor.execute(f"DELETE FROM {name} WHERE \"interval\" = %s", [ARCHIVE_INTERVAL])
+    return archived
+
+
+def ensure_brin_indexes(dry_run: bool = False) -> List[str]:
+    """
+    给已结束的历史分区在 open_time 上建 BRIN 索引
+
+    历史分区不再写入，数据按 open_time 物理有序，BRIN 索引只有几个数据页大小。
+
+    Returns:
+        新建的索引名列表
+    """
+    now = timezone.now()
+    created = []
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT indexname FROM pg_indexes WHERE indexname LIKE %s", ['%_open_time_brin'])
+        existing = {row[0] for row in cursor.fetchall()}
+
+    for partition in list_partitions():
+        if not partition.is_leaf or partition.range_end is None or partition.range_end > now:
+            continue
+        # 索引名不超过 Postgres 的 63 字节限制
+        index_name = f"{partition.name[:47]}_open_time_brin"
+        if index_name in existing:
+            continue
+        logger.info(f"创建BRIN索引 {index_name}")
+        created.append(index_name)
+        if dry_run:
+            continue
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"CREATE INDEX IF NOT EXISTS {connection.ops.quote_name(index_name)} "
+                f"ON {connection.ops.quote_name(partition.name)} USING brin (open_time)"
+            )
+    return created
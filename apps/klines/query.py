@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+K线读取。
+
+按 open_time 做 keyset 分页，时间范围作为常量条件传给Postgres，可以利用
+(market_identifier, interval, open_time) 索引并只扫描相关分区。
+请求的点数少于范围内的K线数量时，在数据库中按等宽时间桶降采样（保留OHLC语义），
+结果以列数组返回，避免每根K线重复字段名。
+
+只依赖原生SQL，不导入模型，读取走只读副本。
+"""
+
+import math
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from django.db import connections
+
+# 周期 -> 秒；月及以上周期长度不固定，不参与降采样
+INTERVAL_SECONDS = {
+    '1m': 60,
+    '30m': 30 * 60,
+    '1h': 60 * 60,
+    '1d': 24 * 60 * 60,
+    '1w': 7 * 24 * 60 * 60,
+}
+QUERY_INTERVALS = list(INTERVAL_SECONDS) + ['1mo', '3mo', '12mo']
+
+DEFAULT_LIMIT = 500
+MAX_LIMIT = 2000
+MAX_POINTS = 2000
+READ_DATABASE = 'slave_replica'
+
+COLUMNS = ['t', 'o', 'h', 'l', 'c', 'v', 'qv']
+
+PAGE_SQL = """
+SELECT (extract(epoch FROM open_time) * 1000)::bigint,
+       open_price, high_price, low_price, close_price, volume, quote_volume
+FROM klines
+WHERE market_identifier = %(market)s AND "interval" = %(interval)s
+  AND open_time >= %(start)s AND open_time < %(end)s{after}
+ORDER BY open_time
+LIMIT %(limit)s
+"""
+
+# 只需要知道是否超过目标点数，数到 points + 1 即停止
+COUNT_SQL = """
+SELECT count(*) FROM (
+    SELECT 1
+    FROM klines
+    WHERE market_identifier = %(market)s AND "interval" = %(interval)s
+      AND open_time >= %(start)s AND open_time < %(end)s
+    LIMIT %(count_limit)s
+) t
+"""
+
+# 桶起点对齐到 start，开盘价取桶内第一根，收盘价取最后一根
+DOWNSAMPLE_SQL = """
+SELECT (extract(epoch FROM %(start)s::timestamptz) * 1000)::bigint
+           + floor(extract(epoch FROM open_time - %(start)s::timestamptz) / %(width)s)::bigint * %(width)s * 1000,
+       (array_agg(open_price ORDER BY open_time))[1],
+       max(high_price),
+       min(low_price),
+       (array_agg(close_price ORDER BY open_time DESC))[1],
+       sum(volume),
+       sum(quote_volume)
+FROM klines
+WHERE market_identifier = %(market)s AND "interval" = %(interval)s
+  AND open_time >= %(start)s AND open_time < %(end)s
+GROUP BY 1
+ORDER BY 1
+"""
+
+
+def _to_float(value) -> Optional[float]:
+    return float(value) if value is not None else None
+
+
+def _as_columns(rows: List[tuple]) -> Dict[str, List]:
+    columns = {name: [] for name in COLUMNS}
+    for row in rows:
+        columns['t'].append(row[0])
+        for name, value in zip(COLUMNS[1:], row[1:]):
+            columns[name].append(_to_float(value))
+    return columns
+
+
+def bucket_width(start: datetime, end: datetime, points: int, interval_seconds: int) -> int:
+    """降采样桶宽（秒）：取周期的整数倍，保证每个桶包含完整的K线，且桶数不超过 points"""
+    span = (end - start).total_seconds()
+    return max(1, math.ceil(span / points / interval_seconds)) * interval_seconds
+
+
+def cursor_to_datetime(cursor: int) -> datetime:
+    return datetime.fromtimestamp(cursor / 1000, tz=timezone.utc)
+
+
+def split_page(rows: List[tuple], limit: int):
+    """
+    按 limit + 1 条查询结果切出一页
+
+    Returns:
+        (本页K线, next_cursor)；next_cursor 为本页最后一根K线的开盘时间，没有下一页时为None
+    """
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    return rows, rows[-1][0] if has_more and rows else None
+
+
+def query_klines(market_identifier: str, interval: str, start: datetime, end: datetime,
+                 limit: int = DEFAULT_LIMIT, cursor: Optional[int] = None,
+                 points: Optional[int] = None) -> Dict[str, Any]:
+    """
+    读取K线
+
+    Args:
+        market_identifier: 市场标识符
+        interval: K线周期
+        start: 起始时间（含）
+        end: 结束时间（不含）
+        limit: 每页条数，不降采样时生效
+        cursor: 上一页返回的 next_cursor（最后一根K线的开盘时间，毫秒）
+        points: 目标点数，范围内K线多于该值时降采样，降采样结果不分页
+
+    Returns:
+        {'columns': [...], 't': [...], 'o': [...], ..., 'next_cursor': int|None, 'bucket_seconds': int}
+    """
+    limit = max(1, min(limit, MAX_LIMIT))
+    params = {'market': market_identifier, 'interval': interval, 'start': start, 'end': end}
+    bucket_seconds = INTERVAL_SECONDS.get(interval)
+
+    with connections[READ_DATABASE].cursor() as db:
+        if points and bucket_seconds:
+            points = max(1, min(points, MAX_POINTS))
+            db.execute(COUNT_SQL, {**params, 'count_limit': points + 1})
+            total = db.fetchone()[0]
+            if total > points:
+                width = bucket_width(start, end, points, bucket_seconds)
+                db.execute(DOWNSAMPLE_SQL, {**params, 'width': width})
+                return {
+                    'columns': COLUMNS,
+                    **_as_columns(db.fetchall()),
+                    'next_cursor': None,
+                    'bucket_seconds': width,
+                }
+
+        # 多取一条判断是否还有下一页；cursor 对应的K线已在上一页返回，用 > 排除
+        if cursor is not None:
+            sql = PAGE_SQL.format(after='\n  AND open_time > %(after)s')
+            params['after'] = cursor_to_datetime(cursor)
+        else:
+            sql = PAGE_SQL.format(after='')
+        db.execute(sql, {**params, 'limit': limit + 1})
+        rows = db.fetchall()
+
+    rows, next_cursor = split_page(rows, limit)
+    return {
+        'columns': COLUMNS,
+        **_as_columns(rows),
+        'next_cursor': next_cursor,
+        'bucket_seconds': bucket_seconds,
+    }
@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+K线聚合。
+
+交易所只采集最细粒度的 1m K线，更粗的周期在Postgres中逐级聚合：
+1m -> 30m -> 1h -> 1d -> 1w / 1mo -> 3mo / 12mo。
+每次写入基础K线后只重算受影响时间范围内的桶，聚合结果用
+INSERT ... ON CONFLICT 覆盖，所以各周期之间始终一致，重复执行也是幂等的。
+
+基础K线只从覆盖起点（该市场最早采集的 1m K线）开始连续，起点之前开始的桶只有部分数据，
+聚合出的开盘价、最高/最低价和成交量都不完整，所以每个周期只聚合起点之后的完整桶。
+"""
+
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple, Union
+
+from dateutil.relativedelta import relativedelta
+from django.db import connection, transaction
+
+from common.helpers import getLogger
+
+logger = getLogger(__name__)
+
+BASE_INTERVAL = '1m'
+
+
+def _epoch_bucket(seconds: int) -> str:
+    return f"to_timestamp(floor(extract(epoch FROM open_time) / {seconds}) * {seconds})"
+
+
+def _trunc_bucket(field: str) -> str:
+    return f"date_trunc('{field}', open_time AT TIME ZONE 'UTC') AT TIME ZONE 'UTC'"
+
+
+@dataclass(frozen=True)
+class RollupSpec:
+    interval: str
+    source: str
+    step: Union[timedelta, relativedelta]
+    pg_step: str  # Postgres interval 字面量
+    bucket_sql: str  # 计算桶起点的SQL表达式
+
+    def floor(self, dt: datetime) -> datetime:
+        """dt 所在桶的起点（UTC）"""
+        dt = dt.astimezone(timezone.utc)
+        if isinstance(self.step, timedelta):
+            seconds = int(self.step.total_seconds())
+            return datetime.fromtimestamp(int(dt.timestamp()) // seconds * seconds, tz=timezone.utc)
+        day = dt.replace(hour=0, minute=0, second=0, microsecond=0)
+        if self.interval == '1d':
+            return day
+        if self.interval == '1w':
+            return day - timedelta(days=day.weekday())
+        month = day.replace(day=1)
+        if self.interval == '3mo':
+            return month.replace(month=(month.month - 1) // 3 * 3 + 1)
+        if self.interval == '12mo':
+            return month.replace(month=1)
+        return month
+
+    def ceil(self, dt: datetime) -> datetime:
+        """dt 之后（含）第一个桶边界"""
+        start = self.floor(dt)
+        return start if start == dt.astimezone(timezone.utc) else start + self.step
+
+
+# 按依赖顺序排列，每一级的来源周期都在它之前完成聚合
+ROLLUP_SPECS: List[RollupSpec] = [
+    RollupSpec('30m', '1m', timedelta(minutes=30), '30 minutes', _epoch_bucket(1800)),
+    RollupSpec('1h', '30m', timedelta(hours=1), '1 hour', _epoch_bucket(3600)),
+    RollupSpec('1d', '1h', relativedelta(days=1), '1 day', _trunc_bucket('day')),
+    RollupSpec('1w', '1d', relativedelta(weeks=1), '7 days', _trunc_bucket('week')),
+    RollupSpec('1mo', '1d', relativedelta(months=1), '1 month', _trunc_bucket('month')),
+    RollupSpec('3mo', '1mo', relativedelta(months=3), '3 months', _trunc_bucket('quarter')),
+    RollupSpec('12mo', '1mo', relativedelta(years=1), '1 year', _trunc_bucket('year')),
+]
+ROLLUP_INTERVALS = [spec.interval for spec in ROLLUP_SPECS]
+
+# 开盘价取桶内第一根，收盘价取最后一根；桶已结束且所有来源K线都是最终值时聚合结果才是最终值
+ROLLUP_SQL = """
+INSERT INTO klines (market_identifier, "interval", open_time, open_price, high_price, low_price, close_price,
+                    volume, quote_volume, trade_count, is_final, created_at, updated_at)
+SELECT market_identifier, %(interval)s, bucket,
+       (array_agg(open_price ORDER BY open_time))[1],
+       max(high_price),
+       min(low_price),
+       (array_agg(close_price ORDER BY open_time DESC))[1],
+       sum(volume),
+       sum(quote_volume),
+       sum(trade_count)::integer,
+       bool_and(is_final) AND bucket + INTERVAL '{pg_step}' <= now(),
+       now(), now()
+FROM (
+    SELECT *, {bucket_sql} AS bucket
+    FROM klines
+    WHERE market_identifier = %(market)s AND "interval" = %(source)s
+      AND open_time >= %(start)s AND open_time < %(end)s
+) src
+GROUP BY market_identifier, bucket
+ON CONFLICT (market_identifier, "interval", open_time) DO UPDATE SET
+    open_price = EXCLUDED.open_price,
+    high_price = EXCLUDED.high_price,
+    low_price = EXCLUDED.low_price,
+    close_price = EXCLUDED.close_price,
+    volume = EXCLUDED.volume,
+    quote_volume = EXCLUDED.quote_volume,
+    trade_count = EXCLUDED.trade_count,
+    is_final = EXCLUDED.is_final,
+    updated_at = EXCLUDED.updated_at
+WHERE (klines.open_price, klines.high_price, klines.low_price, klines.close_price,
+       klines.volume, klines.quote_volume, klines.is_final)
+      IS DISTINCT FROM
+      (EXCLUDED.open_price, EXCLUDED.high_price, EXCLUDED.low_price, EXCLUDED.close_price,
+       EXCLUDED.volume, EXCLUDED.quote_volume, EXCLUDED.is_final)
+"""
+
+
+def rollup_ranges(start: datetime, end: datetime,
+                  coverage_start: Optional[datetime] = None) -> List[Tuple[RollupSpec, datetime, datetime]]:
+    """
+    计算每个聚合周期需要重算的桶范围 [bucket_start, bucket_end)
+
+    范围扩展到目标周期的完整桶；coverage_start 之前开始的桶数据不完整，跳过。
+    各周期的边界层层嵌套，某一级跳过的桶，依赖它的更粗周期也会跳过。
+    """
+    ranges = []
+    for spec in ROLLUP_SPECS:
+        bucket_start, bucket_end = spec.floor(start), spec.ceil(end)
+        if coverage_start is not None:
+            bucket_start = max(bucket_start, spec.ceil(coverage_start))
+        if bucket_start < bucket_end:
+            ranges.append((spec, bucket_start, bucket_end))
+    return ranges
+
+
+def rollup_klines(market_identifier: str, start: datetime, end: datetime,
+                  coverage_start: Optional[datetime] = None) -> Dict[str, int]:
+    """
+    根据 [start, end) 内的基础K线重算各聚合周期。
+
+    Args:
+        market_identifier: 市场标识符
+        start: 本次写入的第一根基础K线开盘时间
+        end: 本次写入的最后一根基础K线结束时间
+        coverage_start: 基础K线连续覆盖的起点，之前开始的桶不聚合；None 表示不限制
+
+    Returns:
+        {周期: 插入或更新的行数}
+    """
+    result = {}
+    with transaction.atomic(), connection.cursor() as cursor:
+        for spec, bucket_start, bucket_end in rollup_ranges(start, end, coverage_start):
+            cursor.execute(
+                ROLLUP_SQL.format(pg_step=spec.pg_step, bucket_sql=spec.bucket_sql),
+                {
+                    'interval': spec.interval,
+                    'source': spec.source,
+                    'market': market_identifier,
+                    'start': bucket_start,
+                    'end': bucket_end,
+                },
+            )
+            result[spec.interval] = cursor.rowcount
+    logger.debug(f"{market_identifier} K线聚合 {start} ~ {end}: {result}")
+    return result
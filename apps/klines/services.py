@@ -1,7 +1,7 @@
 import time
 import asyncio
 from typing import Dict, List, Optional, Any, Tuple
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from decimal import Decimal
 
 from django.conf import settings
@@ -11,11 +11,21 @@ from asgiref.sync import sync_to_async
 from common.helpers import getLogger
 from apps.exchange.ccxt_client import get_client
 from apps.klines.models import Kline, KlineProcessingLog
+from apps.klines.rollup import BASE_INTERVAL, ROLLUP_INTERVALS, rollup_klines
+from apps.klines.watermark import watermark_store
 from apps.exchange.models import Market
 
 logger = getLogger(__name__)
 
-# 支持的K线时间周期
+# 单次 fetch_ohlcv 请求的条数
+FETCH_PAGE_LIMIT = 1000
+# 每次更新最多请求的页数，水位落后较多时分多次运行补齐（默认 50 页约 35 天的 1m K线）
+MAX_PAGES_PER_RUN = getattr(settings, 'KLINES_MAX_PAGES_PER_RUN', 50)
+# 重复写入同一根K线时覆盖的字段
+KLINE_UPDATE_FIELDS = ['open_price', 'high_price', 'low_price', 'close_price',
+                       'volume', 'quote_volume', 'trade_count', 'is_final', 'updated_at']
+
+# 支持的K线时间周期（只有 BASE_INTERVAL 从交易所采集，其余由 rollup 聚合）
 TIMEFRAMES = {
     '1m': '1min',
     '30m': '30m',
@@ -87,16 +97,51 @@ class KlineService:
                         exc_info=True)
             raise
     
+    async def fetch_base_klines(self, symbol: str, since: int, max_pages: Optional[int] = None) -> List[List]:
+        """
+        分页获取 since 之后的基础周期K线，最多 max_pages 页
+
+        Args:
+            symbol: 交易对符号
+            since: 起始时间戳（毫秒）
+            max_pages: 最多请求的页数，默认 MAX_PAGES_PER_RUN；剩余部分由下次运行从水位继续
+
+        Returns:
+            K线数据列表，按时间升序
+        """
+        max_pages = max_pages or MAX_PAGES_PER_RUN
+        if not self._initialized:
+            await self.initialize()
+        if BASE_INTERVAL not in self.client.timeframes:
+            raise ValueError(f"{self.exchange_id} 不支持 {BASE_INTERVAL} K线，无法聚合")
+
+        result = []
+        for _ in range(max_pages):
+            page = await self.client.fetch_ohlcv(symbol, BASE_INTERVAL, since=since, limit=FETCH_PAGE_LIMIT)
+            page = [k for k in page if k[0] >= since]
+            if not page:
+                break
+            result.extend(page)
+            since = page[-1][0] + 1
+            if len(page) < FETCH_PAGE_LIMIT:
+                break
+        else:
+            logger.info(f"{self.exchange_id} {symbol} 达到单次 {max_pages} 页上限，剩余K线下次继续采集")
+        logger.info(f"Fetched {len(result)} {BASE_INTERVAL} klines for {self.exchange_id} {symbol}")
+        return result
+
     async def save_klines_to_db(self, market_identifier: str, 
                               interval: str, 
-                              kline_data: List[List]) -> int:
+                              kline_data: List[List],
+                              now: Optional[datetime] = None) -> int:
         """
-        将K线数据保存到数据库
+        将K线数据保存到数据库，已存在的K线会被覆盖
         
         Args:
             market_identifier: 市场标识符
             interval: 时间周期
             kline_data: K线数据列表 [[timestamp, open, high, low, close, volume], ...]
+            now: 判断K线是否已收盘的时间，默认当前时间
             
         Returns:
             保存的记录数
@@ -104,36 +149,18 @@ class KlineService:
         if not kline_data:
             logger.warning(f"No kline data to save for {market_identifier} {interval}")
             return 0
+        now = now or datetime.now(tz=timezone.utc)
             
         @sync_to_async
-        def get_market():
-            try:
-                return Market.objects.get(market_identifier=market_identifier)
-            except Market.DoesNotExist:
-                logger.error(f"Market {market_identifier} not found")
-                return None
-                
-        @sync_to_async
-        def bulk_create_klines(klines):
+        def upsert_klines(klines):
+            # 未收盘的K线下次采集会再次写入，需要覆盖而不是跳过
             with transaction.atomic():
-                created = 0
-                for kline in klines:
-                    # 使用获取或创建逻辑，避免重复
-                    try:
-                        # open_time是唯一索引的一部分，所以我们可以先检查是否存在
-                        Kline.objects.get(
-                            market_id=kline.market_id, 
-                            interval=kline.interval, 
-                            open_time=kline.open_time
-                        )
-                    except Kline.DoesNotExist:
-                        kline.save()
-                        created += 1
-                return created
-        
-        market = await get_market()
-        if not market:
-            return 0
+                return len(Kline.objects.bulk_create(
+                    klines,
+                    update_conflicts=True,
+                    unique_fields=['market', 'interval', 'open_time'],
+                    update_fields=KLINE_UPDATE_FIELDS,
+                ))
             
         klines_to_create = []
         
@@ -143,11 +170,11 @@ class KlineService:
             trade_count = k[7] if len(k) > 7 else None
             
             # 转换时间戳为datetime
-            open_time = datetime.fromtimestamp(timestamp / 1000)
+            open_time = datetime.fromtimestamp(timestamp / 1000, tz=timezone.utc)
             
             klines_to_create.append(
                 Kline(
-                    market=market,
+                    market_id=market_identifier,
                     interval=interval,
                     open_time=open_time,
                     open_price=Decimal(str(open_price)),
@@ -157,7 +184,7 @@ class KlineService:
                     volume=Decimal(str(volume)),
                     quote_volume=Decimal(str(quote_volume)) if quote_volume else None,
                     trade_count=trade_count,
-                    is_final=True  # 假设所有历史数据都是最终的
+                    is_final=watermark_store.is_final(timestamp, interval, now),
                 )
             )
             
@@ -167,9 +194,9 @@ class KlineService:
         
         for i in range(0, len(klines_to_create), batch_size):
             batch = klines_to_create[i:i + batch_size]
-            saved_count += await bulk_create_klines(batch)
+            saved_count += await upsert_klines(batch)
             
-        logger.info(f"Saved {saved_count} new klines for {market_identifier} {interval}")
+        logger.info(f"Saved {saved_count} klines for {market_identifier} {interval}")
         return saved_count
     
     async def update_klines(self, market_identifier: str, 
@@ -179,10 +206,13 @@ class KlineService:
         """
         更新K线数据
         
+        无论请求哪个周期，都只从交易所获取 BASE_INTERVAL K线，
+        然后聚合出 ROLLUP_INTERVALS 中的全部周期。
+        
         Args:
             market_identifier: 市场标识符
-            interval: 时间周期
-            days_back: 获取多少天前的数据
+            interval: 时间周期，仅用于处理日志
+            days_back: 没有水位时回溯的天数（按 1m 采集，30天约 43200 根K线）
             create_log: 是否创建处理日志
             
         Returns:
@@ -225,37 +255,58 @@ class KlineService:
         exchange_id = market_info['exchange_id']
         symbol = market_info['symbol']
         
-        # 重新初始化服务，确保使用正确的交易所
-        self.exchange_id = exchange_id
-        self.client = None
-        self._initialized = False
+        # 只有交易所变化时才重建客户端，同一交易所的多个市场复用已加载的市场信息
+        if self.exchange_id != exchange_id:
+            await self.close()
+            self.exchange_id = exchange_id
+            self.client = None
+        
+        if interval != BASE_INTERVAL and interval not in ROLLUP_INTERVALS:
+            logger.error(f"不支持的K线周期: {interval}")
+            return 0, "failed"
+        
+        # 计算开始和结束时间
+        end_time = datetime.now(tz=timezone.utc)
+        start_time = end_time - timedelta(days=days_back)
         
         try:
             await self.initialize()
             
-            # 计算开始和结束时间
-            end_time = datetime.now()
-            start_time = end_time - timedelta(days=days_back)
-            
             # 创建处理日志（状态：处理中）
             await create_processing_log(
                 exchange_id, symbol, interval, 
                 'processing', start_time, end_time
             )
             
-            # 转换为毫秒时间戳
-            since = int(start_time.timestamp() * 1000)
-            
-            # 获取K线数据
-            kline_data = await self.fetch_klines(
-                symbol, interval, since=since
+            # 从水位之后开始采集，没有水位时回溯 days_back 天
+            since = await sync_to_async(watermark_store.next_since)(
+                market_identifier, BASE_INTERVAL, int(start_time.timestamp() * 1000)
             )
             
-            # 保存K线数据
+            # 只采集基础周期，其余周期由基础K线聚合
+            kline_data = await self.fetch_base_klines(symbol, since)
+            
+            # 保存K线数据，未收盘的K线标记为 is_final=False
+            now = datetime.now(tz=timezone.utc)
             records_count = await self.save_klines_to_db(
-                market_identifier, interval, kline_data
+                market_identifier, BASE_INTERVAL, kline_data, now=now
             )
             
+            # 基础K线提交后增量聚合受影响的时间范围，首次采集时覆盖起点就是本次的第一根K线
+            if kline_data:
+                coverage_start = await sync_to_async(watermark_store.coverage_start)(market_identifier, BASE_INTERVAL)
+                await sync_to_async(rollup_klines)(
+                    market_identifier,
+                    datetime.fromtimestamp(kline_data[0][0] / 1000, tz=timezone.utc),
+                    datetime.fromtimestamp(kline_data[-1][0] / 1000, tz=timezone.utc) + timedelta(minutes=1),
+                    datetime.fromtimestamp(coverage_start / 1000, tz=timezone.utc) if coverage_start else None,
+                )
+            
+            # 聚合成功后水位才推进到最后一根已收盘的K线，未收盘的K线下次会重新采集并覆盖
+            final_times = [k[0] for k in kline_data if watermark_store.is_final(k[0], BASE_INTERVAL, now)]
+            if final_times:
+                await sync_to_async(watermark_store.set)(market_identifier, BASE_INTERVAL, final_times[-1])
+            
             # 更新处理日志（状态：已完成）
             await create_processing_log(
                 exchange_id, symbol, interval, 
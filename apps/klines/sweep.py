@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+K线全量更新的分片调度。
+
+市场按交易所分组并切成固定大小的批次，每个批次在一个worker里用同一个事件循环、
+同一个CCXT客户端以有限并发处理（客户端自带的 enableRateLimit 节流对整个批次生效）。
+同一交易所的批次串行执行，不同交易所并行，所以任何时刻每个交易所最多只有一个客户端在请求。
+每处理完一个市场就记录检查点，任务重试时跳过已完成的市场。
+"""
+
+import asyncio
+import time
+import uuid
+from typing import Dict, List, Optional
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from apps.klines.services import KlineService
+from common.helpers import getLogger
+from common.redis_client import local_redis
+
+logger = getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 200
+# 批次内同时处理的市场数，共用一个客户端，实际请求速率仍受 rateLimit 约束
+DEFAULT_BATCH_CONCURRENCY = 4
+# 检查点保留时间（秒）
+SWEEP_TTL = 24 * 3600
+
+
+def batch_markets(markets: List[Dict], batch_size: Optional[int] = None) -> Dict[str, List[List[str]]]:
+    """
+    把市场按交易所分组并切分批次
+
+    Args:
+        markets: [{'market_identifier': ..., 'exchange__slug': ...}, ...]
+        batch_size: 每批市场数量
+
+    Returns:
+        {交易所: [[market_identifier, ...], ...]}
+    """
+    batch_size = batch_size or getattr(settings, 'KLINES_BATCH_SIZE', DEFAULT_BATCH_SIZE)
+    grouped: Dict[str, List[str]] = {}
+    for market in markets:
+        grouped.setdefault(market['exchange__slug'], []).append(market['market_identifier'])
+    return {
+        exchange: [identifiers[i:i + batch_size] for i in range(0, len(identifiers), batch_size)]
+        for exchange, identifiers in grouped.items()
+    }
+
+
+class SweepCheckpoint:
+    """一次全量更新的进度，保存在Redis中"""
+
+    def __init__(self, sweep_id: Optional[str] = None):
+        self.sweep_id = sweep_id or f"{int(time.time())}-{uuid.uuid4().hex[:8]}"
+        self.done_key = f"klines:sweep:{self.sweep_id}:done"
+        self.stats_key = f"klines:sweep:{self.sweep_id}"
+
+    def start(self, total_markets: int, total_batches: int) -> None:
+        pipe = local_redis().pipeline()
+        pipe.hset(self.stats_key, mapping={
+            'started_at': time.time(),
+            'total_markets': total_markets,
+            'total_batches': total_batches,
+            'done_markets': 0,
+            'failed_markets': 0,
+            'done_batches': 0,
+        })
+        pipe.expire(self.stats_key, SWEEP_TTL)
+        pipe.execute()
+
+    def pending(self, market_identifiers: List[str]) -> List[str]:
+        """过滤掉本轮已完成的市场"""
+        if not market_identifiers:
+            return []
+        flags = local_redis().smismember(self.done_key, market_identifiers)
+        return [m for m, done in zip(market_identifiers, flags) if not done]
+
+    def mark_market(self, market_identifier: str, success: bool) -> None:
+        pipe = local_redis().pipeline()
+        if success:
+            pipe.sadd(self.done_key, market_identifier)
+            pipe.expire(self.done_key, SWEEP_TTL)
+            pipe.hincrby(self.stats_key, 'done_markets', 1)
+        else:
+            pipe.hincrby(self.stats_key, 'failed_markets', 1)
+        pipe.execute()
+
+    def mark_batch(self) -> None:
+        local_redis().hincrby(self.stats_key, 'done_batches', 1)
+
+    def progress(self) -> Dict[str, float]:
+        raw = local_redis().hgetall(self.stats_key)
+        return {
+            (k.decode() if isinstance(k, bytes) else k): float(v)
+            for k, v in raw.items()
+        }
+
+
+async def run_batch(exchange_id: str, market_identifiers: List[str], interval: str, days_back: int,
+                    checkpoint: SweepCheckpoint, concurrency: Optional[int] = None) -> Dict[str, int]:
+    """
+    在当前事件循环中处理一个批次
+
+    Returns:
+        {'markets': 处理的市场数, 'records': 保存的K线数, 'failed': 失败的市场数}
+    """
+    concurrency = concurrency or getattr(settings, 'KLINES_BATCH_CONCURRENCY', DEFAULT_BATCH_CONCURRENCY)
+    service = KlineService(exchange_id)
+    semaphore = asyncio.Semaphore(concurrency)
+    result = {'markets': 0, 'records': 0, 'failed': 0}
+
+    async def process(market_identifier: str):
+        async with semaphore:
+            records, status = await service.update_klines(market_identifier, interval, days_back)
+        success = status == "completed"
+        await sync_to_async(checkpoint.mark_market)(market_identifier, success)
+        result['markets'] += 1
+        result['records'] += records
+        result['failed'] += 0 if success else 1
+
+    try:
+        pending = await sync_to_async(checkpoint.pending)(market_identifiers)
+        if len(pending) < len(market_identifiers):
+            logger.info(f"{exchange_id} 批次跳过 {len(market_identifiers) - len(pending)} 个已完成的市场")
+        await service.initialize()
+        # 单个市场抛出异常不能中断整个批次，计为失败的市场
+        outcomes = await asyncio.gather(*(process(m) for m in pending), return_exceptions=True)
+        for market_identifier, outcome in zip(pending, outcomes):
+            if isinstance(outcome, Exception):
+                logger.error(f"{exchange_id} {market_identifier} K线更新出错: {outcome}")
+                result['markets'] += 1
+                result['failed'] += 1
+                try:
+                    await sync_to_async(checkpoint.mark_market)(market_identifier, False)
+                except Exception as e:
+                    logger.warning(f"记录 {market_identifier} 检查点失败: {e}")
+    finally:
+        await service.close()
+    await sync_to_async(checkpoint.mark_batch)()
+    return result
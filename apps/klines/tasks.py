@@ -1,6 +1,6 @@
 import asyncio
-from celery import shared_task
-from typing import Optional
+from celery import chain, shared_task
+from typing import List, Optional
 
 from common.helpers import getLogger
 from apps.exchange.models import Market
@@ -17,7 +17,9 @@ def update_market_klines(market_identifier: str, interval: str = '1d', days_back
     Args:
         market_identifier: 市场标识符
         interval: K线时间周期
-        days_back: 获取多少天前的数据
+        days_back: 没有水位时（首次采集）回溯的天数。所有周期都由 1m K线聚合，
+                   回溯30天约为每个市场 43200 根 1m K线、44 次 fetch_ohlcv 请求；
+                   单次最多请求 KLINES_MAX_PAGES_PER_RUN 页，水位落后更多时分多次补齐
     
     Returns:
         任务执行状态
@@ -55,6 +57,48 @@ def update_market_klines(market_identifier: str, interval: str = '1d', days_back
             loop.close()
 
 
+@shared_task(name="update_kline_batch")
+def update_kline_batch(exchange_id: str, market_identifiers: List[str], interval: str = '1d',
+                       days_back: int = 30, sweep_id: Optional[str] = None):
+    """
+    在一个事件循环、一个客户端内更新同一交易所的一批市场
+
+    Args:
+        exchange_id: 交易所ID
+        market_identifiers: 市场标识符列表
+        interval: K线时间周期
+        days_back: 没有水位时（首次采集）回溯的天数，见 update_market_klines
+        sweep_id: 所属的全量更新ID，用于检查点
+
+    Returns:
+        任务执行状态
+    """
+    from apps.klines.sweep import SweepCheckpoint, run_batch
+
+    loop = None
+    try:
+        logger.info(f"启动K线批次: {exchange_id} {len(market_identifiers)} 个市场")
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        result = loop.run_until_complete(
+            run_batch(exchange_id, market_identifiers, interval, days_back, SweepCheckpoint(sweep_id))
+        )
+        return {"status": "completed", "exchange": exchange_id, "sweep_id": sweep_id, **result}
+
+    except Exception as e:
+        # 返回而不是抛出，避免中断同一交易所后续批次的链
+        logger.error(f"K线批次 {exchange_id} 出错: {e}", exc_info=True)
+        return {
+            "status": "error",
+            "exchange": exchange_id,
+            "sweep_id": sweep_id,
+            "message": str(e)
+        }
+    finally:
+        if loop and not loop.is_closed():
+            loop.close()
+
+
 @shared_task(name="update_all_market_klines")
 def update_all_market_klines(exchange_id: Optional[str] = None,
                            symbol_filter: Optional[str] = None,
@@ -64,17 +108,20 @@ def update_all_market_klines(exchange_id: Optional[str] = None,
     """
     更新所有或指定交易所/交易对的K线数据
     
+    市场按交易所分批，同一交易所的批次用 chain 串行执行，不同交易所之间并行。
+    
     Args:
         exchange_id: 可选，限定交易所ID
         symbol_filter: 可选，限定交易对（可以是部分匹配）
         interval: K线时间周期
-        days_back: 获取多少天前的数据
+        days_back: 没有水位时（首次采集）回溯的天数，见 update_market_klines
         limit: 限制处理的市场数量
     
     Returns:
         任务执行状态汇总
     """
     from django.db.models import Q
+    from apps.klines.sweep import SweepCheckpoint, batch_markets
     
     try:
         # 构建查询条件
@@ -87,27 +134,34 @@ def update_all_market_klines(exchange_id: Optional[str] = None,
             query &= Q(market_symbol__icontains=symbol_filter)
         
         # 获取需要更新的市场
-        markets = Market.objects.filter(query)
+        markets = Market.objects.filter(query).order_by('exchange__slug', 'market_identifier')
         
         if limit:
             markets = markets[:limit]
             
-        market_count = markets.count()
-        logger.info(f"找到 {market_count} 个符合条件的市场，准备更新K线数据")
+        batches = batch_markets(list(markets.values('market_identifier', 'exchange__slug')))
+        market_count = sum(len(batch) for exchange_batches in batches.values() for batch in exchange_batches)
+        batch_count = sum(len(exchange_batches) for exchange_batches in batches.values())
+        
+        checkpoint = SweepCheckpoint()
+        checkpoint.start(market_count, batch_count)
+        logger.info(f"K线全量更新 {checkpoint.sweep_id}: {market_count} 个市场，"
+                    f"{len(batches)} 个交易所，{batch_count} 个批次")
         
-        # 为每个市场创建更新任务
         tasks = []
-        for market in markets:
-            task = update_market_klines.delay(
-                market.market_identifier,
-                interval=interval,
-                days_back=days_back
-            )
-            tasks.append(task.id)
+        for exchange, exchange_batches in batches.items():
+            result = chain(*(
+                update_kline_batch.si(exchange, batch, interval=interval, days_back=days_back,
+                                      sweep_id=checkpoint.sweep_id)
+                for batch in exchange_batches
+            )).delay()
+            tasks.append(result.id)
             
         return {
             "status": "scheduled",
+            "sweep_id": checkpoint.sweep_id,
             "markets_count": market_count,
+            "batches_count": batch_count,
             "interval": interval,
             "tasks": tasks
         }
@@ -117,4 +171,29 @@ def update_all_market_klines(exchange_id: Optional[str] = None,
         return {
             "status": "error",
             "message": str(e)
-        } 
\ No newline at end of file
+        }
+
+
+@shared_task(name="manage_klines_partitions")
+def manage_klines_partitions():
+    """
+    klines 分区生命周期维护：预建未来分区、归档过期 1m 数据、给历史分区建BRIN索引
+
+    Returns:
+        任务执行状态汇总
+    """
+    from apps.klines.partitions import archive_old_partitions, ensure_brin_indexes, ensure_future_partitions
+
+    try:
+        return {
+            "status": "completed",
+            "months": ensure_future_partitions(),
+            "archived": archive_old_partitions(),
+            "brin_indexes": ensure_brin_indexes(),
+        }
+    except Exception as e:
+        logger.error(f"维护klines分区时出错: {e}", exc_info=True)
+        return {
+            "status": "error",
+            "message": str(e)
+        }
@@ -1 +1,240 @@
-# Create your tests here.
+import gzip
+import json
+import math
+import os
+import shutil
+import tempfile
+from contextlib import nullcontext
+from datetime import datetime, timedelta, timezone
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.test import RequestFactory, SimpleTestCase
+
+from apps.klines import partitions, query
+from apps.klines.partitions import Partition, archive_old_partitions
+from apps.klines.query import bucket_width, query_klines, split_page
+from apps.klines.rollup import ROLLUP_INTERVALS, rollup_ranges
+from apps.klines.views import MAX_TIMESTAMP_MS, get_klines
+
+
+def utc(*args):
+    return datetime(*args, tzinfo=timezone.utc)
+
+
+class RollupRangesTests(SimpleTestCase):
+
+    def ranges(self, start, end, coverage_start=None):
+        return {spec.interval: (bucket_start, bucket_end)
+                for spec, bucket_start, bucket_end in rollup_ranges(start, end, coverage_start)}
+
+    def test_expands_to_whole_buckets_without_coverage_limit(self):
+        ranges = self.ranges(utc(2025, 5, 14, 10, 7), utc(2025, 5, 14, 10, 8))
+        self.assertEqual(list(ranges), ROLLUP_INTERVALS)
+        self.assertEqual(ranges['30m'], (utc(2025, 5, 14, 10, 0), utc(2025, 5, 14, 10, 30)))
+        self.assertEqual(ranges['1d'], (utc(2025, 5, 14), utc(2025, 5, 15)))
+        self.assertEqual(ranges['1w'], (utc(2025, 5, 12), utc(2025, 5, 19)))
+        self.assertEqual(ranges['3mo'], (utc(2025, 4, 1), utc(2025, 7, 1)))
+
+    def test_partial_buckets_before_coverage_start_are_skipped(self):
+        # 首次采集从 5-14 10:07 开始：当天、当周、当月及更粗周期的桶都只有部分数据
+        coverage_start = utc(2025, 5, 14, 10, 7)
+        ranges = self.ranges(coverage_start, utc(2025, 5, 14, 12, 0), coverage_start)
+        self.assertEqual(ranges['30m'], (utc(2025, 5, 14, 10, 30), utc(2025, 5, 14, 12, 0)))
+        self.assertEqual(ranges['1h'], (utc(2025, 5, 14, 11, 0), utc(2025, 5, 14, 12, 0)))
+        for interval in ('1d', '1w', '1mo', '3mo', '12mo'):
+            self.assertNotIn(interval, ranges)
+
+    def test_buckets_after_coverage_start_are_complete(self):
+        coverage_start = utc(2025, 5, 14, 10, 7)
+        ranges = self.ranges(utc(2025, 6, 2, 0, 0), utc(2025, 6, 2, 0, 1), coverage_start)
+        self.assertEqual(ranges['1d'], (utc(2025, 6, 2), utc(2025, 6, 3)))
+        # 6-2 所在周从 6-2（周一）开始，已在覆盖范围内
+        self.assertEqual(ranges['1w'], (utc(2025, 6, 2), utc(2025, 6, 9)))
+        self.assertEqual(ranges['1mo'], (utc(2025, 6, 1), utc(2025, 7, 1)))
+        # 季度、年度桶从覆盖起点之前开始，仍然跳过
+        self.assertNotIn('3mo', ranges)
+        self.assertNotIn('12mo', ranges)
+
+    def test_coverage_start_on_bucket_boundary_keeps_bucket(self):
+        coverage_start = utc(2025, 5, 1)
+        ranges = self.ranges(coverage_start, utc(2025, 5, 1, 0, 1), coverage_start)
+        self.assertEqual(ranges['1d'], (utc(2025, 5, 1), utc(2025, 5, 2)))
+        self.assertEqual(ranges['1mo'], (utc(2025, 5, 1), utc(2025, 6, 1)))
+        self.assertNotIn('3mo', ranges)
+
+
+class FakePartitionCursor:
+    """模拟一个混合周期分区：rows 为 (interval, csv行) 列表，支持 SELECT 1 / COPY / DELETE"""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.result = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, params=None):
+        if sql.startswith('SELECT 1'):
+            self.result = (1,) if any(interval == '1m' for interval, _ in self.rows) else None
+        elif sql.startswith('DELETE'):
+            self.rows[:] = [row for row in self.rows if row[0] != '1m']
+
+    def fetchone(self):
+        return self.result
+
+    def copy(self, sql):
+        lines = [b'interval,close\n'] + [line for interval, line in self.rows if interval == '1m']
+        return nullcontext(lines)
+
+
+class ArchiveOldPartitionsTests(SimpleTestCase):
+
+    def setUp(self):
+        self.archive_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.archive_dir)
+        self.rows = [('1m', b'1m,100\n'), ('1m', b'1m,101\n'), ('1h', b'1h,100\n')]
+        partition = Partition(
+            name='klines_2020_01', parent='klines', is_leaf=True,
+            range_start=utc(2020, 1, 1), range_end=utc(2020, 2, 1),
+        )
+        connection = mock.Mock()
+        connection.cursor.side_effect = lambda: FakePartitionCursor(self.rows)
+        connection.ops.quote_name.side_effect = lambda name: f'"{name}"'
+        patches = [
+            mock.patch.object(partitions, 'list_partitions', return_value=[partition]),
+            mock.patch.object(partitions, 'connection', connection),
+            mock.patch.object(partitions.transaction, 'atomic', nullcontext),
+        ]
+        for patcher in patches:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def archives(self):
+        return sorted(os.listdir(self.archive_dir))
+
+    def test_second_run_keeps_archived_rows(self):
+        self.assertEqual(archive_old_partitions(retention_days=90, archive_dir=self.archive_dir), ['klines_2020_01'])
+        self.assertEqual(self.rows, [('1h', b'1h,100\n')])
+        [archive] = self.archives()
+        with gzip.open(os.path.join(self.archive_dir, archive)) as f:
+            content = f.read()
+
+        # 1m 行已删除，第二次运行跳过该分区，不会用只有表头的文件覆盖归档
+        self.assertEqual(archive_old_partitions(retention_days=90, archive_dir=self.archive_dir), [])
+        self.assertEqual(self.archives(), [archive])
+        with gzip.open(os.path.join(self.archive_dir, archive)) as f:
+            self.assertEqual(f.read(), content)
+        self.assertEqual(content, b'interval,close\n1m,100\n1m,101\n')
+
+    def test_existing_archive_is_not_overwritten(self):
+        with mock.patch.object(partitions, '_archive_path', return_value=os.path.join(self.archive_dir, 'a.csv.gz')):
+            with gzip.open(os.path.join(self.archive_dir, 'a.csv.gz'), 'wb') as f:
+                f.write(b'earlier archive')
+            with self.assertRaises(FileExistsError):
+                archive_old_partitions(retention_days=90, archive_dir=self.archive_dir)
+        # 导出失败时不删除 1m 行
+        self.assertEqual(len(self.rows), 3)
+
+
+class FakeQueryCursor:
+    """按顺序返回预设结果，并记录执行的SQL和参数"""
+
+    def __init__(self, results):
+        self.results = list(results)
+        self.executed = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, params):
+        self.executed.append((sql, params))
+
+    def fetchone(self):
+        return self.results.pop(0)[0]
+
+    def fetchall(self):
+        return self.results.pop(0)
+
+
+def kline_row(open_time_ms, price=1):
+    return (open_time_ms, price, price, price, price, 10, 10 * price)
+
+
+class QueryKlinesTests(SimpleTestCase):
+
+    def query(self, results, **kwargs):
+        cursor = FakeQueryCursor(results)
+        with mock.patch.object(query, 'connections', {query.READ_DATABASE: mock.Mock(cursor=lambda: cursor)}):
+            data = query_klines('binance_spot_btc_usdt', kwargs.pop('interval', '1m'),
+                                utc(2025, 5, 14), utc(2025, 5, 15), **kwargs)
+        return data, cursor.executed
+
+    def test_bucket_width_is_whole_intervals(self):
+        start, end = utc(2025, 5, 14), utc(2025, 5, 15)
+        for points, interval_seconds in [(300, 60), (7, 60), (1000, 60), (5, 3600), (2000, 60)]:
+            width = bucket_width(start, end, points, interval_seconds)
+            self.assertEqual(width % interval_seconds, 0)
+            self.assertLessEqual(math.ceil(86400 / width), points)
+        self.assertEqual(bucket_width(start, end, 300, 60), 300)
+        # 目标点数多于K线数量时不会小于一个周期
+        self.assertEqual(bucket_width(start, end, 5000, 60), 60)
+
+    def test_split_page(self):
+        rows = [kline_row(1000), kline_row(2000), kline_row(3000)]
+        self.assertEqual(split_page(rows, 2), (rows[:2], 2000))
+        self.assertEqual(split_page(rows[:2], 2), (rows[:2], None))
+        self.assertEqual(split_page([], 2), ([], None))
+
+    def test_page_fetches_one_extra_row_after_cursor(self):
+        cursor_ms = int(utc(2025, 5, 14, 1).timestamp() * 1000)
+        rows = [kline_row(cursor_ms + 60000 * i) for i in range(1, 4)]
+        data, executed = self.query([rows], limit=2, cursor=cursor_ms)
+        [(sql, params)] = executed
+        self.assertIn('open_time > %(after)s', sql)
+        self.assertEqual(params['after'], utc(2025, 5, 14, 1))
+        self.assertEqual(params['limit'], 3)
+        self.assertEqual(data['t'], [rows[0][0], rows[1][0]])
+        self.assertEqual(data['next_cursor'], rows[1][0])
+        self.assertEqual(data['bucket_seconds'], 60)
+
+    def test_downsamples_when_range_exceeds_points(self):
+        buckets = [kline_row(int(utc(2025, 5, 14).timestamp() * 1000) + 300000 * i) for i in range(3)]
+        data, executed = self.query([[(301,)], buckets], points=300)
+        self.assertEqual(executed[0][1]['count_limit'], 301)
+        self.assertIs(executed[1][0], query.DOWNSAMPLE_SQL)
+        self.assertEqual(executed[1][1]['width'], 300)
+        self.assertEqual((data['bucket_seconds'], data['next_cursor']), (300, None))
+        self.assertEqual(data['t'], [row[0] for row in buckets])
+
+    def test_small_range_is_paged_instead_of_downsampled(self):
+        data, executed = self.query([[(10,)], [kline_row(1000)]], points=300)
+        self.assertEqual(len(executed), 2)
+        self.assertNotIn('after', executed[1][1])
+        self.assertEqual(data['bucket_seconds'], 60)
+
+
+class GetKlinesViewTests(SimpleTestCase):
+
+    def get(self, **params):
+        response = async_to_sync(get_klines)(RequestFactory().get('/', {'market': 'm', 'interval': '1m', **params}))
+        return response.status_code, json.loads(response.content)
+
+    def test_out_of_range_timestamps_are_rejected(self):
+        day_ms = int(timedelta(days=1).total_seconds() * 1000)
+        for params in [
+            {'start': -day_ms, 'end': 0},
+            {'start': 0, 'end': MAX_TIMESTAMP_MS + 1},
+            {'start': 0, 'end': 10 ** 20},
+            {'start': 0, 'end': day_ms, 'cursor': 10 ** 20},
+        ]:
+            with mock.patch('apps.klines.views.query_klines') as query_mock:
+                status, _ = self.get(**params)
+            self.assertEqual(status, 400, params)
+            query_mock.assert_not_called()
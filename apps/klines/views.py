@@ -1 +1,60 @@
-# Create your views here.
+from datetime import datetime, timedelta, timezone
+
+from asgiref.sync import sync_to_async
+from django.views.decorators.http import require_http_methods
+
+from apps.klines.query import DEFAULT_LIMIT, QUERY_INTERVALS, query_klines
+from common.helpers import ok_json, error_json, getLogger, parse_int
+
+logger = getLogger(__name__)
+
+# 未指定 start 时默认返回的时间范围
+DEFAULT_RANGE = timedelta(days=1)
+# 毫秒时间戳的有效范围，超出时 datetime.fromtimestamp 会抛出异常
+MAX_TIMESTAMP_MS = int(datetime(9999, 12, 31, tzinfo=timezone.utc).timestamp() * 1000)
+
+
+@require_http_methods(["GET"])
+async def get_klines(request):
+    """
+    K线数据，列数组格式。
+
+    ?market=...&interval=1h          必填
+    &start=<ms>&end=<ms>             时间范围，默认最近一天
+    &limit=500&cursor=<next_cursor>  keyset 分页
+    &points=300                      降采样到不超过该点数，降采样结果不分页
+    """
+    market = request.GET.get('market')
+    interval = request.GET.get('interval', '1h')
+    if not market:
+        return error_json("参数market是必须的", code=400, status=400)
+    if interval not in QUERY_INTERVALS:
+        return error_json(f"不支持的K线周期: {interval}", code=400, status=400)
+
+    now_ms = int(datetime.now(tz=timezone.utc).timestamp() * 1000)
+    end_ms = parse_int(request.GET.get('end'), now_ms)
+    start_ms = parse_int(request.GET.get('start'), end_ms - int(DEFAULT_RANGE.total_seconds() * 1000))
+    if not (0 <= start_ms <= MAX_TIMESTAMP_MS and 0 <= end_ms <= MAX_TIMESTAMP_MS):
+        return error_json(f"start和end必须是0到{MAX_TIMESTAMP_MS}之间的毫秒时间戳", code=400, status=400)
+    if start_ms >= end_ms:
+        return error_json("start必须小于end", code=400, status=400)
+    cursor = request.GET.get('cursor')
+    cursor = parse_int(cursor, None) if cursor else None
+    if cursor is not None and not 0 <= cursor <= MAX_TIMESTAMP_MS:
+        return error_json(f"cursor必须是0到{MAX_TIMESTAMP_MS}之间的毫秒时间戳", code=400, status=400)
+
+    try:
+        data = await sync_to_async(query_klines)(
+            market,
+            interval,
+            datetime.fromtimestamp(start_ms / 1000, tz=timezone.utc),
+            datetime.fromtimestamp(end_ms / 1000, tz=timezone.utc),
+            limit=parse_int(request.GET.get('limit'), DEFAULT_LIMIT),
+            cursor=cursor,
+            points=parse_int(request.GET.get('points'), None),
+        )
+    except Exception as e:
+        logger.error(f"查询K线出错: {e}", exc_info=True)
+        return error_json(f"服务器内部错误，{e}", code=500, status=500)
+
+    return ok_json({'market': market, 'interval': interval, **data})
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+from datetime import datetime, timezone
+from typing import Optional
+
+from django.db.models import Max, Min
+
+from apps.klines.models import Kline
+from common.helpers import getLogger
+from common.redis_client import local_redis
+
+logger = getLogger(__name__)
+
+# 周期 -> 毫秒
+INTERVAL_MS = {
+    '1m': 60 * 1000,
+    '30m': 30 * 60 * 1000,
+    '1h': 60 * 60 * 1000,
+    '1d': 24 * 60 * 60 * 1000,
+    '1w': 7 * 24 * 60 * 60 * 1000,
+}
+
+
+class KlineWatermarkStore:
+    """
+    K线采集水位。
+
+    Redis hash 中按 "market_identifier:interval" 记录最后一根最终K线的开盘时间（毫秒），
+    下次采集从它的下一根开始。Redis中没有记录时（首次采集或Redis被清空）从数据库恢复。
+
+    同一个 hash 中的 "market_identifier:interval:start" 记录连续覆盖的起点（最早一根K线的开盘时间），
+    聚合时起点之前开始的桶数据不完整。
+    """
+
+    def __init__(self):
+        self.key = "klines:watermark"
+
+    @staticmethod
+    def _field(market_identifier: str, interval: str) -> str:
+        return f"{market_identifier}:{interval}"
+
+    def get(self, market_identifier: str, interval: str) -> Optional[int]:
+        """最后一根最终K线的开盘时间（毫秒），没有数据时返回 None"""
+        value = local_redis().hget(self.key, self._field(market_identifier, interval))
+        if value is not None:
+            return int(value)
+
+        last_open = Kline.objects.filter(
+            market_id=market_identifier, interval=interval, is_final=True
+        ).aggregate(last=Max('open_time'))['last']
+        if last_open is None:
+            return None
+        watermark = int(last_open.timestamp() * 1000)
+        self.set(market_identifier, interval, watermark)
+        return watermark
+
+    def coverage_start(self, market_identifier: str, interval: str) -> Optional[int]:
+        """连续覆盖起点（毫秒），没有数据时返回 None"""
+        field = f"{self._field(market_identifier, interval)}:start"
+        value = local_redis().hget(self.key, field)
+        if value is not None:
+            return int(value)
+
+        first_open = Kline.objects.filter(
+            market_id=market_identifier, interval=interval
+        ).aggregate(first=Min('open_time'))['first']
+        if first_open is None:
+            return None
+        start = int(first_open.timestamp() * 1000)
+        local_redis().hset(self.key, field, start)
+        return start
+
+    def set(self, market_identifier: str, interval: str, open_time_ms: int) -> None:
+        local_redis().hset(self.key, self._field(market_identifier, interval), open_time_ms)
+
+    def next_since(self, market_identifier: str, interval: str, default_since: int) -> int:
+        """下次采集的起始时间（毫秒）：水位之后的第一根K线，没有水位时使用 default_since"""
+        watermark = self.get(market_identifier, interval)
+        if watermark is None:
+            return default_since
+        return watermark + INTERVAL_MS[interval]
+
+    @staticmethod
+    def is_final(open_time_ms: int, interval: str, now: Optional[datetime] = None) -> bool:
+        """K线结束时间已过才是最终值"""
+        now = now or datetime.now(tz=timezone.utc)
+        return open_time_ms + INTERVAL_MS[interval] <= int(now.timestamp() * 1000)
+
+
+# 全局实例
+watermark_store = KlineWatermarkStore()
@@ -9,7 +9,9 @@ from typing import Dict, List, Optional
 
 import ccxt.async_support as async_ccxt
 
-from apps.price_oracle.constants import STABLECOIN_SYMBOLS, EXCHANGE_PRIORITY
+from apps.exchange.consts import EXCHANGE_TICKERS_BATCH_SIZE
+from apps.price_oracle.client_pool import client_pool
+from apps.price_oracle.constants import STABLECOIN_SYMBOLS, EXCHANGE_PRIORITY, TICKER_SYMBOL_FILTER_EXCHANGES
 from common.helpers import getLogger
 
 logger = getLogger(__name__)
@@ -32,6 +34,7 @@ class ExchangeAdapter(ABC):
     def __init__(self, exchange_id: str):
         self.exchange_id = exchange_id
         self.client: Optional[async_ccxt.Exchange] = None
+        self.owns_client = True
 
     @abstractmethod
     async def get_prices(self) -> List[PriceData]:
@@ -39,8 +42,8 @@ class ExchangeAdapter(ABC):
         pass
 
     async def close(self):
-        """关闭连接"""
-        if self.client:
+        """关闭连接（从客户端池借用的客户端由池负责关闭）"""
+        if self.client and self.owns_client:
             try:
                 await self.client.close()
             except Exception as e:
@@ -50,9 +53,13 @@ class ExchangeAdapter(ABC):
 class CCXTAdapter(ExchangeAdapter):
     """通用CCXT适配器，支持所有交易所"""
 
-    def __init__(self, exchange_id: str):
+    def __init__(self, exchange_id: str, client: Optional[async_ccxt.Exchange] = None):
         super().__init__(exchange_id)
-        self._create_client()
+        if client is not None:
+            self.client = client
+            self.owns_client = False
+        else:
+            self._create_client()
 
     def _create_client(self):
         """创建CCXT客户端"""
@@ -91,70 +98,91 @@ class CCXTAdapter(ExchangeAdapter):
             return []
 
         try:
-            # 获取所有tickers
-            logger.debug(f"开始获取 {self.exchange_id} tickers...")
-
-            # YoBit 需要特殊参数
-            if self.exchange_id == 'yobit':
-                tickers = await self.client.fetch_tickers(params={"all": True})
-            else:
-                tickers = await self.client.fetch_tickers()
-
-            logger.debug(f"{self.exchange_id} 原始获取到 {len(tickers)} 个tickers")
-
-            prices = []
-            stablecoin_pairs = 0
-
-            for symbol, ticker in tickers.items():
-                # 基础检查
-                if not ticker or 'symbol' not in ticker or not ticker.get('last'):
-                    continue
-
-                # 分割交易对，例如：BTC/USDT -> (BTC, USDT)
-                base, quote = symbol.split('/', 1)
-
-                # 只保留稳定币计价的交易对
-                if quote not in STABLECOIN_SYMBOLS:
-                    continue
+            return await self.fetch_prices()
+        except Exception as e:
+            logger.error(f"{self.exchange_id} 获取价格失败: {e}")
+            return []
 
-                stablecoin_pairs += 1
-
-                # 提取价格信息
-                try:
-                    price = self._extract_price(ticker)
-                    if price is None or price <= 0:
-                        logger.debug(f"{self.exchange_id} {symbol}: 价格无效 {price}")
-                        continue
-
-                    price_data = PriceData(
-                        symbol=symbol,  # 使用原始符号格式（现货）
-                        base_asset=base,
-                        quote_asset=quote,
-                        price=Decimal(str(price)),
-                        volume_24h=self._safe_decimal(ticker.get('quoteVolume')),
-                        price_change_24h=self._safe_decimal(ticker.get('percentage'))
-                    )
-                    prices.append(price_data)
-
-                except (ValueError, TypeError, Exception) as e:
-                    logger.debug(f"解析价格数据失败 {symbol}: {e}")
+    async def _fetch_tickers(self, symbols: Optional[List[str]]) -> Dict:
+        """
+        获取ticker。TICKER_SYMBOL_FILTER_EXCHANGES 中的交易所按 EXCHANGE_TICKERS_BATCH_SIZE 分批只请求 symbols，
+        其余交易所一次拉取全部ticker，稳定币交易对在客户端过滤。
+        """
+        if symbols and self.exchange_id in TICKER_SYMBOL_FILTER_EXCHANGES:
+            batch_size = EXCHANGE_TICKERS_BATCH_SIZE.get(self.exchange_id, EXCHANGE_TICKERS_BATCH_SIZE['default'])
+            tickers = {}
+            for i in range(0, len(symbols), batch_size):
+                tickers.update(await self.client.fetch_tickers(symbols[i:i + batch_size]))
+            return tickers
+
+        # YoBit 需要特殊参数
+        if self.exchange_id == 'yobit':
+            return await self.client.fetch_tickers(params={"all": True})
+        return await self.client.fetch_tickers()
+
+    async def fetch_prices(self, symbols: Optional[List[str]] = None) -> List[PriceData]:
+        """
+        获取价格数据，请求失败时抛出异常。
+
+        Args:
+            symbols: 需要的稳定币交易对（由客户端池在加载市场信息时计算），为空时按ticker过滤
+        """
+        logger.debug(f"开始获取 {self.exchange_id} tickers...")
+        tickers = await self._fetch_tickers(symbols)
+
+        logger.debug(f"{self.exchange_id} 原始获取到 {len(tickers)} 个tickers")
+
+        prices = []
+        stablecoin_pairs = 0
+
+        # 已知订阅列表时只遍历订阅的交易对，不再逐个拆分全部ticker
+        items = ((symbol, tickers.get(symbol)) for symbol in symbols) if symbols else tickers.items()
+        for symbol, ticker in items:
+            # 基础检查
+            if not ticker or 'symbol' not in ticker or not ticker.get('last'):
+                continue
+
+            # 分割交易对，例如：BTC/USDT -> (BTC, USDT)
+            base, quote = symbol.split('/', 1)
+
+            # 只保留稳定币计价的交易对
+            if quote not in STABLECOIN_SYMBOLS:
+                continue
+
+            stablecoin_pairs += 1
+
+            # 提取价格信息
+            try:
+                price = self._extract_price(ticker)
+                if price is None or price <= 0:
+                    logger.debug(f"{self.exchange_id} {symbol}: 价格无效 {price}")
                     continue
 
-            logger.info(f"{self.exchange_id} 获取到 {len(prices)} 个资产价格 (共 {stablecoin_pairs} 个稳定币交易对)")
-
-            # 如果没有价格数据，输出前几个ticker样例用于调试
-            if len(prices) == 0 and len(tickers) > 0:
-                sample_symbols = list(tickers.keys())[:3]
-                logger.warning(f"{self.exchange_id} 未找到有效价格，样例交易对: {sample_symbols}")
-                for symbol in sample_symbols:
-                    ticker = tickers[symbol]
-                    logger.debug(f"{self.exchange_id} {symbol}: {ticker}")
+                price_data = PriceData(
+                    symbol=symbol,  # 使用原始符号格式（现货）
+                    base_asset=base,
+                    quote_asset=quote,
+                    price=Decimal(str(price)),
+                    volume_24h=self._safe_decimal(ticker.get('quoteVolume')),
+                    price_change_24h=self._safe_decimal(ticker.get('percentage'))
+                )
+                prices.append(price_data)
+
+            except (ValueError, TypeError, Exception) as e:
+                logger.debug(f"解析价格数据失败 {symbol}: {e}")
+                continue
+
+        logger.info(f"{self.exchange_id} 获取到 {len(prices)} 个资产价格 (共 {stablecoin_pairs} 个稳定币交易对)")
+
+        # 如果没有价格数据，输出前几个ticker样例用于调试
+        if len(prices) == 0 and len(tickers) > 0:
+            sample_symbols = list(tickers.keys())[:3]
+            logger.warning(f"{self.exchange_id} 未找到有效价格，样例交易对: {sample_symbols}")
+            for symbol in sample_symbols:
+                ticker = tickers[symbol]
+                logger.debug(f"{self.exchange_id} {symbol}: {ticker}")
 
-            return prices
-
-        except Exception as e:
-            logger.error(f"{self.exchange_id} 获取价格失败: {e}")
-            return []
+        return prices
 
     def _extract_price(self, ticker: Dict) -> Optional[float]:
         """从ticker中提取价格，优先级: last > close > bid/ask平均"""
@@ -217,18 +245,13 @@ class AdapterFactory:
 
 # 便捷函数
 async def get_exchange_prices(exchange: str) -> List[PriceData]:
-    """获取交易所价格的便捷函数"""
-    adapter = AdapterFactory.get_adapter(exchange)
-    if not adapter:
-        return []
-
+    """获取交易所价格的便捷函数，使用客户端池中已加载市场信息的客户端"""
     try:
-        prices = await adapter.get_prices()
-        await adapter.close()
-        return prices
+        async with client_pool.client(exchange) as client:
+            symbols = client_pool.get_symbols(exchange)
+            return await CCXTAdapter(exchange, client=client).fetch_prices(symbols)
     except Exception as e:
         logger.error(f"获取 {exchange} 价格失败: {e}")
-        await adapter.close()
         return []
 
 
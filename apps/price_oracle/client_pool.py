@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+import aiohttp
+import ccxt.async_support as async_ccxt
+
+from common.helpers import getLogger
+from apps.price_oracle.constants import STABLECOIN_SYMBOLS
+
+logger = getLogger(__name__)
+
+# 市场信息刷新周期（秒）
+MARKETS_TTL = 3600
+# 连续失败达到该次数后关闭并重建客户端
+MAX_CONSECUTIVE_FAILURES = 3
+# 共享连接器参数
+CONNECTOR_LIMIT = 100
+CONNECTOR_LIMIT_PER_HOST = 10
+DNS_CACHE_TTL = 300
+KEEPALIVE_TIMEOUT = 60
+
+
+def stablecoin_symbols(markets: Dict[str, Dict]) -> List[str]:
+    """从市场信息中筛选出以稳定币计价、仍在交易的现货交易对"""
+    return [
+        symbol for symbol, market in markets.items()
+        if market.get('spot', True)
+        and market.get('active') is not False
+        and market.get('quote') in STABLECOIN_SYMBOLS
+    ]
+
+
+@dataclass
+class PooledClient:
+    client: async_ccxt.Exchange
+    markets_loaded_at: float = 0.0
+    consecutive_failures: int = 0
+    symbols: Optional[List[str]] = None  # 需要采集的稳定币交易对，随市场信息刷新
+
+
+class ExchangeClientPool:
+    """
+    长期复用的ccxt异步客户端池，按交易所id缓存。
+
+    所有客户端共用一个带DNS缓存和keep-alive的aiohttp会话，市场信息只在首次使用
+    和超过 MARKETS_TTL 后加载，连续失败达到阈值的客户端会被关闭并在下次借用时重建。
+    客户端和会话都绑定在创建它们的事件循环上，循环变化时整个池会重置。
+    """
+
+    def __init__(self):
+        self._clients: Dict[str, PooledClient] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _check_loop(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            if self._loop is not None:
+                logger.debug("事件循环已变化，重置客户端池")
+            self._clients = {}
+            self._locks = {}
+            self._session = None
+            self._loop = loop
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=CONNECTOR_LIMIT,
+                limit_per_host=CONNECTOR_LIMIT_PER_HOST,
+                ttl_dns_cache=DNS_CACHE_TTL,
+                keepalive_timeout=KEEPALIVE_TIMEOUT,
+                enable_cleanup_closed=True,
+            )
+            self._session = aiohttp.ClientSession(connector=connector, trust_env=True)
+        return self._session
+
+    def _create_client(self, exchange_id: str) -> Optional[async_ccxt.Exchange]:
+        """创建CCXT客户端"""
+        if not hasattr(async_ccxt, exchange_id):
+            logger.error(f"CCXT不支持交易所: {exchange_id}")
+            return None
+
+        config = {
+            'timeout': 30000,  # 30秒超时
+            'enableRateLimit': True,  # 启用速率限制
+            'verbose': False,
+            'options': {
+                'defaultType': 'spot',  # 默认使用现货市场
+            },
+            # 共享会话，客户端 close() 时不会关闭它
+            'session': self._get_session(),
+        }
+
+        # 特殊配置
+        if exchange_id == 'yobit':
+            config['timeout'] = 120000  # YoBit需要更长超时
+
+        logger.debug(f"创建CCXT客户端: {exchange_id}")
+        return getattr(async_ccxt, exchange_id)(config)
+
+    async def _acquire(self, exchange_id: str) -> PooledClient:
+        self._check_loop()
+        lock = self._locks.setdefault(exchange_id, asyncio.Lock())
+        async with lock:
+            pooled = self._clients.get(exchange_id)
+            if pooled is None:
+                client = self._create_client(exchange_id)
+                if client is None:
+                    raise ValueError(f"CCXT不支持交易所: {exchange_id}")
+                pooled = PooledClient(client=client)
+                self._clients[exchange_id] = pooled
+
+            if time.time() - pooled.markets_loaded_at > MARKETS_TTL:
+                markets = await pooled.client.load_markets(reload=pooled.markets_loaded_at > 0)
+                pooled.markets_loaded_at = time.time()
+                pooled.symbols = stablecoin_symbols(markets or {})
+                logger.debug(f"{exchange_id}: {len(pooled.symbols)} 个稳定币交易对")
+        return pooled
+
+    def get_symbols(self, exchange_id: str) -> Optional[List[str]]:
+        """最近一次加载市场信息时计算出的稳定币交易对列表"""
+        pooled = self._clients.get(exchange_id.lower())
+        return pooled.symbols if pooled else None
+
+    async def _discard(self, exchange_id: str) -> None:
+        pooled = self._clients.pop(exchange_id, None)
+        if pooled:
+            try:
+                await pooled.client.close()
+            except Exception as e:
+                logger.debug(f"关闭客户端时出错: {e}")
+
+    @asynccontextmanager
+    async def client(self, exchange_id: str):
+        """
+        借用交易所客户端，退出时根据是否抛出异常记录成功或失败。
+
+        用法:
+            async with client_pool.client('binance') as client:
+                tickers = await client.fetch_tickers()
+        """
+        exchange_id = exchange_id.lower()
+        try:
+            pooled = await self._acquire(exchange_id)
+        except Exception:
+            # 加载市场失败同样计入失败次数
+            await self._record_failure(exchange_id)
+            raise
+        try:
+            yield pooled.client
+        except Exception:
+            await self._record_failure(exchange_id)
+            raise
+        pooled.consecutive_failures = 0
+
+    async def _record_failure(self, exchange_id: str) -> None:
+        pooled = self._clients.get(exchange_id)
+        if pooled is None:
+            return
+        pooled.consecutive_failures += 1
+        if pooled.consecutive_failures >= MAX_CONSECUTIVE_FAILURES:
+            logger.warning(f"{exchange_id} 客户端连续失败 {pooled.consecutive_failures} 次，重建客户端")
+            await self._discard(exchange_id)
+
+    async def close_all(self) -> None:
+        """关闭所有客户端和共享会话，应在事件循环结束前调用"""
+        for exchange_id in list(self._clients.keys()):
+            await self._discard(exchange_id)
+        if self._session and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+
+# 全局实例
+client_pool = ExchangeClientPool()
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+跨交易所共识价格。
+
+每个资产保留各交易所最近一次报价组成的短窗口，计算加权中位数，
+用MAD（中位数绝对偏差）剔除离群报价，并给出置信度。
+每次只重算本轮有更新的资产，单个资产的计算量只与交易所数量有关。
+"""
+
+import math
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+# 报价窗口（秒），超过该时间未更新的交易所报价不参与共识
+CONSENSUS_WINDOW = 300
+# 离群判断阈值：|price - median| / (1.4826 * MAD) 超过该值视为离群
+MAD_THRESHOLD = 3.5
+# MAD 的下限（相对中位数），避免报价几乎一致时把微小差异判为离群
+MIN_MAD_RATIO = 0.001
+# 达到该交易所数量时不再因报价来源少而降低置信度
+FULL_CONFIDENCE_VENUES = 3
+# 内点相对离散度达到该值时置信度降为0
+MAX_RELATIVE_DISPERSION = 0.02
+# 1.4826 * MAD 是正态分布下标准差的一致估计
+MAD_SCALE = 1.4826
+
+
+@dataclass
+class Consensus:
+    price: float
+    confidence: float
+    venues: List[str]
+    outliers: List[str] = field(default_factory=list)
+
+
+def weighted_median(values: List[float], weights: List[float]) -> float:
+    """加权中位数，返回的总是某个实际报价"""
+    pairs = sorted(zip(values, weights))
+    half = sum(weights) / 2
+    cumulative = 0.0
+    for value, weight in pairs:
+        cumulative += weight
+        if cumulative >= half:
+            return value
+    return pairs[-1][0]
+
+
+def quote_weight(quote: Dict, use_volume: bool) -> float:
+    """成交量可用时按成交量加权（取对数抑制头部交易所），否则按交易所优先级加权"""
+    if use_volume:
+        return math.log1p(float(quote.get('volume_24h') or 0))
+    return 1.0 / (1 + int(quote.get('exchange_priority', 999)))
+
+
+def compute_consensus(quotes: List[Dict], now: float) -> Tuple[Optional[Consensus], List[Dict]]:
+    """
+    计算共识价格。
+
+    Args:
+        quotes: 各交易所报价，需包含 exchange, price, timestamp，可选 volume_24h, exchange_priority
+        now: 当前时间戳（秒）
+
+    Returns:
+        (共识结果, 内点报价列表)；没有有效报价时返回 (None, [])
+    """
+    fresh = []
+    for quote in quotes:
+        try:
+            price = float(quote.get('price') or 0)
+        except (TypeError, ValueError):
+            continue
+        if price > 0 and now - float(quote.get('timestamp', 0)) <= CONSENSUS_WINDOW:
+            fresh.append((price, quote))
+    if not fresh:
+        return None, []
+
+    use_volume = all(float(q.get('volume_24h') or 0) > 0 for _, q in fresh)
+    prices = [price for price, _ in fresh]
+    weights = [quote_weight(q, use_volume) for _, q in fresh]
+    if sum(weights) <= 0:
+        weights = [1.0] * len(fresh)
+
+    median = weighted_median(prices, weights)
+    deviations = [abs(price - median) for price in prices]
+    mad = max(weighted_median(deviations, [1.0] * len(deviations)), median * MIN_MAD_RATIO)
+
+    inliers, inlier_weights, outliers = [], [], []
+    for (price, quote), weight, deviation in zip(fresh, weights, deviations):
+        if deviation / (MAD_SCALE * mad) > MAD_THRESHOLD:
+            outliers.append(quote.get('exchange', ''))
+        else:
+            inliers.append((price, quote))
+            inlier_weights.append(weight)
+
+    inlier_prices = [price for price, _ in inliers]
+    consensus_price = weighted_median(inlier_prices, inlier_weights) if sum(inlier_weights) > 0 else median
+
+    # 置信度 = 内点权重占比 × 来源数量系数 × 内点一致程度
+    weight_ratio = sum(inlier_weights) / sum(weights)
+    venue_factor = min(1.0, len(inliers) / FULL_CONFIDENCE_VENUES)
+    dispersion = (max(inlier_prices) - min(inlier_prices)) / consensus_price if consensus_price else 1.0
+    agreement = max(0.0, 1 - dispersion / MAX_RELATIVE_DISPERSION)
+    confidence = round(weight_ratio * venue_factor * agreement, 4)
+
+    consensus = Consensus(
+        price=consensus_price,
+        confidence=confidence,
+        venues=[quote.get('exchange', '') for _, quote in inliers],
+        outliers=outliers,
+    )
+    return consensus, [quote for _, quote in inliers]
@@ -52,3 +52,12 @@ EXCHANGE_PRIORITY = [
     'bigone',
     'hitbtc'
 ]
+
+# fetchTickers 会把 symbols 参数传给交易所接口做服务端过滤、且过滤后的请求比全量请求更便宜的交易所，
+# 这些交易所按 EXCHANGE_TICKERS_BATCH_SIZE 分批只请求稳定币交易对，其余交易所默认一次拉取全部ticker。
+# binance 按交易对请求的权重高于一次全量请求，yobit 需要 all=True 全量拉取，二者不在此列
+TICKER_SYMBOL_FILTER_EXCHANGES = [
+    'coinbase',
+    'kraken',
+    'hitbtc',
+]
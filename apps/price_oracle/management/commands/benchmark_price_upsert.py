@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from apps.price_oracle.services import price_service
+
+
+class Command(BaseCommand):
+    help = '测量不同分块大小下AssetPrice批量UPSERT的耗时，用于确定PRICE_UPSERT_CHUNK_SIZE（在回滚的事务中执行）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=10000, help='模拟的资产数量')
+        parser.add_argument(
+            '--chunk-sizes', type=str, default='100,500,1000,2000,5000',
+            help='逗号分隔的分块大小列表',
+        )
+
+    def handle(self, *args, **options):
+        rows = options['rows']
+        chunk_sizes = [int(size) for size in options['chunk_sizes'].split(',') if size.strip()]
+        now = time.time()
+        prices = [
+            {
+                'base_asset': f'BENCH{i}',
+                'symbol': f'BENCH{i}/USDT',
+                'quote_asset': 'USDT',
+                'exchange': 'binance',
+                'price': '1.2345',
+                'volume_24h': '1000',
+                'price_change_24h': '0.5',
+                'exchange_priority': 0,
+                'quote_priority': 0,
+                'timestamp': now,
+            }
+            for i in range(rows)
+        ]
+
+        self.stdout.write(f"📦 {rows} 行, 每个分块大小执行一次插入和一次更新")
+        results = []
+        for chunk_size in chunk_sizes:
+            with transaction.atomic():
+                start = time.perf_counter()
+                price_service.upsert_prices(prices, chunk_size=chunk_size)
+                insert_cost = time.perf_counter() - start
+
+                for price_data in prices:
+                    price_data['timestamp'] += 1
+                start = time.perf_counter()
+                price_service.upsert_prices(prices, chunk_size=chunk_size)
+                update_cost = time.perf_counter() - start
+                transaction.set_rollback(True)
+
+            results.append((chunk_size, insert_cost, update_cost))
+            self.stdout.write(f"  chunk={chunk_size:>6}: 插入 {insert_cost * 1000:.1f} ms, 更新 {update_cost * 1000:.1f} ms")
+
+        best = min(results, key=lambda r: r[1] + r[2])
+        self.stdout.write(self.style.SUCCESS(f"✅ 建议 PRICE_UPSERT_CHUNK_SIZE = {best[0]}"))
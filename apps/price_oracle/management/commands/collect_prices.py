@@ -7,6 +7,7 @@ from django.core.management.base import BaseCommand
 from django.utils import timezone
 from common.helpers import getLogger
 from apps.price_oracle.adapters import AdapterFactory, get_exchange_prices
+from apps.price_oracle.client_pool import client_pool
 from apps.price_oracle.redis_service import redis_service
 from apps.price_oracle.scheduler import IndependentScheduler
 
@@ -55,6 +56,7 @@ class Command(BaseCommand):
             self.stdout.write(f"✅ 采集完成，共保存 {total_saved} 个价格到Redis")
             
         finally:
+            loop.run_until_complete(client_pool.close_all())
             loop.close()
 
     async def collect_all_exchanges_parallel(self, exchanges: list) -> int:
@@ -88,11 +90,12 @@ class Command(BaseCommand):
         try:
             loop.run_until_complete(self.independent_collect_loop(exchanges))
         finally:
+            loop.run_until_complete(client_pool.close_all())
             loop.close()
 
     async def independent_collect_loop(self, exchanges: list):
         """独立调度采集循环"""
-        scheduler = IndependentScheduler(exchanges, self.collect_single_exchange)
+        scheduler = IndependentScheduler(exchanges, self.collect_single_exchange, redis_service.get_change_rate)
         
         try:
             await scheduler.start()
@@ -1,6 +1,8 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+import os
+import socket
 import time
 
 from django.core.management.base import BaseCommand
@@ -19,7 +21,7 @@ class Command(BaseCommand):
     def add_arguments(self, parser):
         parser.add_argument(
             '--batch-size', type=int, default=5000,
-            help='每次处理的价格数量（默认100）',
+            help='每次处理的价格数量（默认5000）',
         )
         parser.add_argument(
             '--interval', type=int, default=0,
@@ -70,18 +72,28 @@ class Command(BaseCommand):
 
     def process_once(self, batch_size: int, cleanup: bool) -> int:
         """单次处理"""
-        total_processed = 0
+        total_processed = self.drain_legacy_queue(batch_size)
+
+        redis_service.ensure_consumer_group()
+        consumer = f"{socket.gethostname()}-{os.getpid()}"
 
         while True:
-            # 从Redis队列获取价格数据
+            # 从Redis Stream获取价格数据
             start_time = time.time()
-            prices = redis_service.get_prices_from_queue(batch_size)
+            entry_ids, prices = redis_service.read_price_batch(consumer, batch_size)
 
-            if not prices:
+            if not entry_ids:
                 break
 
             # 保存到数据库
-            saved_count = price_service.save_prices_to_db_upsert(prices)
+            try:
+                saved_count = price_service.upsert_prices(prices)
+            except Exception as e:
+                # 不确认，消息留在pending列表中，空闲超时后重新投递
+                logger.error(f"持久化价格失败: {e}")
+                self.stdout.write(f"  ⚠️  批次保存失败，{len(entry_ids)} 个价格等待重试")
+                break
+            redis_service.ack_prices(entry_ids)
 
             total_processed += saved_count
             processing_time = time.time() - start_time
@@ -90,7 +102,7 @@ class Command(BaseCommand):
                               f"(耗时: {processing_time:.2f}s)")
 
             # 如果这批数据量少于批处理大小，说明队列已空
-            if len(prices) < batch_size:
+            if len(entry_ids) < batch_size:
                 break
 
         # 清理过期数据
@@ -104,6 +116,18 @@ class Command(BaseCommand):
 
         return total_processed
 
+    def drain_legacy_queue(self, batch_size: int) -> int:
+        """消费升级前写入旧版List队列的价格"""
+        total_processed = 0
+        while True:
+            prices = redis_service.get_prices_from_queue(batch_size)
+            if not prices:
+                break
+            total_processed += price_service.save_prices_to_db_upsert(prices)
+            if len(prices) < batch_size:
+                break
+        return total_processed
+
     def show_stats(self):
         """显示统计信息"""
         try:
@@ -111,7 +135,7 @@ class Command(BaseCommand):
             redis_stats = redis_service.get_stats()
             self.stdout.write("📊 系统状态:")
             self.stdout.write(f"  Redis队列: {redis_stats.get('queue_size', 0)} 项")
-            self.stdout.write(f"  Redis缓存: {redis_stats.get('total_price_keys', 0)} 项")
+            self.stdout.write(f"  Redis缓存: {redis_stats.get('best_price_cache_keys', 0)} 项")
 
             # 数据库统计
             from apps.price_oracle.models import AssetPrice
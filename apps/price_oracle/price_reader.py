@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import json
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Tuple
+
+from apps.price_oracle.models import AssetPrice
+from apps.price_oracle.redis_service import redis_service
+from common.helpers import getLogger
+from common.redis_client import local_redis
+
+logger = getLogger(__name__)
+
+# 进程内响应缓存，与原 cache_page(2) 的时效一致
+RESPONSE_CACHE_TTL = 2
+RESPONSE_CACHE_MAX_SIZE = 10000
+# 单次请求最多查询的资产数量
+MAX_ASSETS_PER_REQUEST = 200
+
+_response_cache: Dict[str, Tuple[float, Dict[str, Dict]]] = {}
+
+
+def normalize_assets(raw: str) -> List[str]:
+    """把 'eth, BTC,btc' 规范化为去重排序后的 ['BTC', 'ETH']，参数顺序和大小写不影响缓存key"""
+    return sorted({asset.strip().upper() for asset in raw.split(',') if asset.strip()})
+
+
+def _from_redis(data: Dict) -> Dict:
+    price_change = data.get('price_change_24h')
+    volume = data.get('volume_24h')
+    return {
+        'base_asset': data.get('base_asset'),
+        'exchange': data.get('exchange'),
+        'price': float(data.get('price') or 0),
+        'price_change_24h': float(price_change) if price_change not in (None, '', '0') else None,
+        'volume_24h': float(volume) if volume not in (None, '', '0') else None,
+        'timestamp': datetime.fromtimestamp(float(data.get('timestamp', 0)), tz=timezone.utc).isoformat(),
+    }
+
+
+def _from_model(price_obj: AssetPrice) -> Dict:
+    return {
+        'base_asset': price_obj.base_asset,
+        'exchange': price_obj.exchange,
+        'price': float(price_obj.price),
+        'price_change_24h': float(price_obj.price_change_24h) if price_obj.price_change_24h else None,
+        'volume_24h': float(price_obj.volume_24h) if price_obj.volume_24h else None,
+        'timestamp': price_obj.price_timestamp.isoformat(),
+    }
+
+
+def _get_prices_from_replica(assets: List[str]) -> Dict[str, Dict]:
+    """Redis未命中时从只读副本读取"""
+    queryset = AssetPrice.objects.using('slave_replica').filter(base_asset__in=assets)
+    return {price_obj.base_asset: _from_model(price_obj) for price_obj in queryset}
+
+
+def get_prices(assets: List[str]) -> Dict[str, Dict]:
+    """
+    批量获取资产最优价格。
+
+    先查进程内缓存，再用一次MGET读取 price_oracle:best_price: key，
+    只有Redis中不存在的资产才回退到只读副本数据库。
+    """
+    cache_key = ','.join(assets)
+    cached = _response_cache.get(cache_key)
+    now = time.time()
+    if cached and cached[0] > now:
+        return cached[1]
+
+    keys = [f"{redis_service.best_price_prefix}{asset}" for asset in assets]
+    result: Dict[str, Dict] = {}
+    try:
+        values = local_redis().mget(keys)
+    except Exception as e:
+        logger.warning(f"读取Redis最优价格失败，回退到数据库: {e}")
+        values = [None] * len(keys)
+
+    for asset, value in zip(assets, values):
+        if not value:
+            continue
+        try:
+            result[asset] = _from_redis(json.loads(value))
+        except (TypeError, ValueError):
+            continue
+
+    missing = [asset for asset in assets if asset not in result]
+    if missing:
+        result.update(_get_prices_from_replica(missing))
+
+    if len(_response_cache) >= RESPONSE_CACHE_MAX_SIZE:
+        _response_cache.clear()
+    _response_cache[cache_key] = (now + RESPONSE_CACHE_TTL, result)
+    return result
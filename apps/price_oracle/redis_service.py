@@ -3,14 +3,27 @@
 
 import json
 import time
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
 
+from redis.exceptions import ResponseError
+
+from common.change_filter import PriceChangeFilter
 from common.redis_client import local_redis
 from common.helpers import getLogger
+from apps.price_oracle.consensus import CONSENSUS_WINDOW, Consensus, compute_consensus
 from apps.price_oracle.constants import EXCHANGE_PRIORITY, STABLECOIN_SYMBOLS
 
 logger = getLogger(__name__)
 
+# 价格Stream的近似最大长度，防止持久化进程长时间停止时无限增长
+PRICE_STREAM_MAXLEN = 200000
+# pending消息空闲超过该时间（毫秒）后可被其他消费者认领，用于恢复崩溃的持久化进程
+PRICE_STREAM_CLAIM_IDLE_MS = 60000
+# 最优价格缓存的过期时间（秒）
+BEST_PRICE_TTL = 3600
+# 清理过期索引时每批处理的数量
+INDEX_CLEANUP_CHUNK = 1000
+
 
 class PriceRedisService:
     """Redis价格服务 - 处理价格数据的缓存和队列，支持优先级选择"""
@@ -18,20 +31,34 @@ class PriceRedisService:
     def __init__(self):
         self.redis = local_redis()
         self.raw_price_prefix = "price_oracle:raw_price:"  # 用于存储原始价格
-        self.queue_key = "price_oracle:price_queue"
+        self.queue_key = "price_oracle:price_queue"  # 旧版List队列，只消费遗留数据
+        self.stream_key = "price_oracle:price_stream"
+        self.consumer_group = "price_persisters"
         self.best_price_prefix = "price_oracle:best_price:"  # 存储每个资产的最优价格
+        self.window_prefix = "price_oracle:window:"  # 每个资产各交易所的最近报价(hash)，用于共识价格
+        self.index_key = "price_oracle:key_index"  # 价格key索引(zset)，score为最后写入时间
+        self.stats_key = "price_oracle:stats"  # 增量维护的统计计数(hash)
+        # 每个交易所上一次采集到的价格及价格变化比例，供调度策略调整采集间隔
+        self._last_prices: Dict[str, Dict[str, str]] = {}
+        self._change_rates: Dict[str, Optional[float]] = {}
+        # 只发布变化超过阈值或超过心跳时间的最优价格
+        self.change_filter = PriceChangeFilter('PriceRedisService')
     
     def save_prices_to_redis(self, exchange: str, prices: List[Dict]) -> int:
-        """将价格数据保存到Redis，同时计算最优价格"""
+        """
+        将价格数据保存到Redis，同时计算最优价格。
+
+        第一个pipeline把本交易所的报价写入各资产的报价窗口并读回完整窗口，
+        在本地计算共识价格、剔除离群报价并选出最优价格，
+        再用第二个pipeline写入所有最优价格和持久化Stream，每个周期只有两次往返。
+        与上次发布相比变化不足阈值且未到心跳时间的价格不会写入。
+        """
+        published = []
         try:
-            saved_count = 0
-            current_time = time.time()
-            
             # 获取交易所优先级
             exchange_priority = self._get_exchange_priority(exchange)
-            
-            pipe = self.redis.pipeline()
-            
+            self._record_change_rate(exchange, prices)
+
             # 按基础资产分组处理价格
             asset_prices = {}
             for price_data in prices:
@@ -46,28 +73,77 @@ class PriceRedisService:
                 price_data['exchange_priority'] = exchange_priority
                 price_data['quote_priority'] = self._get_quote_priority(price_data.get('quote_asset', ''))
                 asset_prices[base_asset].append(price_data)
-            
+
+            if not asset_prices:
+                return 0
+
+            base_assets = list(asset_prices.keys())
+            windows = self._update_windows(exchange, asset_prices)
+
             # 为每个资产选择最优价格
-            for base_asset, price_list in asset_prices.items():
-                best_price = self._select_best_price(base_asset, price_list)
-                if best_price:
-                    # 保存到队列等待持久化
-                    pipe.lpush(self.queue_key, json.dumps(best_price))
-                    
-                    # 更新最优价格缓存
-                    best_key = f"{self.best_price_prefix}{base_asset}"
-                    pipe.setex(best_key, 3600, json.dumps(best_price))
-                    
-                    saved_count += 1
-            
+            queue_items = []
+            best_mapping = {}
+            suppressed = 0
+            now = time.time()
+            for base_asset in base_assets:
+                consensus, inliers = compute_consensus(windows.get(base_asset, []), now)
+                if consensus and consensus.outliers:
+                    logger.warning(f"{base_asset}: 剔除离群报价 {consensus.outliers}, 共识价格 {consensus.price}")
+                best_price = self._select_best_price(base_asset, inliers or asset_prices[base_asset], consensus)
+                if not best_price:
+                    continue
+                if not self.change_filter.should_publish(base_asset, best_price['price'], now):
+                    suppressed += 1
+                    continue
+                published.append(base_asset)
+                best_json = json.dumps(best_price)
+                queue_items.append(best_json)
+                best_mapping[f"{self.best_price_prefix}{base_asset}"] = best_json
+
+            pipe = self.redis.pipeline(transaction=False)
+            if queue_items:
+                # 保存到Stream等待持久化
+                for item in queue_items:
+                    pipe.xadd(self.stream_key, {'data': item}, maxlen=PRICE_STREAM_MAXLEN, approximate=True)
+                # 更新最优价格缓存
+                for best_key, best_json in best_mapping.items():
+                    pipe.setex(best_key, BEST_PRICE_TTL, best_json)
+                # 维护key索引和统计计数，供清理和统计使用，避免扫描keyspace
+                pipe.zadd(self.index_key, {best_key: now for best_key in best_mapping})
+                pipe.hincrby(self.stats_key, 'best_price_writes', len(best_mapping))
+                pipe.hset(self.stats_key, 'last_write', now)
+            # 全部被抑制时也要计数
+            if suppressed:
+                pipe.hincrby(self.stats_key, 'suppressed', suppressed)
             pipe.execute()
-            logger.info(f"保存 {saved_count} 个最优价格到Redis")
+
+            saved_count = len(queue_items)
+            logger.info(f"保存 {saved_count}/{len(base_assets)} 个最优价格到Redis")
             return saved_count
             
         except Exception as e:
             logger.error(f"保存价格到Redis失败: {e}")
+            # 写入失败的价格下次必须重新发布
+            for base_asset in published:
+                self.change_filter.forget(base_asset)
             return 0
     
+    def _record_change_rate(self, exchange: str, prices: List[Dict]) -> None:
+        """统计与上一次采集相比价格发生变化的交易对比例"""
+        previous = self._last_prices.get(exchange, {})
+        current = {p.get('symbol', ''): str(p.get('price')) for p in prices}
+        compared = [symbol for symbol in current if symbol in previous]
+        if compared:
+            changed = sum(1 for symbol in compared if current[symbol] != previous[symbol])
+            self._change_rates[exchange] = changed / len(compared)
+        else:
+            self._change_rates[exchange] = None
+        self._last_prices[exchange] = current
+
+    def get_change_rate(self, exchange: str) -> Optional[float]:
+        """最近一次采集中价格发生变化的比例，没有可比较的数据时返回None"""
+        return self._change_rates.get(exchange)
+
     def _get_exchange_priority(self, exchange: str) -> int:
         """获取交易所优先级（数字越小优先级越高）"""
         try:
@@ -82,27 +158,47 @@ class PriceRedisService:
         except ValueError:
             return 999  # 不在列表中的稳定币给最低优先级
     
-    def _select_best_price(self, base_asset: str, price_list: List[Dict]) -> Optional[Dict]:
-        """为资产选择最优价格"""
-        if not price_list:
+    def _update_windows(self, exchange: str, asset_prices: Dict[str, List[Dict]]) -> Dict[str, List[Dict]]:
+        """
+        写入本交易所对每个资产的报价（同一资产取稳定币优先级最高的交易对），
+        并在同一个pipeline中读回每个资产所有交易所的报价窗口。
+        """
+        now = time.time()
+        base_assets = list(asset_prices.keys())
+        pipe = self.redis.pipeline(transaction=False)
+        for base_asset in base_assets:
+            quote = dict(min(asset_prices[base_asset], key=lambda x: x.get('quote_priority', 999)))
+            quote['exchange'] = exchange
+            quote['timestamp'] = now
+            key = f"{self.window_prefix}{base_asset}"
+            pipe.hset(key, exchange, json.dumps(quote))
+            pipe.expire(key, CONSENSUS_WINDOW * 2)
+            pipe.hgetall(key)
+        results = pipe.execute()
+
+        windows = {}
+        for base_asset, window in zip(base_assets, results[2::3]):
+            quotes = []
+            for data in (window or {}).values():
+                try:
+                    quotes.append(json.loads(data))
+                except (json.JSONDecodeError, TypeError):
+                    continue
+            windows[base_asset] = quotes
+        return windows
+
+    def _select_best_price(self, base_asset: str, candidates: List[Dict],
+                           consensus: Optional[Consensus] = None) -> Optional[Dict]:
+        """在共识内点报价中按优先级选择最优价格，并附带共识价格和置信度"""
+        if not candidates:
             return None
         
-        # 检查Redis中是否已有该资产的价格
-        current_best = self._get_current_best_price(base_asset)
-        
-        # 将新价格加入候选列表
-        candidates = price_list.copy()
-        if current_best:
-            candidates.append(current_best)
-        
         # 按优先级排序：先按交易所优先级，再按稳定币优先级
-        candidates.sort(key=lambda x: (x.get('exchange_priority', 999), x.get('quote_priority', 999)))
-        
-        best_candidate = candidates[0]
+        best_candidate = min(candidates, key=lambda x: (x.get('exchange_priority', 999), x.get('quote_priority', 999)))
         
         # 准备最优价格数据
         current_time = time.time()
-        return {
+        best_price = {
             'base_asset': base_asset,
             'symbol': best_candidate.get('symbol', ''),
             'quote_asset': best_candidate.get('quote_asset', ''),
@@ -114,31 +210,23 @@ class PriceRedisService:
             'quote_priority': best_candidate.get('quote_priority', 999),
             'timestamp': current_time
         }
-    
-    def _get_current_best_price(self, base_asset: str) -> Optional[Dict]:
-        """获取当前最优价格"""
-        try:
-            key = f"{self.best_price_prefix}{base_asset}"
-            data = self.redis.get(key)
-            if data:
-                return json.loads(data)
-        except Exception:
-            pass
-        return None
+        if consensus:
+            best_price.update({
+                'consensus_price': str(consensus.price),
+                'confidence': consensus.confidence,
+                'venues': len(consensus.venues),
+                'outliers': consensus.outliers,
+            })
+        return best_price
     
     def get_prices_from_queue(self, batch_size: int = 100) -> List[Dict]:
-        """从队列中批量获取价格数据"""
+        """从旧版List队列中批量获取遗留的价格数据（一次 RPOP key count）"""
         try:
+            items = self.redis.rpop(self.queue_key, batch_size) or []
             prices = []
-            
-            for _ in range(batch_size):
-                data = self.redis.rpop(self.queue_key)
-                if not data:
-                    break
-                
+            for data in items:
                 try:
-                    price_data = json.loads(data)
-                    prices.append(price_data)
+                    prices.append(json.loads(data))
                 except json.JSONDecodeError:
                     continue
             
@@ -150,6 +238,68 @@ class PriceRedisService:
         except Exception as e:
             logger.error(f"从队列获取价格失败: {e}")
             return []
+
+    def ensure_consumer_group(self):
+        """创建持久化消费者组（已存在时忽略）"""
+        try:
+            self.redis.xgroup_create(self.stream_key, self.consumer_group, id='0', mkstream=True)
+        except ResponseError as e:
+            if 'BUSYGROUP' not in str(e):
+                raise
+
+    def read_price_batch(self, consumer: str, batch_size: int = 100,
+                         claim_idle_ms: int = PRICE_STREAM_CLAIM_IDLE_MS) -> Tuple[List, List[Dict]]:
+        """
+        从价格Stream读取一批待持久化的价格。
+
+        先用XAUTOCLAIM认领空闲超时的pending消息（上一个持久化进程崩溃时未确认的批次），
+        不足部分再用XREADGROUP读取新消息。处理成功后必须调用 ack_prices 确认，
+        未确认的消息会在 claim_idle_ms 之后被重新投递（至少一次语义）。
+
+        Returns:
+            (消息ID列表, 价格数据列表)
+        """
+        try:
+            entries = []
+            claimed = self.redis.xautoclaim(self.stream_key, self.consumer_group, consumer,
+                                            min_idle_time=claim_idle_ms, start_id='0-0', count=batch_size)
+            entries.extend(claimed[1])
+            if entries:
+                logger.warning(f"认领 {len(entries)} 个未确认的价格消息")
+            if len(entries) < batch_size:
+                response = self.redis.xreadgroup(self.consumer_group, consumer, {self.stream_key: '>'},
+                                                 count=batch_size - len(entries))
+                for _, messages in response or []:
+                    entries.extend(messages)
+
+            entry_ids, prices = [], []
+            for entry_id, fields in entries:
+                entry_ids.append(entry_id)
+                # 已被裁剪掉的消息 fields 为空，只需确认
+                data = (fields or {}).get(b'data') or (fields or {}).get('data')
+                if not data:
+                    continue
+                try:
+                    prices.append(json.loads(data))
+                except json.JSONDecodeError:
+                    continue
+
+            if entry_ids:
+                logger.debug(f"从Stream获取 {len(prices)} 个价格数据")
+            return entry_ids, prices
+
+        except Exception as e:
+            logger.error(f"从Stream获取价格失败: {e}")
+            return [], []
+
+    def ack_prices(self, entry_ids: List) -> None:
+        """确认并删除已持久化的消息"""
+        if not entry_ids:
+            return
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.xack(self.stream_key, self.consumer_group, *entry_ids)
+        pipe.xdel(self.stream_key, *entry_ids)
+        pipe.execute()
     
     def get_best_price(self, base_asset: str) -> Optional[Dict]:
         """获取资产的最优价格"""
@@ -166,41 +316,40 @@ class PriceRedisService:
             return None
     
     def get_queue_size(self) -> int:
-        """获取队列大小"""
+        """获取待持久化的价格数量（Stream中未确认的消息 + 旧版队列遗留数据）"""
         try:
-            return self.redis.llen(self.queue_key)
+            pipe = self.redis.pipeline(transaction=False)
+            pipe.xlen(self.stream_key)
+            pipe.llen(self.queue_key)
+            return sum(pipe.execute())
         except Exception as e:
             logger.error(f"获取队列大小失败: {e}")
             return 0
     
     def clear_old_prices(self, hours: int = 2):
-        """清理过期的价格数据"""
+        """
+        清理过期的价格数据。
+
+        只按索引zset的score取出超过 hours 未更新的key分批删除，开销与过期数量成正比。
+        """
         try:
-            current_time = time.time()
-            cutoff_time = current_time - (hours * 3600)
-            
-            # 获取所有价格keys
-            pattern = f"{self.raw_price_prefix}*"
-            keys = self.redis.keys(pattern)
-            
+            cutoff_time = time.time() - (hours * 3600)
             deleted_count = 0
-            
-            for key in keys:
-                try:
-                    data = self.redis.get(key)
-                    if data:
-                        price_data = json.loads(data)
-                        timestamp = price_data.get('timestamp', 0)
-                        
-                        if timestamp < cutoff_time:
-                            self.redis.delete(key)
-                            deleted_count += 1
-                except (json.JSONDecodeError, KeyError):
-                    # 删除无效数据
-                    self.redis.delete(key)
-                    deleted_count += 1
-            
+
+            while True:
+                keys = self.redis.zrangebyscore(self.index_key, '-inf', cutoff_time, start=0, num=INDEX_CLEANUP_CHUNK)
+                if not keys:
+                    break
+                pipe = self.redis.pipeline(transaction=False)
+                pipe.delete(*keys)
+                pipe.zrem(self.index_key, *keys)
+                pipe.execute()
+                deleted_count += len(keys)
+                if len(keys) < INDEX_CLEANUP_CHUNK:
+                    break
+
             if deleted_count > 0:
+                self.redis.hincrby(self.stats_key, 'expired', deleted_count)
                 logger.info(f"清理了 {deleted_count} 个过期价格数据")
             
             return deleted_count
@@ -212,15 +361,34 @@ class PriceRedisService:
     def get_stats(self) -> Dict:
         """获取Redis统计信息"""
         try:
+            now = time.time()
+            pipe = self.redis.pipeline(transaction=False)
+            pipe.zcount(self.index_key, now - BEST_PRICE_TTL, '+inf')
+            pipe.zcard(self.index_key)
+            pipe.hgetall(self.stats_key)
+            live_keys, indexed_keys, counters = pipe.execute()
+            counters = {
+                (k.decode() if isinstance(k, bytes) else k): (v.decode() if isinstance(v, bytes) else v)
+                for k, v in counters.items()
+            }
+            writes = int(counters.get('best_price_writes', 0))
+            suppressed = int(counters.get('suppressed', 0))
+            # 由Redis中的计数计算，采集进程之外（如persist_prices）读取也准确
+            total = writes + suppressed
             return {
                 'queue_size': self.get_queue_size(),
-                'best_price_cache_keys': len(self.redis.keys(f"{self.best_price_prefix}*")),
-                'redis_memory_usage': self.redis.info().get('used_memory_human', 'unknown')
+                'best_price_cache_keys': live_keys,
+                'indexed_keys': indexed_keys,
+                'best_price_writes': writes,
+                'expired': int(counters.get('expired', 0)),
+                'suppressed': suppressed,
+                'suppression_ratio': round(suppressed / total, 4) if total else 0.0,
+                'last_write': float(counters.get('last_write', 0)),
+                'redis_memory_usage': self.redis.info('memory').get('used_memory_human', 'unknown')
             }
         except Exception as e:
             logger.error(f"获取Redis统计失败: {e}")
             return {}
 
-
 # 全局实例
 redis_service = PriceRedisService()
\ No newline at end of file
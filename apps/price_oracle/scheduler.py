@@ -3,10 +3,11 @@
 
 import asyncio
 import time
-from typing import Dict, Set, Callable
+from typing import Dict, Set, Callable, Optional
 from dataclasses import dataclass, field
 from collections import deque
 from common.helpers import getLogger
+from apps.price_oracle.scheduler_policy import SchedulerPolicy
 
 logger = getLogger(__name__)
 
@@ -16,8 +17,8 @@ class ExchangeTask:
     """单个交易所的任务状态"""
     name: str
     
-    # 响应时间统计
-    response_times: deque = field(default_factory=lambda: deque(maxlen=5))
+    # 响应时间统计（用于计算百分位数）
+    response_times: deque = field(default_factory=lambda: deque(maxlen=50))
     avg_response_time: float = 0.0
     
     # 调度状态
@@ -40,21 +41,11 @@ class ExchangeTask:
         if self.response_times:
             self.avg_response_time = sum(self.response_times) / len(self.response_times)
     
-    def calculate_next_interval(self) -> float:
-        """动态计算下次执行间隔"""
-        if not self.response_times:
-            return self.current_interval
-        
-        # 基础间隔 = 响应时间 * 1.15 (给一些缓冲)
-        base_interval = max(self.avg_response_time * 1.15, self.min_interval)
-        
-        # 失败惩罚
-        if self.consecutive_failures > 0:
-            penalty = min(self.consecutive_failures * 5, 60)
-            base_interval += penalty
-        
-        # 限制范围
-        self.current_interval = min(max(base_interval, self.min_interval), self.max_interval)
+    def calculate_next_interval(self, policy: SchedulerPolicy, change_rate: Optional[float] = None) -> float:
+        """根据学习到的调度策略计算下次执行间隔"""
+        self.current_interval = policy.update(
+            self.name, list(self.response_times), change_rate, self.consecutive_failures
+        )
         return self.current_interval
     
     def get_next_run_time(self) -> float:
@@ -65,43 +56,31 @@ class ExchangeTask:
 class IndependentScheduler:
     """每个交易所独立调度"""
     
-    def __init__(self, exchanges: list, collect_func: Callable):
+    def __init__(self, exchanges: list, collect_func: Callable,
+                 change_rate_func: Optional[Callable[[str], Optional[float]]] = None):
+        """
+        Args:
+            exchanges: 交易所列表
+            collect_func: 采集协程函数，参数为交易所名，返回保存的价格数量
+            change_rate_func: 返回交易所最近一次采集价格变化比例的函数，用于调整间隔
+        """
         self.exchanges = exchanges
         self.collect_func = collect_func
+        self.change_rate_func = change_rate_func
         self.tasks: Dict[str, ExchangeTask] = {}
         self.running = False
         
-        # 初始化每个交易所任务
+        # 从持久化的调度策略恢复每个交易所的间隔
+        self.policy = SchedulerPolicy()
+        self.policy.load(exchanges)
         for exchange in exchanges:
+            learned = self.policy.get(exchange)
             self.tasks[exchange] = ExchangeTask(
                 name=exchange,
-                min_interval=self._get_min_interval(exchange),
-                max_interval=self._get_max_interval(exchange),
-                current_interval=self._get_initial_interval(exchange)
+                min_interval=learned.min_interval,
+                current_interval=learned.interval
             )
     
-    def _get_min_interval(self, exchange: str) -> float:
-        """获取最小间隔"""
-        tier1 = ['binance', 'okx', 'bybit', 'coinbase']
-        return 3.0 if exchange in tier1 else 5.0
-    
-    def _get_max_interval(self, exchange: str) -> float:
-        """获取最大间隔"""
-        slow_exchanges = ['yobit', 'latoken', 'gate', 'mexc']
-        return 120.0 if exchange in slow_exchanges else 60.0
-    
-    def _get_initial_interval(self, exchange: str) -> float:
-        """获取初始间隔"""
-        tier1 = ['binance', 'okx', 'bybit', 'coinbase']
-        tier2 = ['bitget', 'kucoin', 'cryptocom', 'htx', 'kraken']
-        
-        if exchange in tier1:
-            return 3.0
-        elif exchange in tier2:
-            return 5.0
-        else:
-            return 10.0
-    
     async def _exchange_worker(self, exchange: str):
         """单个交易所的独立工作循环"""
         task = self.tasks[exchange]
@@ -158,7 +137,9 @@ class IndependentScheduler:
                 task.consecutive_failures += 1
             
             # 重新计算间隔
-            task.calculate_next_interval()
+            change_rate = self.change_rate_func(exchange) if success and self.change_rate_func else None
+            task.calculate_next_interval(self.policy, change_rate)
+            task.min_interval = self.policy.get(exchange).min_interval
             task.is_running = False
             
             logger.debug(f"📊 {exchange}: 平均 {task.avg_response_time:.1f}s, 下次间隔 {task.current_interval:.1f}s")
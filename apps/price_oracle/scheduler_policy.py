@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import json
+import math
+import time
+from dataclasses import asdict, dataclass, field
+from typing import Dict, List, Optional
+
+import ccxt
+
+from common.helpers import getLogger
+from common.redis_client import local_redis
+
+logger = getLogger(__name__)
+
+POLICY_KEY = "price_oracle:scheduler_policy"  # hash: exchange -> 策略JSON
+
+# 全局调度范围（秒）
+MIN_INTERVAL = 3.0
+MAX_INTERVAL = 120.0
+DEFAULT_INTERVAL = 10.0
+
+# 响应时间缓冲：下次间隔不低于 p90 响应时间的 1.15 倍
+RESPONSE_BUFFER = 1.15
+# 每次采集大约消耗的请求数（load_markets + fetch_tickers），以及允许占用的限频预算比例
+REQUESTS_PER_COLLECT = 2
+RATE_BUDGET_SHARE = 0.5
+# 希望每次采集时大约有这么多比例的价格发生变化；变化越少的交易所轮询越慢
+TARGET_CHANGE_RATIO = 0.3
+# 价格变化率的指数平滑系数，以及价格完全不变时的退避倍数
+CHANGE_RATE_ALPHA = 0.3
+NO_CHANGE_BACKOFF = 1.5
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """最近邻法百分位数"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, math.ceil(pct / 100 * len(ordered)) - 1)
+    return ordered[index]
+
+
+@dataclass
+class ExchangePolicy:
+    """单个交易所学习到的调度参数"""
+    exchange: str
+    interval: float = DEFAULT_INTERVAL
+    response_p50: float = 0.0
+    response_p90: float = 0.0
+    change_rate: Optional[float] = None  # 每次采集价格发生变化的比例（平滑后）
+    rate_limit_ms: float = 0.0
+    samples: int = 0
+    updated_at: float = field(default_factory=time.time)
+
+    @property
+    def min_interval(self) -> float:
+        """响应时间和限频预算共同决定的下限"""
+        response_floor = self.response_p90 * RESPONSE_BUFFER
+        rate_floor = REQUESTS_PER_COLLECT * self.rate_limit_ms / 1000 / RATE_BUDGET_SHARE
+        return max(MIN_INTERVAL, response_floor, rate_floor)
+
+
+class SchedulerPolicy:
+    """
+    交易所采集间隔策略。
+
+    根据实测响应时间百分位数、ccxt限频预算和价格变化率为每个交易所计算采集间隔，
+    结果保存在Redis中，进程重启后从上一次学习到的间隔开始，而不是依赖写死的交易所分级。
+    """
+
+    def __init__(self, redis_client=None):
+        self.redis = redis_client or local_redis()
+        self.policies: Dict[str, ExchangePolicy] = {}
+
+    def load(self, exchanges: List[str]) -> None:
+        try:
+            stored = self.redis.hmget(POLICY_KEY, exchanges) if exchanges else []
+        except Exception as e:
+            logger.warning(f"读取调度策略失败，使用默认值: {e}")
+            stored = [None] * len(exchanges)
+
+        for exchange, data in zip(exchanges, stored):
+            policy = None
+            if data:
+                try:
+                    policy = ExchangePolicy(**json.loads(data))
+                except (TypeError, ValueError):
+                    policy = None
+            if policy is None:
+                policy = ExchangePolicy(exchange=exchange)
+            policy.rate_limit_ms = self._get_rate_limit(exchange)
+            self.policies[exchange] = policy
+            logger.debug(f"{exchange}: 初始间隔 {policy.interval:.1f}s (样本 {policy.samples})")
+
+    def get(self, exchange: str) -> ExchangePolicy:
+        if exchange not in self.policies:
+            self.load([exchange])
+        return self.policies[exchange]
+
+    @staticmethod
+    def _get_rate_limit(exchange: str) -> float:
+        try:
+            return float(getattr(ccxt, exchange)().rateLimit or 0)
+        except Exception:
+            return 0.0
+
+    def update(self, exchange: str, response_times: List[float], change_rate: Optional[float],
+               consecutive_failures: int = 0) -> float:
+        """
+        根据最近一次采集的观测值重新计算间隔并持久化。
+
+        Args:
+            response_times: 最近的成功响应时间（秒）
+            change_rate: 本次采集中价格发生变化的比例，None表示没有可比较的数据
+            consecutive_failures: 连续失败次数
+
+        Returns:
+            下次采集间隔（秒）
+        """
+        policy = self.get(exchange)
+        if response_times:
+            policy.response_p50 = percentile(response_times, 50)
+            policy.response_p90 = percentile(response_times, 90)
+
+        interval = policy.interval
+        if change_rate is not None:
+            policy.change_rate = change_rate if policy.change_rate is None else (
+                CHANGE_RATE_ALPHA * change_rate + (1 - CHANGE_RATE_ALPHA) * policy.change_rate
+            )
+            if policy.change_rate > 0:
+                # 变化率近似与间隔成正比，按目标变化比例缩放间隔
+                interval = interval * TARGET_CHANGE_RATIO / policy.change_rate
+            else:
+                interval = interval * NO_CHANGE_BACKOFF
+            # 单次调整幅度限制在 0.5x ~ 2x，避免抖动
+            interval = min(max(interval, policy.interval / 2), policy.interval * 2)
+
+        policy.interval = min(max(interval, policy.min_interval), MAX_INTERVAL)
+        policy.samples += 1
+        policy.updated_at = time.time()
+        self._save(policy)
+
+        # 失败惩罚只影响本次等待，不写入学习到的间隔
+        if consecutive_failures > 0:
+            return min(policy.interval + min(consecutive_failures * 5, 60), MAX_INTERVAL)
+        return policy.interval
+
+    def _save(self, policy: ExchangePolicy) -> None:
+        try:
+            self.redis.hset(POLICY_KEY, policy.exchange, json.dumps(asdict(policy)))
+        except Exception as e:
+            logger.debug(f"保存调度策略失败 {policy.exchange}: {e}")
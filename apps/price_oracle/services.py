@@ -1,12 +1,13 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+from datetime import datetime, timedelta, timezone as dt_timezone
 from decimal import Decimal
 from typing import Dict, List, Optional
 
-from django.db import transaction
+from django.conf import settings
+from django.db import connection, transaction
 from django.utils import timezone
-from datetime import timedelta
 
 from apps.price_oracle.models import AssetPrice
 from common.helpers import getLogger
@@ -14,155 +15,98 @@ from common.helpers import getLogger
 logger = getLogger(__name__)
 
 
+# 单条INSERT ... ON CONFLICT语句包含的行数，可用 benchmark_price_upsert 命令测量后通过配置调整
+PRICE_UPSERT_CHUNK_SIZE = getattr(settings, 'PRICE_UPSERT_CHUNK_SIZE', 1000)
+
+UPSERT_COLUMNS = [
+    'base_asset', 'symbol', 'quote_asset', 'exchange', 'price', 'price_change_24h', 'volume_24h',
+    'exchange_priority', 'quote_priority', 'price_timestamp', 'created_at', 'updated_at',
+]
+UPDATE_COLUMNS = [c for c in UPSERT_COLUMNS if c not in ('base_asset', 'created_at')]
+
+
 class PriceService:
-    def save_prices_to_db_batch(self, prices: List[Dict]) -> int:
-        """批量保存价格数据到数据库"""
-        if not prices:
-            return 0
+    def upsert_prices(self, prices: List[Dict], chunk_size: Optional[int] = None) -> int:
+        """
+        AssetPrice 唯一的持久化入口。
 
-        try:
-            # 预处理数据
-            update_records = []
-            create_records = []
-            existing_assets = set()
-
-            # 获取已存在的资产
-            price_assets = [p.get('base_asset', '').upper() for p in prices if p.get('base_asset')]
-            if price_assets:
-                existing_assets = set(
-                    AssetPrice.objects.filter(
-                        base_asset__in=price_assets
-                    ).values_list('base_asset', flat=True)
-                )
+        同一批次中相同 base_asset 只保留时间戳最新的一条，然后每 chunk_size 行执行一次
+        INSERT ... ON CONFLICT (base_asset) DO UPDATE，并且只有新数据的 price_timestamp
+        比库中更新时才覆盖，乱序或重复投递的旧价格不会覆盖较新的价格。
 
-            # 分离更新和创建
-            for price_data in prices:
-                base_asset = price_data.get('base_asset', '').upper()
-                if not base_asset:
-                    continue
-
-                record_data = {
-                    'base_asset': base_asset,
-                    'symbol': price_data.get('symbol', ''),
-                    'quote_asset': price_data.get('quote_asset', ''),
-                    'exchange': price_data.get('exchange', ''),
-                    'price': self._safe_decimal(price_data.get('price')),
-                    'price_change_24h': self._safe_decimal(price_data.get('price_change_24h')),
-                    'volume_24h': self._safe_decimal(price_data.get('volume_24h')),
-                    'exchange_priority': price_data.get('exchange_priority', 999),
-                    'quote_priority': price_data.get('quote_priority', 999),
-                    'price_timestamp': timezone.now(),
-                }
-
-                if base_asset in existing_assets:
-                    update_records.append(record_data)
-                else:
-                    create_records.append(AssetPrice(**record_data))
-
-            saved_count = 0
-
-            with transaction.atomic():
-                # 批量创建新记录
-                if create_records:
-                    AssetPrice.objects.bulk_create(
-                        create_records,
-                        batch_size=1000,
-                        ignore_conflicts=True
-                    )
-                    saved_count += len(create_records)
-                    logger.debug(f"批量创建 {len(create_records)} 条新记录")
-
-                # 批量更新现有记录
-                if update_records:
-                    for record in update_records:
-                        AssetPrice.objects.filter(
-                            base_asset=record['base_asset']
-                        ).update(**{k: v for k, v in record.items() if k != 'base_asset'})
-                    saved_count += len(update_records)
-                    logger.debug(f"批量更新 {len(update_records)} 条记录")
-
-            if saved_count > 0:
-                logger.info(f"批量保存 {saved_count} 个价格到数据库")
-
-            return saved_count
+        Returns:
+            实际插入或更新的行数（旧价格被跳过时不计入）
 
-        except Exception as e:
-            logger.error(f"批量保存价格失败: {e}")
+        Raises:
+            数据库异常原样抛出，由调用方决定是否重试
+        """
+        if not prices:
             return 0
 
-    def save_prices_to_db_upsert(self, prices: List[Dict]) -> int:
-        """使用UPSERT操作"""
-        if not prices:
+        latest: Dict[str, Dict] = {}
+        for price_data in prices:
+            base_asset = price_data.get('base_asset', '').upper()
+            if not base_asset:
+                continue
+            existing = latest.get(base_asset)
+            if existing is None or price_data.get('timestamp', 0) > existing.get('timestamp', 0):
+                latest[base_asset] = price_data
+
+        if not latest:
             return 0
 
-        try:
-            # 预处理数据，去重（同一批次中如果有多个相同base_asset，只保留最优的）
-            deduplicated_prices = {}
-
-            for price_data in prices:
-                base_asset = price_data.get('base_asset', '').upper()
-                if not base_asset:
-                    continue
-
-                # 如果已存在相同base_asset，比较优先级（更小的优先级更好）
-                if base_asset in deduplicated_prices:
-                    existing = deduplicated_prices[base_asset]
-                    current_exchange_priority = price_data.get('exchange_priority', 999)
-                    current_quote_priority = price_data.get('quote_priority', 999)
-
-                    existing_exchange_priority = existing.get('exchange_priority', 999)
-                    existing_quote_priority = existing.get('quote_priority', 999)
-
-                    # 先比较交易所优先级，再比较报价货币优先级
-                    if (current_exchange_priority < existing_exchange_priority or
-                            (current_exchange_priority == existing_exchange_priority and
-                             current_quote_priority < existing_quote_priority)):
-                        deduplicated_prices[base_asset] = price_data
-                else:
-                    deduplicated_prices[base_asset] = price_data
-
-            if not deduplicated_prices:
-                return 0
-
-            # 创建记录对象
-            upsert_records = []
-            for price_data in deduplicated_prices.values():
-                record = AssetPrice(
-                    base_asset=price_data.get('base_asset', '').upper(),
-                    symbol=price_data.get('symbol', ''),
-                    quote_asset=price_data.get('quote_asset', ''),
-                    exchange=price_data.get('exchange', ''),
-                    price=self._safe_decimal(price_data.get('price')),
-                    price_change_24h=self._safe_decimal(price_data.get('price_change_24h')),
-                    volume_24h=self._safe_decimal(price_data.get('volume_24h')),
-                    exchange_priority=price_data.get('exchange_priority', 999),
-                    quote_priority=price_data.get('quote_priority', 999),
-                    price_timestamp=timezone.now(),
-                )
-                upsert_records.append(record)
-
-            # PostgreSQL UPSERT 操作
-            with transaction.atomic():
-                AssetPrice.objects.bulk_create(
-                    upsert_records,
-                    update_conflicts=True,
-                    update_fields=[
-                        'symbol', 'quote_asset', 'exchange', 'price',
-                        'price_change_24h', 'volume_24h', 'exchange_priority',
-                        'quote_priority', 'price_timestamp'
-                    ],
-                    unique_fields=['base_asset'],
-                    batch_size=2000
+        now = timezone.now()
+        rows = [self._to_row(base_asset, price_data, now) for base_asset, price_data in latest.items()]
+        chunk_size = chunk_size or PRICE_UPSERT_CHUNK_SIZE
+        table = AssetPrice._meta.db_table
+        placeholders = '(' + ', '.join(['%s'] * len(UPSERT_COLUMNS)) + ')'
+        update_sql = ', '.join(f"{c} = EXCLUDED.{c}" for c in UPDATE_COLUMNS)
+
+        saved_count = 0
+        with transaction.atomic(), connection.cursor() as cursor:
+            for i in range(0, len(rows), chunk_size):
+                chunk = rows[i:i + chunk_size]
+                sql = (
+                    f"INSERT INTO {table} ({', '.join(UPSERT_COLUMNS)}) "
+                    f"VALUES {', '.join([placeholders] * len(chunk))} "
+                    f"ON CONFLICT (base_asset) DO UPDATE SET {update_sql} "
+                    f"WHERE {table}.price_timestamp < EXCLUDED.price_timestamp"
                 )
+                cursor.execute(sql, [value for row in chunk for value in row])
+                saved_count += cursor.rowcount
+
+        logger.info(f"UPSERT操作保存 {saved_count} 个价格到数据库 (去重后 {len(prices)}->{len(rows)})")
+        return saved_count
+
+    def _to_row(self, base_asset: str, price_data: Dict, now: datetime) -> List:
+        timestamp = price_data.get('timestamp')
+        price_timestamp = datetime.fromtimestamp(timestamp, tz=dt_timezone.utc) if timestamp else now
+        return [
+            base_asset,
+            price_data.get('symbol', ''),
+            price_data.get('quote_asset', ''),
+            price_data.get('exchange', ''),
+            self._safe_decimal(price_data.get('price')),
+            self._safe_decimal(price_data.get('price_change_24h')),
+            self._safe_decimal(price_data.get('volume_24h')),
+            price_data.get('exchange_priority', 999),
+            price_data.get('quote_priority', 999),
+            price_timestamp,
+            now,
+            now,
+        ]
 
-            saved_count = len(upsert_records)
-            logger.info(f"UPSERT操作保存 {saved_count} 个价格到数据库 (去重后 {len(prices)}->{saved_count})")
-            return saved_count
+    def save_prices_to_db_batch(self, prices: List[Dict]) -> int:
+        """批量保存价格数据到数据库"""
+        return self.save_prices_to_db_upsert(prices)
 
+    def save_prices_to_db_upsert(self, prices: List[Dict]) -> int:
+        """使用UPSERT操作，失败时返回0"""
+        try:
+            return self.upsert_prices(prices)
         except Exception as e:
             logger.error(f"UPSERT保存价格失败: {e}")
-            # 回退到批量操作
-            return self.save_prices_to_db_batch(prices)
+            return 0
 
     def _safe_decimal(self, value) -> Decimal:
         """安全转换为Decimal类型"""
@@ -1,28 +1,41 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
-from django.views.decorators.cache import cache_page
-from apps.price_oracle.services import price_service
+from django.views.decorators.http import require_http_methods
+
+from apps.price_oracle import price_reader
 from common.helpers import ok_json, error_json
 
 
-@cache_page(2)
+@require_http_methods(["GET"])
 def get_price(request):
-    base_asset = request.GET.get('symbol')
-    if not base_asset:
-        return error_json("参数symbol是必须的", code=400, status=400)
+    """
+    资产最优价格，优先读Redis，未命中时回退到只读副本。
+
+    ?symbol=BTC        返回单个资产价格
+    ?symbols=BTC,ETH   批量返回 {资产: 价格}，未找到的资产放在 missing 中
+    """
+    raw = request.GET.get('symbols') or request.GET.get('symbol')
+    if not raw:
+        return error_json("参数symbol或symbols是必须的", code=400, status=400)
+    assets = price_reader.normalize_assets(raw)
+    if not assets:
+        return error_json("参数symbol或symbols是必须的", code=400, status=400)
+    if len(assets) > price_reader.MAX_ASSETS_PER_REQUEST:
+        return error_json(f"单次最多查询 {price_reader.MAX_ASSETS_PER_REQUEST} 个资产", code=400, status=400)
+
     try:
-        price_obj = price_service.get_asset_price(base_asset)
-        if not price_obj:
-            return error_json(f"未找到 {base_asset.upper()} 的价格数据", code=404, status=404)
-        data = {
-            'base_asset': price_obj.base_asset,
-            'exchange': price_obj.exchange,
-            'price': float(price_obj.price),
-            'price_change_24h': float(price_obj.price_change_24h) if price_obj.price_change_24h else None,
-            'volume_24h': float(price_obj.volume_24h) if price_obj.volume_24h else None,
-            'timestamp': price_obj.price_timestamp.isoformat(),
-        }
-        return ok_json(data)
+        prices = price_reader.get_prices(assets)
     except Exception as e:
-        return error_json(f"服务器内部错误，{e}", code=500, status=500)
\ No newline at end of file
+        return error_json(f"服务器内部错误，{e}", code=500, status=500)
+
+    if 'symbols' not in request.GET:
+        data = prices.get(assets[0])
+        if not data:
+            return error_json(f"未找到 {assets[0]} 的价格数据", code=404, status=404)
+        return ok_json(data)
+
+    return ok_json({
+        'prices': prices,
+        'missing': [asset for asset in assets if asset not in prices],
+    })
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import time
+from typing import Any, Dict, Optional, Tuple
+
+from django.conf import settings
+
+from common.helpers import getLogger
+
+logger = getLogger(__name__)
+
+DEFAULT_PRICE_CHANGE_THRESHOLD = 0.0005  # 相对变化 5bp
+DEFAULT_PRICE_HEARTBEAT = 60  # 秒，必须小于下游key的过期时间
+REPORT_INTERVAL = 60  # 秒
+
+
+class PriceChangeFilter:
+    """
+    价格变化检测。
+
+    在内存中记录每个key最近一次发布的价格，只有相对变化超过阈值，
+    或距离上次发布超过心跳时间时才需要重新写入，其余更新被抑制。
+    """
+
+    def __init__(self, name: str, threshold: Optional[float] = None, heartbeat: Optional[float] = None):
+        self.name = name
+        self.threshold = threshold if threshold is not None else getattr(
+            settings, 'PRICE_CHANGE_THRESHOLD', DEFAULT_PRICE_CHANGE_THRESHOLD)
+        self.heartbeat = heartbeat if heartbeat is not None else getattr(
+            settings, 'PRICE_HEARTBEAT_SECONDS', DEFAULT_PRICE_HEARTBEAT)
+        self._published: Dict[str, Tuple[float, float]] = {}  # key -> (price, published_at)
+        self.seen = 0
+        self.published = 0
+        self._window_seen = 0
+        self._window_published = 0
+        self._last_report = time.time()
+
+    def should_publish(self, key: str, price: Any, now: Optional[float] = None) -> bool:
+        """判断 key 的新价格是否需要发布，需要发布时同时记为已发布"""
+        now = now or time.time()
+        self.seen += 1
+        self._window_seen += 1
+        try:
+            value = float(price)
+        except (TypeError, ValueError):
+            value = None
+
+        last = self._published.get(key)
+        if value is not None and last is not None:
+            last_price, published_at = last
+            moved = abs(value - last_price) > abs(last_price) * self.threshold
+            if not moved and now - published_at < self.heartbeat:
+                self._maybe_report(now)
+                return False
+
+        if value is not None:
+            self._published[key] = (value, now)
+        self.published += 1
+        self._window_published += 1
+        self._maybe_report(now)
+        return True
+
+    def forget(self, key: str) -> None:
+        """写入失败时调用，保证下次一定重新发布"""
+        self._published.pop(key, None)
+
+    @property
+    def suppression_ratio(self) -> float:
+        return 1 - self.published / self.seen if self.seen else 0.0
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'seen': self.seen,
+            'published': self.published,
+            'suppressed': self.seen - self.published,
+            'suppression_ratio': round(self.suppression_ratio, 4),
+        }
+
+    def _maybe_report(self, now: float) -> None:
+        if now - self._last_report < REPORT_INTERVAL or not self._window_seen:
+            return
+        ratio = 1 - self._window_published / self._window_seen
+        logger.info(f"{self.name}: 最近 {now - self._last_report:.0f}s 收到 {self._window_seen} 个价格，"
+                    f"发布 {self._window_published} 个，抑制率 {ratio:.1%}")
+        self._window_seen = 0
+        self._window_published = 0
+        self._last_report = now
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import threading
+import time
+from typing import Any, Dict, Optional
+
+import ntplib
+from django.conf import settings
+
+from common.helpers import getLogger
+from common.redis_client import local_redis
+
+logger = getLogger(__name__)
+
+CLOCK_OFFSET_METRIC_KEY = 'metrics:clock:ntp_offset'
+DEFAULT_NTP_TIME_SERVER = 'pool.ntp.org'
+DEFAULT_NTP_SYNC_INTERVAL = 300  # 秒
+CLOCK_DRIFT_WARNING_MS = 500
+
+
+class ClockOffsetService:
+    """
+    NTP时钟偏移服务。
+
+    在后台线程中定期向 NTP_TIME_SERVER 测量本机时钟偏移并缓存，
+    解析器只需调用 now_ms() 读取本地时间加偏移，不会在事件循环中发起网络请求。
+    NTP不可用时偏移保持上一次的测量值（初始为0），即退化为本机时间。
+    """
+
+    def __init__(self, server: Optional[str] = None, interval: Optional[float] = None):
+        self.server = server or getattr(settings, 'NTP_TIME_SERVER', DEFAULT_NTP_TIME_SERVER)
+        self.interval = interval or getattr(settings, 'NTP_SYNC_INTERVAL', DEFAULT_NTP_SYNC_INTERVAL)
+        self.offset = 0.0  # 秒，NTP时间 - 本机时间
+        self.drift = 0.0  # 秒，相邻两次测量的偏移变化
+        self.last_sync: Optional[float] = None
+        self.sync_failures = 0
+        self._thread: Optional[threading.Thread] = None
+        self._stop_event = threading.Event()
+        self._lock = threading.Lock()
+
+    def now_ms(self) -> int:
+        """返回经NTP偏移校正后的当前毫秒时间戳"""
+        if self._thread is None:
+            self.start()
+        return int((time.time() + self.offset) * 1000)
+
+    def refresh(self) -> bool:
+        """同步测量一次NTP偏移（阻塞调用，只应在后台线程中执行）"""
+        try:
+            response = ntplib.NTPClient().request(self.server, timeout=5)
+        except Exception as e:
+            self.sync_failures += 1
+            logger.warning(f"NTP offset measurement against {self.server} failed ({self.sync_failures} in a row): {e}")
+            self._export_metrics()
+            return False
+
+        if self.last_sync is not None:
+            self.drift = response.offset - self.offset
+        self.offset = response.offset
+        self.last_sync = time.time()
+        self.sync_failures = 0
+        if abs(self.drift) * 1000 > CLOCK_DRIFT_WARNING_MS:
+            logger.warning(f"Clock drift {self.drift * 1000:.1f} ms since last NTP sync (offset {self.offset * 1000:.1f} ms)")
+        self._export_metrics()
+        return True
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            'server': self.server,
+            'offset_ms': round(self.offset * 1000, 3),
+            'drift_ms': round(self.drift * 1000, 3),
+            'last_sync': self.last_sync or 0,
+            'sync_failures': self.sync_failures,
+        }
+
+    def _export_metrics(self) -> None:
+        try:
+            local_redis().hset(CLOCK_OFFSET_METRIC_KEY, mapping=self.metrics())
+        except Exception as e:
+            logger.debug(f"Export clock offset metrics failed: {e}")
+
+    def _run(self) -> None:
+        while not self._stop_event.is_set():
+            self.refresh()
+            self._stop_event.wait(self.interval)
+
+    def start(self) -> None:
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._stop_event.clear()
+            self._thread = threading.Thread(target=self._run, name='ntp-clock-offset', daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        self._thread = None
+
+
+# 全局实例
+clock = ClockOffsetService()
+
+
+def now_ms() -> int:
+    return clock.now_ms()
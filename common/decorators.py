@@ -1,4 +1,4 @@
-import time
+import asyncio
 from functools import wraps
 from typing import Callable
 
@@ -38,7 +38,7 @@ def retry_on() -> Callable:
                     if retry < max_retry:
                         logger.warning('%s, proceed to retry.', e)
                         retry += 1
-                        time.sleep(1)
+                        await asyncio.sleep(1)
                         continue
                     else:
                         raise e
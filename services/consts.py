@@ -0,0 +1,19 @@
+# encoding=utf-8
+
+# market.proto 由外部仓库维护，流式方法不在生成代码中，复用 SymbolPriceRequest/SymbolPriceResponse 单独注册
+PRICE_SERVICE_NAME = 'dapplink.market.PriceService'
+STREAM_SYMBOL_PRICES_METHOD = 'streamSymbolPrices'
+
+# 可选过滤条件通过请求元数据传递，SymbolPriceRequest 只有 exchange_id / symbol_id
+EXCHANGE_NAME_METADATA = 'x-exchange-name'
+QUOTE_ASSET_METADATA = 'x-quote-asset'
+
+# 参考数据快照版本，类似 HTTP 的 ETag / If-None-Match
+SNAPSHOT_VERSION_METADATA = 'x-snapshot-version'
+IF_NONE_MATCH_METADATA = 'x-if-none-match'
+NOT_MODIFIED_METADATA = 'x-not-modified'
+
+# 客户端长连接的保活间隔；服务端必须允许同样频率的空闲ping，否则会以 too_many_pings 关闭连接
+KEEPALIVE_TIME_MS = 30000
+KEEPALIVE_TIMEOUT_MS = 10000
+
@@ -1,149 +1,192 @@
 # encoding=utf-8
 
-from typing import List
+from typing import Iterator, List
 
+import grpc
 import pytz
 from django.conf import settings
 
-from apps.backoffice.models import MgObPersistence, TradingPair, OtcAssetPrice
+from apps.backoffice.models import MgObPersistence, OtcAssetPrice
 from common.helpers import getLogger
 from apps.exchange.models import Exchange, Market, MarketStatusChoices, Asset
+from services.consts import (
+    EXCHANGE_NAME_METADATA, IF_NONE_MATCH_METADATA, KEEPALIVE_TIME_MS, NOT_MODIFIED_METADATA, PRICE_SERVICE_NAME,
+    QUOTE_ASSET_METADATA, SNAPSHOT_VERSION_METADATA, STREAM_SYMBOL_PRICES_METHOD
+)
 from services.savourrpc import market_pb2_grpc, common_pb2, market_pb2
+from services.snapshots import snapshot_cache
 
 logger = getLogger(__name__)
 
 tz = pytz.timezone(settings.TIME_ZONE)
 
+# 流式返回时每条消息包含的价格数量，同时作为数据库游标的批大小
+SYMBOL_PRICE_CHUNK_SIZE = getattr(settings, 'GRPC_SYMBOL_PRICE_CHUNK_SIZE', 500)
+
+
+def symbol_price_queryset(request, context):
+    """
+    按请求过滤价格，交易对、基础/计价资产和交易所在同一个JOIN查询中取出
+
+    过滤条件: exchange_id, symbol_id（请求字段），交易所名称和计价资产（请求元数据）
+    """
+    queryset = MgObPersistence.objects.select_related(
+        'symbol__base_asset', 'symbol__quote_asset', 'exchange'
+    ).order_by("-id")
+    if request.exchange_id and int(request.exchange_id):
+        queryset = queryset.filter(exchange_id=int(request.exchange_id))
+    if request.symbol_id and int(request.symbol_id):
+        queryset = queryset.filter(symbol_id=int(request.symbol_id))
+
+    metadata = dict(context.invocation_metadata() or ())
+    if metadata.get(EXCHANGE_NAME_METADATA):
+        queryset = queryset.filter(exchange__name=metadata[EXCHANGE_NAME_METADATA])
+    if metadata.get(QUOTE_ASSET_METADATA):
+        queryset = queryset.filter(symbol__quote_asset__symbol=metadata[QUOTE_ASSET_METADATA].upper())
+    return queryset
+
+
+def to_symbol_price(symbol_price: MgObPersistence) -> market_pb2.SymbolPrice:
+    trading_pair = symbol_price.symbol
+    symbol_display = str(trading_pair.symbol_display) if trading_pair else ""
+    return market_pb2.SymbolPrice(
+        id=str(symbol_price.id),
+        name=symbol_display,
+        base=str(trading_pair.base_asset.symbol) if trading_pair and trading_pair.base_asset else "",
+        quote=str(trading_pair.quote_asset.symbol) if trading_pair and trading_pair.quote_asset else "",
+        exchange=str(symbol_price.exchange.name) if symbol_price.exchange else "",
+        symbol=symbol_display,
+        buy_price=str(symbol_price.buy_price),
+        sell_price=str(symbol_price.sell_price),
+        avg_price=str(symbol_price.avg_price),
+        usd_price=str(symbol_price.usd_price),
+        cny_price=str(symbol_price.cny_price),
+        margin=str(symbol_price.margin),
+    )
+
+
+def build_exchanges_snapshot() -> bytes:
+    exchange_list = Exchange.objects.filter(status='Active').order_by("-id")
+    return market_pb2.ExchangeResponse(
+        code=common_pb2.SUCCESS,
+        msg="get exchange info success",
+        exchanges=[
+            market_pb2.Exchange(id=str(exchange.id), name=exchange.name, type=exchange.exchange_category)
+            for exchange in exchange_list
+        ]
+    ).SerializeToString()
+
+
+def build_assets_snapshot() -> bytes:
+    asset_list = Asset.objects.filter(status='Active').order_by("-id")
+    return market_pb2.AssetResponse(
+        code=common_pb2.SUCCESS,
+        msg="get asset success",
+        assets=[market_pb2.Asset(id=str(asset.id), name=asset.symbol) for asset in asset_list]
+    ).SerializeToString()
+
+
+def build_symbols_snapshot(exchange_id: int) -> bytes:
+    """交易中的市场，exchange_id 为0时返回所有活跃交易所的市场"""
+    market_list = Market.objects.filter(
+        status=MarketStatusChoices.TRADING,
+        exchange__status='Active'
+    ).select_related('trading_pair__base_asset', 'trading_pair__quote_asset').order_by("-id")
+    if exchange_id:
+        market_list = market_list.filter(exchange_id=exchange_id)
+    return market_pb2.SymbolResponse(
+        code=common_pb2.SUCCESS,
+        msg="get symbols success",
+        symbols=[
+            market_pb2.Symbol(
+                id=str(market.id),
+                name=market.market_symbol,
+                base=market.trading_pair.base_asset.symbol,
+                quote=market.trading_pair.quote_asset.symbol,
+            )
+            for market in market_list
+        ]
+    ).SerializeToString()
+
+
+def build_stable_coins_snapshot() -> bytes:
+    stable_coins = Asset.objects.filter(status='Active', is_stablecoin=True).order_by("-id")
+    return market_pb2.StableCoinResponse(
+        code=common_pb2.SUCCESS,
+        msg="get stable coin success",
+        stable_coins=[market_pb2.StableCoin(id=str(coin.id), name=coin.name) for coin in stable_coins]
+    ).SerializeToString()
+
 
 class PriceServer(market_pb2_grpc.PriceServiceServicer):
+    """
+    参考数据方法返回预先序列化的快照字节，必须通过 add_price_service_to_server 注册，
+    生成代码中的 add_PriceServiceServicer_to_server 会对返回值再次序列化。
+    """
+
     def __init__(self):
         self.logger = logger
 
-    def getExchanges(self, request, context) -> market_pb2.ExchangeResponse:
-        exchange_return_list: List[market_pb2.Exchange] = []
-        exchange_list = Exchange.objects.filter(status='Active').order_by("-id")
-        for exchange in exchange_list:
-            item = market_pb2.Exchange(
-                id=exchange.id,
-                name=exchange.name,
-                type=exchange.exchange_category
-            )
-            exchange_return_list.append(item)
-        return market_pb2.ExchangeResponse(
-            code=common_pb2.SUCCESS,
-            msg="get exchange info success",
-            exchanges=exchange_return_list
-        )
-
-    def getAssets(self, request, context) -> market_pb2.AssetResponse:
-        asset_return_list: List[market_pb2.Asset] = []
-        asset_list = Asset.objects.filter(status='Active').order_by("-id")
-        for asset in asset_list:
-            item = market_pb2.Asset(
-                id=asset.id,
-                name=asset.symbol,
-            )
-            asset_return_list.append(item)
-        return market_pb2.AssetResponse(
-            code=common_pb2.SUCCESS,
-            msg="get asset success",
-            assets=asset_return_list
+    def _serve_snapshot(self, name: str, build, context) -> bytes:
+        """
+        返回序列化好的快照字节
+
+        初始元数据中带上快照版本；客户端在 x-if-none-match 中带上已有版本且未变化时返回空消息，
+        并在 x-not-modified 中标记。
+        """
+        snapshot = snapshot_cache.get(name, build)
+        metadata = dict(context.invocation_metadata() or ())
+        not_modified = metadata.get(IF_NONE_MATCH_METADATA) == snapshot.version
+        context.send_initial_metadata((
+            (SNAPSHOT_VERSION_METADATA, snapshot.version),
+            (NOT_MODIFIED_METADATA, '1' if not_modified else '0'),
+        ))
+        return b'' if not_modified else snapshot.payload
+
+    def getExchanges(self, request, context) -> bytes:
+        return self._serve_snapshot('exchanges', build_exchanges_snapshot, context)
+
+    def getAssets(self, request, context) -> bytes:
+        return self._serve_snapshot('assets', build_assets_snapshot, context)
+
+    def getSymbols(self, request, context) -> bytes:
+        exchange_id = int(request.exchange_id) if request.exchange_id else 0
+        return self._serve_snapshot(
+            f'symbols:{exchange_id}', lambda: build_symbols_snapshot(exchange_id), context
         )
 
-    def getSymbols(self, request, context) -> market_pb2.SymbolResponse:
-        try:
-            exchange_name = request.exchange_name
-            self.logger.info(f"Received getSymbols request for exchange: {exchange_name}")
-
-            # Query active markets for the given exchange
-            market_list = Market.objects.filter(
-                exchange__name=exchange_name,
-                status=MarketStatusChoices.TRADING,  # Only include actively trading markets
-                exchange__status='Active'  # Ensure the exchange itself is active
-            ).select_related('trading_pair__base_asset', 'trading_pair__quote_asset', 'exchange')
-
-            symbols_response = []
-            for market in market_list:
-                symbol_pb = market_pb2.Symbol(
-                    name=market.market_symbol,  # Use market_symbol (e.g., BTCUSDT)
-                    base=market.trading_pair.base_asset.symbol,  # e.g., BTC
-                    quote=market.trading_pair.quote_asset.symbol,  # e.g., USDT
-                    exchange_name=market.exchange.name,
-                    # category=market.category, # Add if category is part of your protobuf Symbol message
-                    # status=market.status,     # Add if status is part of your protobuf Symbol message
-                )
-                symbols_response.append(symbol_pb)
-
-            self.logger.info(f"Returning {len(symbols_response)} symbols for exchange: {exchange_name}")
-            return market_pb2.SymbolResponse(error=None, symbols=symbols_response)
-        except Exchange.DoesNotExist:
-            self.logger.warning(f"Exchange not found: {exchange_name}")
-            error = market_pb2.Error(code=404, message=f"Exchange {exchange_name} not found")
-            return market_pb2.SymbolResponse(error=error)
-        except Exception as e:
-            self.logger.error(f"Error in getSymbols for {exchange_name}: {e}", exc_info=True)
-            error = market_pb2.Error(code=500, message=str(e))
-            return market_pb2.SymbolResponse(error=error)
-
     def getSymbolPrices(self, request, context) -> market_pb2.SymbolPriceResponse:
-        exchange_id = int(request.exchange_id) if request.exchange_id else 0
-        symbol_id = int(request.symbol_id) if request.symbol_id else 0
-        symbol_price_data: List[market_pb2.SymbolPrice] = []
-        if exchange_id == 0 and symbol_id == 0:
-            symbol_price_list = MgObPersistence.objects.all().order_by("-id")
-        elif exchange_id != 0 and symbol_id == 0:
-            exchange = Exchange.objects.filter(id=exchange_id).order_by("-id").first()
-            symbol_price_list = MgObPersistence.objects.filter(
-                exchange=exchange,
-            ).order_by("-id")
-        elif exchange_id == 0 and symbol_id != 0:
-            symbol = TradingPair.objects.filter(id=symbol_id).order_by("-id").first()
-            symbol_price_list = MgObPersistence.objects.filter(
-                symbol=symbol,
-            ).order_by("-id")
-        else:
-            exchange = Exchange.objects.filter(id=exchange_id).order_by("-id").first()
-            symbol = TradingPair.objects.filter(id=symbol_id).order_by("-id").first()
-            symbol_price_list = MgObPersistence.objects.filter(
-                exchange=exchange,
-                symbol=symbol,
-            ).order_by("-id")
-        for symbol_price in symbol_price_list:
-            item = market_pb2.SymbolPrice(
-                id=str(symbol_price.id),
-                name=str(symbol_price.symbol.symbol_display) if symbol_price.symbol else "",
-                base=str(symbol_price.symbol.base_asset.symbol) if symbol_price.symbol and symbol_price.symbol.base_asset else "",
-                quote=str(symbol_price.symbol.quote_asset.symbol) if symbol_price.symbol and symbol_price.symbol.quote_asset else "",
-                exchange=str(symbol_price.exchange.name) if symbol_price.exchange else "",
-                symbol=str(symbol_price.symbol.symbol_display) if symbol_price.symbol else "",
-                buy_price=str(symbol_price.buy_price),
-                sell_price=str(symbol_price.sell_price),
-                avg_price=str(symbol_price.avg_price),
-                usd_price=str(symbol_price.usd_price),
-                cny_price=str(symbol_price.cny_price),
-                margin=str(symbol_price.margin),
-            )
-            symbol_price_data.append(item)
+        symbol_price_data: List[market_pb2.SymbolPrice] = [
+            to_symbol_price(symbol_price)
+            for symbol_price in symbol_price_queryset(request, context).iterator(chunk_size=SYMBOL_PRICE_CHUNK_SIZE)
+        ]
         return market_pb2.SymbolPriceResponse(
             code=common_pb2.SUCCESS,
             msg="get symbol prices success",
             symbol_prices=symbol_price_data
         )
 
-    def getStableCoins(self, request, context) -> market_pb2.StableCoinResponse:
-        stable_coin_list: List[market_pb2.StableCoin] = []
-        stable_coins = Asset.objects.filter(status='Active', is_stablecoin=True).order_by("-id")
-        for stable_coin in stable_coins:
-            item = market_pb2.StableCoin(
-                id=stable_coin.id,
-                name=stable_coin.name,
+    def streamSymbolPrices(self, request, context) -> Iterator[market_pb2.SymbolPriceResponse]:
+        """getSymbolPrices 的服务端流式版本，每条消息最多 SYMBOL_PRICE_CHUNK_SIZE 个价格"""
+        chunk: List[market_pb2.SymbolPrice] = []
+        for symbol_price in symbol_price_queryset(request, context).iterator(chunk_size=SYMBOL_PRICE_CHUNK_SIZE):
+            chunk.append(to_symbol_price(symbol_price))
+            if len(chunk) >= SYMBOL_PRICE_CHUNK_SIZE:
+                yield market_pb2.SymbolPriceResponse(
+                    code=common_pb2.SUCCESS,
+                    msg="get symbol prices success",
+                    symbol_prices=chunk
+                )
+                chunk = []
+        if chunk:
+            yield market_pb2.SymbolPriceResponse(
+                code=common_pb2.SUCCESS,
+                msg="get symbol prices success",
+                symbol_prices=chunk
             )
-            stable_coin_list.append(item)
-        return market_pb2.StableCoinResponse(
-            code=common_pb2.SUCCESS,
-            msg="get stable coin success",
-            stable_coins=stable_coin_list
-        )
+
+    def getStableCoins(self, request, context) -> bytes:
+        return self._serve_snapshot('stable_coins', build_stable_coins_snapshot, context)
 
     def getStableCoinPrice(self, request, context) -> market_pb2.StableCoinPriceResponse:
         coin_id = int(request.coin_id) if request.coin_id else 0
@@ -169,3 +212,44 @@ class PriceServer(market_pb2_grpc.PriceServiceServicer):
             msg="get stable coin price success",
             coin_prices=stablecoin_price_list
         )
+
+
+def _raw_bytes(payload: bytes) -> bytes:
+    return payload
+
+
+def server_options():
+    """grpc.server 的选项，与客户端 channel_options 的保活设置匹配"""
+    return [
+        ('grpc.keepalive_permit_without_calls', 1),
+        # 低于客户端间隔，留出计时误差
+        ('grpc.http2.min_ping_interval_without_data_ms', KEEPALIVE_TIME_MS // 2),
+    ]
+
+
+def add_price_service_to_server(servicer: PriceServer, server) -> None:
+    """注册 PriceService：参考数据方法直接写出快照字节，另外注册生成代码之外的流式方法"""
+
+    def unary(method, request_cls, response_serializer):
+        return grpc.unary_unary_rpc_method_handler(
+            method,
+            request_deserializer=request_cls.FromString,
+            response_serializer=response_serializer,
+        )
+
+    handlers = {
+        'getExchanges': unary(servicer.getExchanges, market_pb2.ExchangeRequest, _raw_bytes),
+        'getAssets': unary(servicer.getAssets, market_pb2.AssetRequest, _raw_bytes),
+        'getSymbols': unary(servicer.getSymbols, market_pb2.SymbolRequest, _raw_bytes),
+        'getStableCoins': unary(servicer.getStableCoins, market_pb2.StableCoinRequest, _raw_bytes),
+        'getSymbolPrices': unary(servicer.getSymbolPrices, market_pb2.SymbolPriceRequest,
+                                 market_pb2.SymbolPriceResponse.SerializeToString),
+        'getStableCoinPrice': unary(servicer.getStableCoinPrice, market_pb2.StableCoinPriceRequest,
+                                    market_pb2.StableCoinPriceResponse.SerializeToString),
+        STREAM_SYMBOL_PRICES_METHOD: grpc.unary_stream_rpc_method_handler(
+            servicer.streamSymbolPrices,
+            request_deserializer=market_pb2.SymbolPriceRequest.FromString,
+            response_serializer=market_pb2.SymbolPriceResponse.SerializeToString,
+        ),
+    }
+    server.add_generic_rpc_handlers((grpc.method_handlers_generic_handler(PRICE_SERVICE_NAME, handlers),))
@@ -1,15 +1,126 @@
 # encoding=utf-8
 
+import asyncio
+import statistics
+import time
+from concurrent import futures
 
+import grpc
 from django.core.management.base import BaseCommand
 
-from services.mp_client import MpClient
+from services.grpc_server import PriceServer, add_price_service_to_server, server_options
+from services.mp_client import MP_GRPC_TARGET, AsyncMpClient
+from services.savourrpc import market_pb2
+
+LOAD_TEST_METHODS = ['symbol_prices', 'stable_coin_price', 'exchanges', 'symbols']
+# 参考数据RPC在压测时绕过客户端缓存，直接调用
+SNAPSHOT_METHODS = {
+    'exchanges': ('getExchanges', market_pb2.ExchangeRequest),
+    'symbols': ('getSymbols', lambda: market_pb2.SymbolRequest(exchange_id='0')),
+}
 
 
 class Command(BaseCommand):
+    help = 'Fetches prices from the price rpc server, or load-tests it with --load-test.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--target', type=str, default=MP_GRPC_TARGET, help='Price rpc server address')
+        parser.add_argument('--load-test', action='store_true', help='Run a load test instead of a single fetch')
+        parser.add_argument('--in-process', action='store_true',
+                            help='Start a PriceServer in this process on a random local port and test against it')
+        parser.add_argument('--method', choices=LOAD_TEST_METHODS, default='symbol_prices',
+                            help='RPC to drive in load-test mode (default: symbol_prices)')
+        parser.add_argument('--concurrency', type=int, default=20, help='Concurrent callers (default: 20)')
+        parser.add_argument('--requests', type=int, default=1000, help='Total requests (default: 1000)')
+        parser.add_argument('--channels', type=int, default=4, help='Client channel pool size (default: 4)')
+        parser.add_argument('--timeout', type=float, default=5.0, help='Per-call deadline in seconds (default: 5)')
+        parser.add_argument('--snapshot', choices=['cold', 'revalidate'], default='cold',
+                            help='For exchanges/symbols: cold fetches the full snapshot on every call, revalidate '
+                                 'sends the current version with x-if-none-match (default: cold)')
+
     def handle(self, *args, **options):
-        mp_client = MpClient()
-        ret_info = mp_client.get_symbol_price()
-        print("get_symbol_price ret_info====", ret_info)
-        ret_info = mp_client.get_stable_coin_price()
-        print("\nget_stable_coin_price ret_info====", ret_info)
+        server = None
+        target = options['target']
+        if options['in_process']:
+            server = grpc.server(futures.ThreadPoolExecutor(max_workers=max(10, options['concurrency'])),
+                                 options=server_options())
+            add_price_service_to_server(PriceServer(), server)
+            port = server.add_insecure_port('127.0.0.1:0')
+            server.start()
+            target = f"127.0.0.1:{port}"
+            self.stdout.write(f"in-process price rpc server on {target}")
+
+        try:
+            if options['load_test']:
+                asyncio.run(self._load_test(target, options))
+            else:
+                asyncio.run(self._fetch(target, options))
+        finally:
+            if server:
+                server.stop(grace=None)
+
+    async def _fetch(self, target, options):
+        async with AsyncMpClient(target, pool_size=options['channels'], timeout=options['timeout']) as client:
+            symbol_prices, stable_coin_prices = await asyncio.gather(
+                client.get_symbol_price(),
+                client.get_stable_coin_price(),
+            )
+        print("get_symbol_price ret_info====", symbol_prices)
+        print("\nget_stable_coin_price ret_info====", stable_coin_prices)
+
+    async def _load_test(self, target, options):
+        total = options['requests']
+        concurrency = max(1, min(options['concurrency'], total))
+        latencies = []
+        errors = 0
+        not_modified = 0
+        remaining = iter(range(total))
+        label = options['method']
+
+        async with AsyncMpClient(target, pool_size=options['channels'], timeout=options['timeout']) as client:
+            if options['method'] not in SNAPSHOT_METHODS:
+                call = {
+                    'symbol_prices': client.get_symbol_price,
+                    'stable_coin_price': client.get_stable_coin_price,
+                }[options['method']]
+            else:
+                # 客户端缓存和请求合并会让后续调用只是一次字典查找，压测时直接调用RPC
+                method_name, make_request = SNAPSHOT_METHODS[options['method']]
+                request = make_request()
+                version = None
+                if options['snapshot'] == 'revalidate':
+                    _, version, _ = await client.call_snapshot(method_name, request)
+                label = f"{options['method']} ({options['snapshot']})"
+
+                async def call():
+                    nonlocal not_modified
+                    _, _, unchanged = await client.call_snapshot(method_name, request, version)
+                    not_modified += unchanged
+
+            async def worker():
+                nonlocal errors
+                for _ in remaining:
+                    start = time.perf_counter()
+                    try:
+                        await call()
+                        latencies.append(time.perf_counter() - start)
+                    except grpc.aio.AioRpcError as e:
+                        errors += 1
+                        if errors <= 5:
+                            self.stderr.write(f"rpc error: {e.code()} {e.details()}")
+
+            started = time.perf_counter()
+            await asyncio.gather(*(worker() for _ in range(concurrency)))
+            elapsed = time.perf_counter() - started
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{label}: {total} requests, concurrency {concurrency}, "
+            f"{len(latencies)} ok, {errors} errors in {elapsed:.2f}s ({total / elapsed:.1f} req/s)"))
+        if options['method'] in SNAPSHOT_METHODS and options['snapshot'] == 'revalidate':
+            self.stdout.write(f"not modified: {not_modified}/{len(latencies)}")
+        if latencies:
+            latencies.sort()
+            quantiles = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else latencies * 99
+            self.stdout.write(
+                f"latency ms: p50={quantiles[49] * 1000:.2f} p95={quantiles[94] * 1000:.2f} "
+                f"p99={quantiles[98] * 1000:.2f} max={latencies[-1] * 1000:.2f}")
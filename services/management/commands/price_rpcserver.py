@@ -5,17 +5,13 @@ from concurrent import futures
 import grpc
 from django.core.management.base import BaseCommand
 
-from services.grpc_server import PriceServer
-from services.savourrpc import market_pb2_grpc
+from services.grpc_server import PriceServer, add_price_service_to_server, server_options
 
 
 class Command(BaseCommand):
     def handle(self, *args, **options):
-        server = grpc.server(futures.ThreadPoolExecutor(max_workers=10))
-        market_pb2_grpc.add_PriceServiceServicer_to_server(
-            PriceServer(),
-            server
-        )
+        server = grpc.server(futures.ThreadPoolExecutor(max_workers=10), options=server_options())
+        add_price_service_to_server(PriceServer(), server)
         server.add_insecure_port('[::]:50250')
         server.start()
         print("price rpc server start")
@@ -1,24 +1,113 @@
 # encoding=utf-8
 
+import asyncio
+import time
+from typing import List, Tuple
+
 import grpc
 from django.conf import settings
 
+from services.consts import (
+    EXCHANGE_NAME_METADATA, IF_NONE_MATCH_METADATA, KEEPALIVE_TIME_MS, KEEPALIVE_TIMEOUT_MS, NOT_MODIFIED_METADATA,
+    PRICE_SERVICE_NAME, QUOTE_ASSET_METADATA, SNAPSHOT_VERSION_METADATA, STREAM_SYMBOL_PRICES_METHOD
+)
 from services.savourrpc import market_pb2_grpc, market_pb2
 
+MP_GRPC_TARGET = getattr(settings, 'MP_GRPC_TARGET', 'localhost:50250')
+# 单次调用的默认超时（秒）
+MP_GRPC_TIMEOUT = getattr(settings, 'MP_GRPC_TIMEOUT', 5.0)
+# 不带过滤条件的 getSymbolPrices 返回全部价格，使用单独的较长超时（秒）
+MP_GRPC_BULK_TIMEOUT = getattr(settings, 'MP_GRPC_BULK_TIMEOUT', 60.0)
+# 异步客户端的通道数量，请求轮询分配到各通道
+MP_GRPC_CHANNELS = getattr(settings, 'MP_GRPC_CHANNELS', 4)
+# 参考数据在本地缓存的时间（秒），过期后带上版本号重新验证
+REFERENCE_CACHE_TTL = getattr(settings, 'MP_REFERENCE_CACHE_TTL', 30)
+
+
+def channel_options():
+    return [
+        ('grpc.max_receive_message_length', settings.GRPC_MAX_MESSAGE_LENGTH),
+        # 空闲连接保活，避免被中间设备断开后首个请求才发现；服务端需使用 server_options()
+        ('grpc.keepalive_time_ms', KEEPALIVE_TIME_MS),
+        ('grpc.keepalive_timeout_ms', KEEPALIVE_TIMEOUT_MS),
+        ('grpc.keepalive_permit_without_calls', 1),
+        ('grpc.http2.max_pings_without_data', 0),
+        # 每个通道使用独立的TCP连接，否则同一进程内的通道会共用子通道
+        ('grpc.use_local_subchannel_pool', 1),
+    ]
+
 
 class MpClient:
-    def __init__(self):
-        options = [
-            ('grpc.max_receive_message_length', settings.GRPC_MAX_MESSAGE_LENGTH),
-        ]
-        channel = grpc.insecure_channel("localhost:50250", options=options)
+    def __init__(self, target: str = MP_GRPC_TARGET, timeout: float = MP_GRPC_TIMEOUT):
+        channel = grpc.insecure_channel(target, options=channel_options())
+        self.timeout = timeout
         self.stub = market_pb2_grpc.PriceServiceStub(channel)
+        self.stream_symbol_prices_stub = channel.unary_stream(
+            f"/{PRICE_SERVICE_NAME}/{STREAM_SYMBOL_PRICES_METHOD}",
+            request_serializer=market_pb2.SymbolPriceRequest.SerializeToString,
+            response_deserializer=market_pb2.SymbolPriceResponse.FromString,
+        )
+        # 参考数据快照: 方法+参数 -> (版本, 响应)
+        self._snapshots = {}
+
+    def _get_snapshot(self, method, request, cache_key: str):
+        """带上已有版本请求，服务端返回未变化时直接使用本地副本"""
+        cached = self._snapshots.get(cache_key)
+        metadata = [(IF_NONE_MATCH_METADATA, cached[0])] if cached else None
+        response, call = method.with_call(request, metadata=metadata, timeout=self.timeout)
+        headers = dict(call.initial_metadata() or ())
+        if cached and headers.get(NOT_MODIFIED_METADATA) == '1':
+            return cached[1]
+        version = headers.get(SNAPSHOT_VERSION_METADATA)
+        if version:
+            self._snapshots[cache_key] = (version, response)
+        return response
+
+    def get_exchanges(self, consumer_token: str = None):
+        return self._get_snapshot(
+            self.stub.getExchanges, market_pb2.ExchangeRequest(consumer_token=consumer_token), 'exchanges'
+        )
+
+    def get_assets(self, consumer_token: str = None):
+        return self._get_snapshot(
+            self.stub.getAssets, market_pb2.AssetRequest(consumer_token=consumer_token), 'assets'
+        )
+
+    def get_symbols(self, consumer_token: str = None, exchange_id: str = '0'):
+        return self._get_snapshot(
+            self.stub.getSymbols,
+            market_pb2.SymbolRequest(consumer_token=consumer_token, exchange_id=exchange_id),
+            f'symbols:{exchange_id}'
+        )
+
+    def get_stable_coins(self, consumer_token: str = None):
+        return self._get_snapshot(
+            self.stub.getStableCoins, market_pb2.StableCoinRequest(consumer_token=consumer_token), 'stable_coins'
+        )
 
     def get_symbol_price(self, consumer_token: str = None):
         return self.stub.getSymbolPrices(
             market_pb2.SymbolPriceRequest(
                 consumer_token=consumer_token
-            )
+            ),
+            timeout=max(self.timeout, MP_GRPC_BULK_TIMEOUT)
+        )
+
+    def stream_symbol_prices(self, consumer_token: str = None, exchange_id: str = '0', symbol_id: str = '0',
+                             exchange_name: str = None, quote_asset: str = None):
+        """逐批返回 SymbolPriceResponse，可按交易所名称和计价资产过滤"""
+        metadata = []
+        if exchange_name:
+            metadata.append((EXCHANGE_NAME_METADATA, exchange_name))
+        if quote_asset:
+            metadata.append((QUOTE_ASSET_METADATA, quote_asset))
+        return self.stream_symbol_prices_stub(
+            market_pb2.SymbolPriceRequest(
+                consumer_token=consumer_token,
+                exchange_id=exchange_id,
+                symbol_id=symbol_id
+            ),
+            metadata=metadata or None
         )
 
     def get_stable_coin_price(self, consumer_token: str = None, coin_id: str = '0'):
@@ -26,5 +115,134 @@ class MpClient:
             market_pb2.StableCoinPriceRequest(
                 consumer_token=consumer_token,
                 coin_id=coin_id
-            )
-        )
\ No newline at end of file
+            ),
+            timeout=self.timeout
+        )
+
+
+class AsyncMpClient:
+    """
+    基于 grpc.aio 的异步客户端。
+
+    维护一组长连接通道并轮询使用，每次调用都有超时；参考数据在本地缓存 REFERENCE_CACHE_TTL 秒，
+    过期后带上快照版本重新验证，同一参考数据的并发请求只发出一次RPC。
+    通道绑定在创建它的事件循环上，用完需调用 close()，或使用 async with。
+    """
+
+    def __init__(self, target: str = MP_GRPC_TARGET, pool_size: int = MP_GRPC_CHANNELS,
+                 timeout: float = MP_GRPC_TIMEOUT):
+        self.target = target
+        self.timeout = timeout
+        self._channels = [grpc.aio.insecure_channel(target, options=channel_options()) for _ in range(pool_size)]
+        self._stubs = [market_pb2_grpc.PriceServiceStub(channel) for channel in self._channels]
+        self._next = 0
+        # 参考数据: cache_key -> (版本, 响应, 缓存时间)
+        self._snapshots = {}
+        self._inflight = {}
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def close(self):
+        await asyncio.gather(*(channel.close() for channel in self._channels))
+
+    def _stub(self) -> market_pb2_grpc.PriceServiceStub:
+        stub = self._stubs[self._next % len(self._stubs)]
+        self._next += 1
+        return stub
+
+    async def call_snapshot(self, method_name: str, request, version: str = None):
+        """
+        不经过本地缓存和请求合并，直接调用一次参考数据RPC，供压测区分冷请求和重新验证
+
+        Returns:
+            (响应, 服务端快照版本, 是否未变化)；未变化时响应为空消息
+        """
+        metadata = ((IF_NONE_MATCH_METADATA, version),) if version else None
+        call = getattr(self._stub(), method_name)(request, metadata=metadata, timeout=self.timeout)
+        response = await call
+        headers = dict(await call.initial_metadata() or ())
+        return response, headers.get(SNAPSHOT_VERSION_METADATA), bool(version) and headers.get(NOT_MODIFIED_METADATA) == '1'
+
+    async def _fetch_snapshot(self, method_name: str, request, cache_key: str):
+        cached = self._snapshots.get(cache_key)
+        response, version, not_modified = await self.call_snapshot(method_name, request, cached[0] if cached else None)
+        if not_modified:
+            response = cached[1]
+        if version:
+            self._snapshots[cache_key] = (version, response, time.monotonic())
+        return response
+
+    async def _get_snapshot(self, method_name: str, request, cache_key: str):
+        cached = self._snapshots.get(cache_key)
+        if cached and time.monotonic() - cached[2] < REFERENCE_CACHE_TTL:
+            return cached[1]
+        # 合并并发请求
+        task = self._inflight.get(cache_key)
+        if task is None:
+            task = asyncio.ensure_future(self._fetch_snapshot(method_name, request, cache_key))
+            self._inflight[cache_key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(cache_key, None))
+        return await asyncio.shield(task)
+
+    async def get_exchanges(self, consumer_token: str = None):
+        return await self._get_snapshot(
+            'getExchanges', market_pb2.ExchangeRequest(consumer_token=consumer_token), 'exchanges'
+        )
+
+    async def get_assets(self, consumer_token: str = None):
+        return await self._get_snapshot(
+            'getAssets', market_pb2.AssetRequest(consumer_token=consumer_token), 'assets'
+        )
+
+    async def get_symbols(self, consumer_token: str = None, exchange_id: str = '0'):
+        return await self._get_snapshot(
+            'getSymbols',
+            market_pb2.SymbolRequest(consumer_token=consumer_token, exchange_id=exchange_id),
+            f'symbols:{exchange_id}'
+        )
+
+    async def get_stable_coins(self, consumer_token: str = None):
+        return await self._get_snapshot(
+            'getStableCoins', market_pb2.StableCoinRequest(consumer_token=consumer_token), 'stable_coins'
+        )
+
+    async def get_symbol_price(self, consumer_token: str = None, exchange_id: str = '0', symbol_id: str = '0'):
+        unfiltered = exchange_id in ('', '0') and symbol_id in ('', '0')
+        return await self._stub().getSymbolPrices(
+            market_pb2.SymbolPriceRequest(
+                consumer_token=consumer_token,
+                exchange_id=exchange_id,
+                symbol_id=symbol_id
+            ),
+            timeout=max(self.timeout, MP_GRPC_BULK_TIMEOUT) if unfiltered else self.timeout
+        )
+
+    async def get_symbol_prices_batch(self, queries: List[Tuple[str, str]], consumer_token: str = None):
+        """
+        并发查询多组价格
+
+        Args:
+            queries: [(exchange_id, symbol_id), ...]，重复的查询只发送一次
+
+        Returns:
+            与 queries 顺序一致的 SymbolPriceResponse 列表
+        """
+        unique = list(dict.fromkeys(queries))
+        responses = await asyncio.gather(*(
+            self.get_symbol_price(consumer_token, exchange_id, symbol_id) for exchange_id, symbol_id in unique
+        ))
+        by_query = dict(zip(unique, responses))
+        return [by_query[query] for query in queries]
+
+    async def get_stable_coin_price(self, consumer_token: str = None, coin_id: str = '0'):
+        return await self._stub().getStableCoinPrice(
+            market_pb2.StableCoinPriceRequest(
+                consumer_token=consumer_token,
+                coin_id=coin_id
+            ),
+            timeout=self.timeout
+        )
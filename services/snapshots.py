@@ -0,0 +1,156 @@
+# encoding=utf-8
+
+import hashlib
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, Optional
+
+from django.conf import settings
+
+from common.helpers import getLogger
+from common.redis_client import local_redis
+
+logger = getLogger(__name__)
+
+# 本地快照检查Redis代数的间隔（秒），目录更新后各副本最多延迟这么久
+SNAPSHOT_CHECK_INTERVAL = getattr(settings, 'GRPC_SNAPSHOT_CHECK_INTERVAL', 2)
+# 快照的最长使用时间（秒），超过后从数据库重建，覆盖后台管理等不经过 invalidate() 的修改
+SNAPSHOT_MAX_AGE = getattr(settings, 'GRPC_SNAPSHOT_MAX_AGE', 300)
+# Redis中快照的保留时间（秒），代数变化后旧快照自然过期
+SNAPSHOT_TTL = 24 * 3600
+
+GENERATION_KEY = "grpc:snapshot:generation"
+SNAPSHOT_KEY = "grpc:snapshot:{name}:{generation}"
+
+
+@dataclass
+class Snapshot:
+    version: str
+    payload: bytes
+    generation: Optional[int]  # None 表示Redis不可用时直接从数据库构建
+    checked_at: float
+    built_at: float
+
+
+class ReferenceSnapshotCache:
+    """
+    参考数据（交易所、资产、稳定币、交易对）的protobuf快照缓存。
+
+    快照是序列化好的响应字节，进程内缓存并写入Redis供其他副本复用。
+    目录变化时 invalidate() 递增Redis中的代数，各副本在 SNAPSHOT_CHECK_INTERVAL 内发现并重建。
+    其他途径的修改（后台管理等）不会递增代数，所以快照使用超过 SNAPSHOT_MAX_AGE 后从数据库重建，
+    内容有变化时递增代数通知其他副本。
+    version 是内容哈希，内容不变时重建后的 version 也不变，客户端可据此跳过未变化的数据。
+    Redis不可用时直接从数据库构建，不影响接口可用性。
+    """
+
+    def __init__(self):
+        self._local: Dict[str, Snapshot] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _generation() -> int:
+        value = local_redis().get(GENERATION_KEY)
+        return int(value) if value else 0
+
+    @staticmethod
+    def _version(payload: bytes) -> str:
+        return hashlib.sha1(payload).hexdigest()[:16]
+
+    def _store(self, name: str, payload: bytes, generation: Optional[int], now: float) -> Snapshot:
+        snapshot = Snapshot(
+            version=self._version(payload),
+            payload=payload,
+            generation=generation,
+            checked_at=now,
+            built_at=now,
+        )
+        self._local[name] = snapshot
+        return snapshot
+
+    @staticmethod
+    def _fresh(snapshot: Optional[Snapshot], now: float) -> bool:
+        return snapshot is not None and now - snapshot.built_at < SNAPSHOT_MAX_AGE
+
+    def get(self, name: str, build: Callable[[], bytes]) -> Snapshot:
+        """
+        获取快照
+
+        Args:
+            name: 快照名，带参数的数据集需包含参数，如 symbols:3
+            build: 从数据库构建序列化响应的函数
+        """
+        now = time.time()
+        local = self._local.get(name)
+        if local and now - local.checked_at < SNAPSHOT_CHECK_INTERVAL:
+            return local
+
+        try:
+            generation = self._generation()
+        except Exception as e:
+            logger.warning(f"读取快照代数失败，直接使用数据库: {e}")
+            generation = None
+        if self._fresh(local, now) and local.generation == generation:
+            local.checked_at = now
+            return local
+
+        # grpc 线程池并发请求时同一快照只构建一次
+        with self._lock:
+            local = self._local.get(name)
+            if self._fresh(local, now) and (generation is None or local.generation == generation):
+                local.checked_at = now
+                return local
+
+            if generation is None:
+                return self._store(name, build(), None, now)
+
+            if local and local.generation == generation:
+                # 超过最长使用时间：重建后内容没变只刷新时间，变了则递增代数让其他副本也重建
+                payload = build()
+                if self._version(payload) == local.version:
+                    local.built_at = local.checked_at = now
+                    return local
+                logger.info(f"快照 {name} 在代数 {generation} 内发生变化，递增代数")
+                try:
+                    generation = self.invalidate()
+                    local_redis().set(SNAPSHOT_KEY.format(name=name, generation=generation), payload, ex=SNAPSHOT_TTL)
+                except Exception as e:
+                    logger.warning(f"写入快照 {name} 到Redis失败: {e}")
+                    generation = None
+                return self._store(name, payload, generation, now)
+
+            redis_key = SNAPSHOT_KEY.format(name=name, generation=generation)
+            try:
+                payload = local_redis().get(redis_key)
+            except Exception as e:
+                logger.warning(f"读取快照 {name} 失败: {e}")
+                payload = None
+            if payload is None:
+                payload = build()
+                try:
+                    local_redis().set(redis_key, payload, ex=SNAPSHOT_TTL)
+                except Exception as e:
+                    logger.warning(f"写入快照 {name} 到Redis失败: {e}")
+                logger.info(f"重建快照 {name} (代数 {generation}, {len(payload)} 字节)")
+            return self._store(name, payload, generation, now)
+
+    @staticmethod
+    def invalidate() -> int:
+        """目录变化后调用，返回新的代数"""
+        generation = local_redis().incr(GENERATION_KEY)
+        logger.info(f"参考数据快照已失效，新代数 {generation}")
+        return generation
+
+
+# 全局实例
+snapshot_cache = ReferenceSnapshotCache()
+
+
+def invalidate_reference_snapshots() -> Optional[int]:
+    """供目录更新任务调用，失败只记录日志，不影响调用方"""
+    try:
+        return snapshot_cache.invalidate()
+    except Exception as e:
+        logger.warning(f"使参考数据快照失效时出错: {e}")
+        return None
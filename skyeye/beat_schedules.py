@@ -40,4 +40,9 @@ DEFAULT_BEAT_SCHEDULE = {
         'schedule': crontab(hour=6, minute=0),  # 每天凌晨6点分执行
         'options': {'queue': 'celery'},
     },
+    'daily_klines_partition_maintenance': {
+        'task': 'manage_klines_partitions',
+        'schedule': crontab(hour=2, minute=30),  # 每天凌晨2点30分执行：预建未来分区、归档过期1m数据、建BRIN索引
+        'options': {'queue': 'celery'},
+    },
 }